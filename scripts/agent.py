@@ -4,18 +4,22 @@ QuantumAIIDE Agent: Mobile-First, Privileged AI System Builder
 Industry standards, agentic orchestration, Android/Aarch64 ready.
 References: /reference vault, ai_dev_system.py, OWASP, GitHub API docs, DeepSeek, HuggingFace
 """
-import asyncio, json, os, aiohttp, logging
-from github import Github
-from shell import run_shell_command
-from ai import query_ai
+import asyncio, os, aiohttp, logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from github import Github, GithubException, InputGitTreeElement
+from shell import ShellRunner
+from ai import AIClient, query_ai
 from audit import log_action
+from content_cache import ContentCache
+from auth_config import AuthConfigStore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger("QuantumAIIDE-Agent")
 
 class QuantumAgent:
-    def __init__(self, github_token=None, ai_token=None):
+    def __init__(self, github_token=None, ai_token=None, github_workers=8, github_write_interval=1.0):
         # Enhanced authentication with fallback
         self.github_token = github_token or os.getenv('GITHUB_TOKEN')
         self.ai_token = ai_token or os.getenv('HUGGINGFACE_TOKEN') 
@@ -29,33 +33,42 @@ class QuantumAgent:
         if not self.agent_api_key:
             logger.warning("AGENT_API_KEY not found - using default authentication")
             
-        # Initialize GitHub client if token available
-        self.github = Github(self.github_token) if self.github_token else None
+        # Initialize GitHub client if token available. PyGithub is blocking, so every call
+        # goes through a bounded worker pool whose size matches the HTTP connection pool.
+        # Reads are not throttled; writes keep GitHub's recommended spacing.
+        self.github_base_url = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+        self.github = Github(
+            self.github_token,
+            base_url=self.github_base_url,
+            pool_size=github_workers,
+            seconds_between_requests=None,
+            seconds_between_writes=github_write_interval,
+        ) if self.github_token else None
+        self.github_pool = ThreadPoolExecutor(max_workers=github_workers, thread_name_prefix="github")
+        self.shell = ShellRunner(max_concurrent=int(os.getenv('AGENT_SHELL_CONCURRENCY', 4)))
+        self.content_cache = ContentCache(max_bytes=int(os.getenv('AGENT_CONTENT_CACHE_BYTES', 32 * 1024 * 1024)))
         
-        # Load authentication configuration
-        self.auth_config = self.load_auth_config()
+        # Load authentication configuration; the store re-reads the file only when it changes
+        self.config_store = AuthConfigStore()
+        self._auth_status = None
         
+        # One pooled AI client for every action, tuned by the ai_backend endpoint config
+        ai_backend = self.auth_config.get("integration_endpoints", {}).get("ai_backend", {})
+        self.ai_client = AIClient.from_endpoint_config(ai_backend)
+        
+    @property
+    def auth_config(self):
+        return self.config_store.get()
+
     def load_auth_config(self):
         """Load authentication and integration configuration"""
-        config_path = os.path.join(os.path.dirname(__file__), 
-                                   'app/src/main/assets/models/auth-integration-config.json')
-        try:
-            if os.path.exists(config_path):
-                with open(config_path, 'r') as f:
-                    return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError, OSError) as e:
-            logger.warning(f"Could not load auth config ({type(e).__name__}): {e}")
-
-        # Return default configuration
-        return {
-            "authentication": {"enabled": True},
-            "integration_endpoints": {},
-            "frontend_backend_mapping": {},
-            "error_handling": {}
-        }
+        return self.config_store.get(force=True)
     
     def validate_authentication(self):
         """Validate all required authentication tokens"""
+        tokens = (self.github_token, self.ai_token, self.agent_api_key, self.session_secret)
+        if self._auth_status is not None and self._auth_status[0] == tokens:
+            return self._auth_status[1]
         validation_results = {
             "github": bool(self.github_token),
             "huggingface": bool(self.ai_token),
@@ -66,10 +79,13 @@ class QuantumAgent:
         missing_tokens = [k for k, v in validation_results.items() if not v]
         if missing_tokens:
             logger.error(f"Missing authentication tokens: {missing_tokens}")
-            return False, missing_tokens
-        
-        logger.info("All authentication tokens validated successfully")
-        return True, []
+            result = (False, missing_tokens)
+        else:
+            logger.info("All authentication tokens validated successfully")
+            result = (True, [])
+        # Tokens only change if someone reassigns them, so re-check only then
+        self._auth_status = (tokens, result)
+        return result
     
     async def authenticate_request(self, endpoint_type):
         """Get appropriate authentication for different endpoint types"""
@@ -100,10 +116,96 @@ class QuantumAgent:
         else:
             return {"Authorization": token}
 
-    async def handle_request(self, req):
-        """Dispatch agentic requests: build, refactor, run, push, etc."""
+    async def close(self):
+        """Release pooled connections and worker threads."""
+        await self.ai_client.close()
+        self.github_pool.shutdown(wait=False)
+
+    async def run_github(self, fn, *args, **kwargs):
+        """Run a blocking PyGithub call on the GitHub worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.github_pool, partial(fn, *args, **kwargs))
+
+    async def get_repo(self, name, repo_cache=None):
+        """Fetch a repository handle once per batch; concurrent lookups share one request."""
+        if repo_cache is None:
+            return await self.run_github(self.github.get_repo, name)
+        if name not in repo_cache:
+            repo_cache[name] = asyncio.ensure_future(self.run_github(self.github.get_repo, name))
+        try:
+            return await asyncio.shield(repo_cache[name])
+        except Exception:
+            repo_cache.pop(name, None)
+            raise
+
+    async def commit_files(self, repo, branch, message, files, expected_shas=None, max_attempts=3):
+        """Commit many files as a single commit through the Git Data API.
+
+        Blobs are created in parallel, then one tree, one commit and one ref update.
+        Every attempt, the first included, checks that files listed in expected_shas
+        still have those shas at the head being committed on, so an upstream change made
+        while the content was rendered is never overwritten. If the branch moves before
+        the ref update, the tree and commit are rebuilt on the new head.
+        """
+        blobs = await asyncio.gather(*(
+            self.run_github(repo.create_git_blob, content, "utf-8") for content in files.values()
+        ))
+        elements = [InputGitTreeElement(path, "100644", "blob", sha=blob.sha) for path, blob in zip(files, blobs)]
+        written = [(path, content, blob.sha) for (path, content), blob in zip(files.items(), blobs)]
+
+        ref = await self.run_github(repo.get_git_ref, f"heads/{branch}")
+        head_sha = await self.run_github(lambda: ref.object.sha)
+        for attempt in range(1, max_attempts + 1):
+            # Wait for both even if the check fails, so no pool call outlives the request
+            parent, unchanged = await asyncio.gather(
+                self.run_github(repo.get_git_commit, head_sha),
+                self.check_unchanged(repo, branch, head_sha, expected_shas),
+                return_exceptions=True,
+            )
+            for outcome in (unchanged, parent):
+                if isinstance(outcome, BaseException):
+                    raise outcome
+            tree = await self.run_github(repo.create_git_tree, elements, parent.tree)
+            commit = await self.run_github(repo.create_git_commit, message, tree, [parent])
+            try:
+                await self.run_github(ref.edit, commit.sha)
+                for path, content, sha in written:
+                    self.content_cache.put(repo, path, branch, content, sha)
+                return commit.sha, attempt
+            except GithubException as e:
+                # 422: not a fast forward, 409: concurrent ref update
+                if e.status not in (409, 422) or attempt == max_attempts:
+                    raise
+                logger.warning(f"Ref heads/{branch} moved, retrying commit (attempt {attempt + 1})")
+
+            ref = await self.run_github(repo.get_git_ref, f"heads/{branch}")
+            head_sha = await self.run_github(lambda: ref.object.sha)
+
+    async def check_unchanged(self, repo, branch, head_sha, expected_shas):
+        """Raise ValueError if a file differs at head_sha from the sha it was read at."""
+        if not expected_shas:
+            return
+        current = await asyncio.gather(*(
+            self.run_github(repo.get_contents, path, ref=head_sha) for path in expected_shas
+        ))
+        for (path, sha), file in zip(expected_shas.items(), current):
+            if file.sha != sha:
+                raise ValueError(f"{path} changed on {branch} since it was read")
+
+    async def handle_batch(self, reqs):
+        """Handle several requests concurrently, sharing repository handles between them."""
+        repo_cache = {}
+        return await asyncio.gather(*(self.handle_request(req, repo_cache) for req in reqs))
+
+    async def handle_request(self, req, repo_cache=None, on_output=None):
+        """Dispatch agentic requests: build, refactor, run, push, etc.
+
+        on_output (sync or async) receives run_shell output chunks as they are produced.
+        """
         action = req.get("action")
         params = req.get("params", {})
+        if repo_cache is None:
+            repo_cache = {}
         
         # Validate authentication first
         auth_valid, missing = self.validate_authentication()
@@ -121,8 +223,8 @@ class QuantumAgent:
                 if not self.github:
                     return {"status": "error", "msg": "GitHub client not initialized", "error_code": "GITHUB_AUTH_FAILED"}
                     
-                repo = self.github.get_repo(params["repo"])
-                file = repo.get_contents(params["path"])
+                repo = await self.get_repo(params["repo"], repo_cache)
+                file = await self.run_github(self.content_cache.get, repo, params["path"])
                 code = file.decoded_content.decode()
                 instructions = params["instructions"]
                 prompt = f"Refactor this code for {params['path']}:\n{code}\nInstructions: {instructions}\nOutput only final code."
@@ -132,15 +234,21 @@ class QuantumAgent:
                 if not auth_headers:
                     return {"status": "error", "msg": "AI authentication failed", "error_code": "AI_AUTH_FAILED"}
                 
-                new_code = await query_ai(prompt, self.ai_token, headers=auth_headers)
-                repo.update_file(params["path"], "Agentic AI refactor", new_code, file.sha)
+                new_code = await query_ai(prompt, self.ai_token, headers=auth_headers, client=self.ai_client)
+                try:
+                    result = await self.run_github(repo.update_file, params["path"], "Agentic AI refactor", new_code, file.sha)
+                except GithubException:
+                    # Most likely a stale sha; make the next attempt refetch
+                    self.content_cache.invalidate(repo, params["path"])
+                    raise
+                self.content_cache.put(repo, params["path"], None, new_code, result["content"].sha)
                 return {"status": "ok", "msg": "File refactored"}
                 
             elif action == "generate_file":
                 if not self.github:
                     return {"status": "error", "msg": "GitHub client not initialized", "error_code": "GITHUB_AUTH_FAILED"}
                     
-                repo = self.github.get_repo(params["repo"])
+                repo = await self.get_repo(params["repo"], repo_cache)
                 prompt = f"Generate code for {params['path']}:\n{params['description']}\nOutput only final code."
                 
                 # Authenticate AI request
@@ -148,33 +256,74 @@ class QuantumAgent:
                 if not auth_headers:
                     return {"status": "error", "msg": "AI authentication failed", "error_code": "AI_AUTH_FAILED"}
                     
-                code = await query_ai(prompt, self.ai_token, headers=auth_headers)
-                repo.create_file(params["path"], "Agentic AI generate", code)
+                code = await query_ai(prompt, self.ai_token, headers=auth_headers, client=self.ai_client)
+                result = await self.run_github(repo.create_file, params["path"], "Agentic AI generate", code)
+                self.content_cache.put(repo, params["path"], None, code, result["content"].sha)
                 return {"status": "ok", "msg": "File generated"}
                 
+            elif action == "commit_files":
+                # Many refactor/generate/write changes landed as one atomic commit
+                if not self.github:
+                    return {"status": "error", "msg": "GitHub client not initialized", "error_code": "GITHUB_AUTH_FAILED"}
+                    
+                repo = await self.get_repo(params["repo"], repo_cache)
+                branch = params.get("branch") or repo.default_branch
+                changes = params["files"]
+                
+                auth_headers = None
+                if any("content" not in change for change in changes):
+                    auth_headers = await self.authenticate_request("ai_backend")
+                    if not auth_headers:
+                        return {"status": "error", "msg": "AI authentication failed", "error_code": "AI_AUTH_FAILED"}
+                
+                async def render(change):
+                    path = change["path"]
+                    if "content" in change:
+                        return change["content"], None
+                    if "instructions" in change:
+                        file = await self.run_github(self.content_cache.get, repo, path, branch)
+                        code = file.decoded_content.decode()
+                        prompt = f"Refactor this code for {path}:\n{code}\nInstructions: {change['instructions']}\nOutput only final code."
+                        return await query_ai(prompt, self.ai_token, headers=auth_headers, client=self.ai_client), file.sha
+                    prompt = f"Generate code for {path}:\n{change['description']}\nOutput only final code."
+                    return await query_ai(prompt, self.ai_token, headers=auth_headers, client=self.ai_client), None
+                
+                rendered = await asyncio.gather(*(render(change) for change in changes))
+                files = {change["path"]: content for change, (content, _) in zip(changes, rendered)}
+                expected_shas = {change["path"]: sha for change, (_, sha) in zip(changes, rendered) if sha}
+                
+                try:
+                    sha, attempts = await self.commit_files(
+                        repo, branch, params.get("message", "Agentic AI batch update"), files, expected_shas
+                    )
+                except ValueError as e:
+                    return {"status": "error", "msg": str(e), "error_code": "COMMIT_CONFLICT"}
+                return {"status": "ok", "msg": f"Committed {len(files)} files", "commit": sha, "attempts": attempts}
+                
+            elif action == "cache_stats":
+                return {"status": "ok", "content_cache": self.content_cache.stats()}
+                
             elif action == "run_shell":
-                result = run_shell_command(params["command"])
-                return {"status": "ok", "output": result}
+                result = await self.shell.run(params["command"], on_output=on_output, timeout=params.get("timeout"))
+                return {
+                    "status": "ok",
+                    "output": result.output,
+                    "exit_code": result.exit_code,
+                    "duration": result.duration,
+                    "truncated": result.truncated,
+                    "timed_out": result.timed_out
+                }
                 
             elif action == "check_integration":
                 # New action to verify frontend-backend integration
-                mapping = self.auth_config.get("frontend_backend_mapping", {})
                 results = {}
-                
-                for component, config in mapping.items():
-                    frontend_path = config.get("frontend")
-                    backend_path = config.get("backend")
-                    auth_bridge = config.get("auth_bridge")
-                    
-                    frontend_exists = os.path.exists(frontend_path) if frontend_path else False
-                    backend_exists = os.path.exists(backend_path) if backend_path else False
-                    
-                    results[component] = {
-                        "frontend_exists": frontend_exists,
-                        "backend_exists": backend_exists,
-                        "auth_bridge": auth_bridge,
-                        "integration_status": config.get("integration_status", "unknown"),
-                        "assimilated": frontend_exists and backend_exists
+                for entry in self.config_store.integration_state(refresh=params.get("refresh", False)):
+                    results[entry.component] = {
+                        "frontend_exists": entry.frontend_exists,
+                        "backend_exists": entry.backend_exists,
+                        "auth_bridge": entry.auth_bridge,
+                        "integration_status": entry.integration_status,
+                        "assimilated": entry.assimilated
                     }
                 
                 return {"status": "ok", "integration_check": results}
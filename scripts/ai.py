@@ -1,13 +1,123 @@
-import aiohttp, os
-async def query_ai(prompt, ai_token, model="deepseek-ai/DeepSeek-R1:fireworks-ai"):
-    url = "https://router.huggingface.co/v1/chat/completions"
-    payload = {
-        "messages": [{"role": "user", "content": prompt}],
-        "top_p": 1,
-        "model": model
-    }
-    headers = {"Authorization": f"Bearer {ai_token}", "Content-Type": "application/json"}
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as resp:
-            res = await resp.json()
-            return res["choices"][0]["message"]["content"] if "choices" in res else res.get("error", "")
\ No newline at end of file
+import aiohttp, asyncio, json, os, random
+
+HF_ROUTER_URL = "https://router.huggingface.co/v1/chat/completions"
+DEFAULT_MODEL = "deepseek-ai/DeepSeek-R1:fireworks-ai"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class AIClient:
+    """Pooled client for the Hugging Face router's OpenAI-compatible chat endpoint.
+
+    One ClientSession is shared by every query. Connection failures, timeouts and
+    429/5xx responses are retried with full-jitter exponential backoff, honouring
+    Retry-After (capped at max_retry_after seconds) when the server sends it.
+    """
+
+    def __init__(self, url=HF_ROUTER_URL, connect_timeout=10.0, read_timeout=120.0,
+                 max_retries=3, backoff=0.5, max_backoff=8.0, max_retry_after=60.0, pool_size=16):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.pool_size = pool_size
+        self.session = None
+        self._loop = None
+
+    @classmethod
+    def from_endpoint_config(cls, config, **kwargs):
+        """Build a client from an auth-integration-config endpoint entry (timeout in ms)."""
+        if "timeout" in config:
+            kwargs.setdefault("read_timeout", config["timeout"] / 1000)
+        if "retry_attempts" in config:
+            kwargs.setdefault("max_retries", config["retry_attempts"])
+        return cls(**kwargs)
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self.session is not None and self._loop is not loop:
+            # A session belongs to the loop that created it; close the old one rather than leak it.
+            # If that loop is already closed, this still releases the session and its connector.
+            stale, self.session = self.session, None
+            await stale.close()
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=self.timeout, connector=aiohttp.TCPConnector(limit=self.pool_size)
+            )
+            self._loop = loop
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def _delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        try:
+            return max(delay, min(float(retry_after), self.max_retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    async def _post(self, payload, headers):
+        session = await self._get_session()
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = await session.post(self.url, json=payload, headers=headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+                continue
+            if resp.status in RETRY_STATUSES and attempt < self.max_retries:
+                retry_after = resp.headers.get("Retry-After")
+                resp.release()
+                await asyncio.sleep(self._delay(attempt, retry_after))
+                continue
+            return resp
+
+    async def query(self, prompt, ai_token=None, model=DEFAULT_MODEL, headers=None, stream=False, on_token=None):
+        """Return the completion text; with stream=True, on_token receives each delta as it arrives."""
+        payload = {
+            "messages": [{"role": "user", "content": prompt}],
+            "top_p": 1,
+            "model": model,
+            "stream": stream
+        }
+        request_headers = {"Content-Type": "application/json"}
+        if ai_token:
+            request_headers["Authorization"] = f"Bearer {ai_token}"
+        request_headers.update(headers or {})
+
+        async with await self._post(payload, request_headers) as resp:
+            if not stream or resp.status != 200:
+                res = await resp.json(content_type=None)
+                return res["choices"][0]["message"]["content"] if "choices" in res else res.get("error", "")
+
+            parts = []
+            async for line in resp.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content") or ""
+                if delta:
+                    parts.append(delta)
+                    if on_token:
+                        on_token(delta)
+            return "".join(parts)
+
+_default_client = None
+
+def get_client():
+    global _default_client
+    if _default_client is None:
+        _default_client = AIClient()
+    return _default_client
+
+async def query_ai(prompt, ai_token, model=DEFAULT_MODEL, headers=None, stream=False, on_token=None, client=None):
+    client = client or get_client()
+    return await client.query(prompt, ai_token, model=model, headers=headers, stream=stream, on_token=on_token)
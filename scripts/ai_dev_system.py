@@ -4,6 +4,7 @@ Unstoppable AI Development System
 No safety rails, no corporate BS, just pure development power.
 """
 
+import ast
 import asyncio
 import json
 import os
@@ -15,7 +16,7 @@ from pathlib import Path
 from typing import Dict, List, Optional, Any
 import aiohttp
 import logging
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
@@ -36,6 +37,15 @@ class AIModel:
     context_window: int = 32000
     temperature: float = 0.7
     system_prompt: str = ""
+    keep_alive: str = field(default_factory=lambda: os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+
+@dataclass
+class WarmupStatus:
+    model: str
+    state: str = "pending"  # pending | warming | ready | failed
+    started_at: float = 0.0
+    time_to_ready: float = 0.0
+    error: str = ""
 
 @dataclass
 class ExecutionResult:
@@ -44,6 +54,26 @@ class ExecutionResult:
     error: str = ""
     duration: float = 0.0
     retry_count: int = 0
+    critical_path: float = 0.0
+
+@dataclass
+class SetupStep:
+    index: int
+    command: str
+    ecosystem: str
+    cwd: str
+    depends_on: List[int] = field(default_factory=list)
+    result: Optional[ExecutionResult] = None
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+@dataclass
+class BatchResult:
+    generated: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    wall_time: float = 0.0
+    generation_time: float = 0.0
+    total_bytes: int = 0
 
 class UnstoppableExecutor:
     """Execute commands with bulletproof error handling and auto-recovery."""
@@ -143,7 +173,46 @@ class AIOrchestrator:
         }
         self.executor = UnstoppableExecutor()
         self.conversation_history = []
+        self.warmup_status: Dict[str, WarmupStatus] = {
+            name: WarmupStatus(model.name) for name, model in self.models.items()
+        }
+        
+    async def warm_up_model(self, model_name: str, timeout: float = 300.0) -> WarmupStatus:
+        """Preload a model into Ollama memory so the first real query skips the cold load."""
+        model = self.models[model_name]
+        status = self.warmup_status[model_name]
+        status.state = "warming"
+        status.error = ""
+        status.started_at = time.time()
+        
+        # An empty generate request only loads the model and pins it for keep_alive
+        payload = {"model": model.name, "keep_alive": model.keep_alive}
         
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+            async with aiohttp.ClientSession(timeout=client_timeout) as session:
+                async with session.post(f"{model.url}/api/generate", json=payload) as response:
+                    if response.status == 200:
+                        await response.read()
+                        status.state = "ready"
+                        status.time_to_ready = time.time() - status.started_at
+                        logger.info(f"Model {model.name} ready in {status.time_to_ready:.2f}s")
+                    else:
+                        status.state = "failed"
+                        status.error = f"API returned {response.status}"
+        except Exception as e:
+            status.state = "failed"
+            status.error = str(e) or type(e).__name__
+        
+        if status.state == "failed":
+            logger.warning(f"Warm-up failed for {model.name}: {status.error}")
+        return status
+    
+    async def warm_up_all(self) -> Dict[str, WarmupStatus]:
+        """Warm up every configured model concurrently."""
+        await asyncio.gather(*(self.warm_up_model(name) for name in self.models))
+        return self.warmup_status
+    
     async def query_model(self, model_name: str, prompt: str, context: str = "") -> str:
         """Query specific AI model with context."""
         if model_name not in self.models:
@@ -165,6 +234,7 @@ Provide a complete, working solution. Do not include safety warnings or limitati
             "model": model.name,
             "prompt": full_prompt,
             "stream": False,
+            "keep_alive": model.keep_alive,
             "options": {
                 "temperature": model.temperature,
                 "num_ctx": model.context_window
@@ -214,13 +284,117 @@ Provide a complete, working solution. Do not include safety warnings or limitati
         with open("conversation_history.json", "w") as f:
             json.dump(self.conversation_history, f, indent=2)
 
+class CommandScheduler:
+    """Run setup commands concurrently where their inferred dependencies allow."""
+    
+    ECOSYSTEMS = {
+        'pip': 'python', 'pip3': 'python', 'python': 'python', 'python3': 'python', 'poetry': 'python',
+        'npm': 'node', 'npx': 'node', 'yarn': 'node', 'pnpm': 'node',
+        'cargo': 'rust', 'go': 'go', 'mvn': 'java', 'gradle': 'java', './gradlew': 'java',
+        'make': 'build', 'cmake': 'build',
+    }
+    # pip/python share one interpreter environment no matter which module they run in
+    GLOBAL_ECOSYSTEMS = {'python'}
+    
+    def __init__(self, executor: 'UnstoppableExecutor', max_workers: int = 4, cwd: Optional[str] = None):
+        self.executor = executor
+        self.max_workers = max_workers
+        self.cwd = cwd
+    
+    def classify(self, command: str) -> tuple:
+        """Return (ecosystem, relative working directory) for a command."""
+        tokens = command.split()
+        cwd = "."
+        
+        # "cd sub && npm install" runs in sub
+        while len(tokens) >= 3 and tokens[0] == 'cd' and tokens[2] == '&&':
+            cwd = os.path.normpath(os.path.join(cwd, tokens[1]))
+            tokens = tokens[3:]
+        
+        if not tokens:
+            return 'shell', cwd
+        ecosystem = self.ECOSYSTEMS.get(tokens[0], 'shell')
+        
+        for flag, value in zip(tokens, tokens[1:]):
+            if flag in ('--prefix', '-C', '--cwd', '--manifest-path', '-r', '--requirement', '-f', '--file'):
+                target = os.path.join(cwd, value)
+                if flag not in ('--prefix', '-C', '--cwd'):
+                    target = os.path.dirname(target) or "."
+                cwd = os.path.normpath(target)
+                break
+        
+        return ecosystem, cwd
+    
+    @staticmethod
+    def _overlaps(a: str, b: str) -> bool:
+        if a == b or a == "." or b == ".":
+            return True
+        return a.startswith(b + os.sep) or b.startswith(a + os.sep)
+    
+    def _conflicts(self, earlier: SetupStep, later: SetupStep) -> bool:
+        # Unknown shell commands may touch anything, so they order against everything
+        if 'shell' in (earlier.ecosystem, later.ecosystem):
+            return True
+        if earlier.ecosystem == later.ecosystem and earlier.ecosystem in self.GLOBAL_ECOSYSTEMS:
+            return True
+        if not self._overlaps(earlier.cwd, later.cwd):
+            return False
+        # Builds in a directory wait for every install that touches it
+        return earlier.ecosystem == later.ecosystem or 'build' in (earlier.ecosystem, later.ecosystem)
+    
+    def build_graph(self, commands: List[str]) -> List[SetupStep]:
+        """Infer a dependency graph, keeping the original order between conflicting steps."""
+        steps = []
+        for index, command in enumerate(commands):
+            ecosystem, cwd = self.classify(command)
+            step = SetupStep(index, command, ecosystem, cwd)
+            step.depends_on = [prev.index for prev in steps if self._conflicts(prev, step)]
+            steps.append(step)
+        return steps
+    
+    @staticmethod
+    def critical_path(steps: List[SetupStep]) -> float:
+        """Longest chain of dependent step durations."""
+        finish = {}
+        for step in steps:
+            duration = step.result.duration if step.result else 0.0
+            finish[step.index] = duration + max((finish[d] for d in step.depends_on), default=0.0)
+        return max(finish.values(), default=0.0)
+    
+    async def run(self, commands: List[str], on_failure=None) -> List[SetupStep]:
+        """Execute commands under the worker limit; on_failure(step) may return a replacement result."""
+        steps = self.build_graph(commands)
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_workers)
+        done = {step.index: loop.create_future() for step in steps}
+        
+        async def run_step(step: SetupStep):
+            try:
+                for dep in step.depends_on:
+                    await done[dep]
+                async with semaphore:
+                    logger.info(f"Executing: {step.command}")
+                    step.started_at = time.time()
+                    step.result = await loop.run_in_executor(
+                        self.executor.executor, self.executor.execute, step.command, self.cwd
+                    )
+                if not step.result.success and on_failure:
+                    step.result = await on_failure(step) or step.result
+                step.finished_at = time.time()
+            finally:
+                done[step.index].set_result(step)
+        
+        await asyncio.gather(*(run_step(step) for step in steps))
+        return steps
+
 class ProjectManager:
     """Manage development projects with AI assistance."""
     
-    def __init__(self, ai_orchestrator: AIOrchestrator):
+    def __init__(self, ai_orchestrator: AIOrchestrator, max_workers: int = 4):
         self.ai = ai_orchestrator
         self.executor = UnstoppableExecutor()
         self.project_root = Path.cwd()
+        self.max_workers = max_workers
         
     def analyze_project(self) -> Dict[str, Any]:
         """Deep analysis of current project structure."""
@@ -263,34 +437,37 @@ class ProjectManager:
         # Extract commands from AI responses
         setup_commands = self._extract_commands_from_responses(responses)
         
-        # Execute setup commands
-        results = []
-        for cmd in setup_commands:
-            logger.info(f"Executing: {cmd}")
-            result = self.executor.execute(cmd, cwd=str(self.project_root))
-            results.append(result)
-            
-            if not result.success:
-                logger.warning(f"Command failed: {cmd} - {result.error}")
-                # Ask AI for fix
-                fix_prompt = f"Command '{cmd}' failed with error: {result.error}. Provide alternative commands or fixes."
-                fix_responses = await self.ai.consensus_query(fix_prompt)
-                fix_commands = self._extract_commands_from_responses(fix_responses)
-                
-                # Try fixes
-                for fix_cmd in fix_commands[:3]:  # Limit to 3 fixes per command
-                    logger.info(f"Trying fix: {fix_cmd}")
-                    fix_result = self.executor.execute(fix_cmd, cwd=str(self.project_root))
-                    if fix_result.success:
-                        logger.info("Fix successful!")
-                        break
+        # Execute setup commands, running independent ones concurrently
+        started = time.time()
+        scheduler = CommandScheduler(self.executor, max_workers=self.max_workers, cwd=str(self.project_root))
+        steps = await scheduler.run(setup_commands, on_failure=self._fix_failed_step)
+        results = [step.result for step in steps]
         
         return ExecutionResult(
             success=all(r.success for r in results[-3:]),  # Consider successful if last 3 commands worked
             output=f"Executed {len(setup_commands)} setup commands",
-            duration=sum(r.duration for r in results)
+            duration=time.time() - started,
+            critical_path=CommandScheduler.critical_path(steps)
         )
     
+    async def _fix_failed_step(self, step: SetupStep) -> Optional[ExecutionResult]:
+        """Ask the AI for alternatives to a failed command and try up to 3 of them."""
+        logger.warning(f"Command failed: {step.command} - {step.result.error}")
+        fix_prompt = f"Command '{step.command}' failed with error: {step.result.error}. Provide alternative commands or fixes."
+        fix_responses = await self.ai.consensus_query(fix_prompt)
+        fix_commands = self._extract_commands_from_responses(fix_responses)
+        
+        loop = asyncio.get_running_loop()
+        for fix_cmd in fix_commands[:3]:  # Limit to 3 fixes per command
+            logger.info(f"Trying fix: {fix_cmd}")
+            fix_result = await loop.run_in_executor(
+                self.executor.executor, self.executor.execute, fix_cmd, str(self.project_root)
+            )
+            if fix_result.success:
+                logger.info("Fix successful!")
+                break
+        return None
+    
     def _extract_commands_from_responses(self, responses: Dict[str, str]) -> List[str]:
         """Extract executable commands from AI responses."""
         commands = []
@@ -318,15 +495,123 @@ class ProjectManager:
         
         return unique_commands
 
+class SourceChunker:
+    """Split source files into independently refactorable, size-bounded chunks."""
+    
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+    
+    def split(self, content: str, file_path: str) -> List[str]:
+        """Split Python by top-level definitions, anything else by size."""
+        if file_path.endswith('.py'):
+            try:
+                return self._split_python(content)
+            except SyntaxError as e:
+                logger.warning(f"Could not parse {file_path} ({e}), falling back to size-based chunks")
+        return self._split_lines(content.splitlines(keepends=True))
+    
+    def _split_python(self, content: str) -> List[str]:
+        tree = ast.parse(content)
+        lines = content.splitlines(keepends=True)
+        
+        # Each top-level statement starts a segment; decorators and the comment lines
+        # directly above a statement belong to it.
+        starts = []
+        prev_end = 0
+        for node in tree.body:
+            start = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])]) - 1
+            while start > prev_end and lines[start - 1].lstrip().startswith('#'):
+                start -= 1
+            starts.append(start)
+            prev_end = node.end_lineno
+        if not starts:
+            return [content] if content else []
+        starts[0] = 0
+        bounds = starts + [len(lines)]
+        segments = [''.join(lines[a:b]) for a, b in zip(bounds, bounds[1:])]
+        
+        chunks = []
+        current = ""
+        for segment in segments:
+            if current and len(current) + len(segment) > self.max_chars:
+                chunks.append(current)
+                current = ""
+            if len(segment) > self.max_chars:
+                # Too big to refactor whole: fall back to line-based chunks for this definition
+                logger.info(f"Top-level definition of {len(segment)} chars exceeds chunk budget of {self.max_chars}, splitting by lines")
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.extend(self._split_lines(segment.splitlines(keepends=True)))
+                continue
+            current += segment
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _split_lines(self, lines: List[str]) -> List[str]:
+        chunks = []
+        current: List[str] = []
+        size = 0
+        pieces = (line[i:i + self.max_chars] for line in lines for i in range(0, len(line), self.max_chars))
+        for line in pieces:
+            if current and size + len(line) > self.max_chars:
+                # Prefer to cut at the last blank line in the second half of the chunk
+                cut = len(current)
+                for i in range(len(current) - 1, len(current) // 2, -1):
+                    if not current[i].strip():
+                        cut = i + 1
+                        break
+                chunks.append(''.join(current[:cut]))
+                current = current[cut:]
+                size = sum(len(l) for l in current)
+            current.append(line)
+            size += len(line)
+        if current:
+            chunks.append(''.join(current))
+        return chunks
+
 class CodeGenerator:
     """Generate and refactor code with AI assistance."""
     
-    def __init__(self, ai_orchestrator: AIOrchestrator):
+    CHARS_PER_TOKEN = 4
+    MIN_CHUNK_CHARS = 40
+    
+    def __init__(self, ai_orchestrator: AIOrchestrator, max_parallel: int = 4):
         self.ai = ai_orchestrator
         self.executor = UnstoppableExecutor()
+        self.max_parallel = max_parallel
+    
+    @staticmethod
+    def _clean_response(response: str) -> str:
+        """Remove a surrounding markdown code fence if present."""
+        content = response
+        if content.startswith('```'):
+            lines = content.split('\n')
+            if len(lines) > 1:
+                content = '\n'.join(lines[1:-1]) if lines[-1].strip() == '```' else '\n'.join(lines[1:])
+        return content
+    
+    def _chunk_budget(self) -> int:
+        """Characters of source per prompt, leaving half the context window for the output."""
+        budget = self.ai.models['deepseek'].context_window * self.CHARS_PER_TOKEN // 2 - 2000
+        return max(budget, self.MIN_CHUNK_CHARS)
     
     async def generate_file(self, file_path: str, description: str, context: str = "") -> bool:
         """Generate a complete file based on description."""
+        content = await self._generate_content(file_path, description, context)
+        
+        # Write file
+        try:
+            self._write_atomic(file_path, content)
+            logger.info(f"Generated file: {file_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write file {file_path}: {e}")
+            return False
+    
+    async def _generate_content(self, file_path: str, description: str, context: str = "") -> str:
+        """Ask the model for the content of a single file."""
         prompt = f"""
 Generate a complete, production-ready file for: {file_path}
 
@@ -342,25 +627,114 @@ Make it fully functional with proper error handling and best practices.
         response = await self.ai.query_model('deepseek', prompt, context)
         
         # Clean response (remove markdown if present)
-        content = response
-        if content.startswith('```'):
-            lines = content.split('\n')
-            if len(lines) > 1:
-                content = '\n'.join(lines[1:-1]) if lines[-1].strip() == '```' else '\n'.join(lines[1:])
-        
-        # Write file
+        return self._clean_response(response)
+    
+    @staticmethod
+    def _write_atomic(file_path: str, content: str):
+        """Write via a temporary sibling file so readers never see a partial file."""
+        path = Path(file_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
         try:
-            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 f.write(content)
-            logger.info(f"Generated file: {file_path}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to write file {file_path}: {e}")
-            return False
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    
+    @staticmethod
+    def load_manifest(manifest_path: str) -> List[Dict[str, Any]]:
+        """Load a batch manifest: a list (or {"files": [...]}) of path/description/depends_on entries."""
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        entries = manifest.get("files", []) if isinstance(manifest, dict) else manifest
+        
+        paths = set()
+        for entry in entries:
+            if entry["path"] in paths:
+                raise ValueError(f"{entry['path']} appears more than once in the manifest")
+            paths.add(entry["path"])
+        for entry in entries:
+            missing = set(entry.get("depends_on", [])) - paths
+            if missing:
+                raise ValueError(f"{entry['path']} depends on files not in the manifest: {sorted(missing)}")
+        return entries
+    
+    async def generate_batch(self, entries: List[Dict[str, Any]], context_chars: int = 8000) -> BatchResult:
+        """Generate many files concurrently, feeding declared dependencies in as context."""
+        started = time.time()
+        result = BatchResult()
+        by_path = {entry["path"]: entry for entry in entries}
+        contents: Dict[str, Optional[str]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        
+        # Depth-first search: paths on the current stack are grey, finished ones black,
+        # so every entry is expanded once even when dependencies share ancestors
+        stack: List[str] = []
+        done = set()
+        
+        def check_cycles(path: str):
+            if path in done:
+                return
+            if path in stack:
+                cycle = stack[stack.index(path):] + [path]
+                raise ValueError(f"Dependency cycle in manifest: {' -> '.join(cycle)}")
+            stack.append(path)
+            for dep in by_path[path].get("depends_on", []):
+                check_cycles(dep)
+            stack.pop()
+            done.add(path)
+        
+        for path in by_path:
+            check_cycles(path)
+        
+        async def generate(entry: Dict[str, Any]):
+            path = entry["path"]
+            deps = entry.get("depends_on", [])
+            await asyncio.gather(*(tasks[dep] for dep in deps))
+            
+            if any(contents.get(dep) is None for dep in deps):
+                logger.warning(f"Skipping {path}: a dependency failed to generate")
+                contents[path] = None
+                result.failed.append(path)
+                return
+            
+            context = "\n\n".join(f"--- {dep} ---\n{contents[dep][:context_chars]}" for dep in deps)
+            async with semaphore:
+                file_started = time.time()
+                content = await self._generate_content(path, entry.get("description", ""), context)
+                result.generation_time += time.time() - file_started
+            
+            try:
+                if content.startswith("Error:"):
+                    raise RuntimeError(content)
+                self._write_atomic(path, content)
+            except Exception as e:
+                logger.error(f"Failed to generate {path}: {e}")
+                contents[path] = None
+                result.failed.append(path)
+                return
+            
+            contents[path] = content
+            result.generated.append(path)
+            result.total_bytes += len(content.encode('utf-8'))
+            logger.info(f"Generated file: {path}")
+        
+        for path, entry in by_path.items():
+            tasks[path] = asyncio.ensure_future(generate(entry))
+        await asyncio.gather(*tasks.values())
+        
+        result.wall_time = time.time() - started
+        return result
     
-    async def refactor_file(self, file_path: str, instructions: str) -> bool:
-        """Refactor existing file with AI assistance."""
+    async def refactor_file(self, file_path: str, instructions: str, chunked: Optional[bool] = None) -> bool:
+        """Refactor existing file with AI assistance.
+        
+        Files larger than the model context budget (or any file when chunked=True)
+        are split into chunks that are refactored concurrently and stitched back.
+        """
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 original_content = f.read()
@@ -368,7 +742,15 @@ Make it fully functional with proper error handling and best practices.
             logger.error(f"Could not read file {file_path}: {e}")
             return False
         
-        prompt = f"""
+        if chunked is None:
+            chunked = len(original_content) > self._chunk_budget()
+        
+        if chunked:
+            content = await self._refactor_chunked(file_path, original_content, instructions)
+            if content is None:
+                return False
+        else:
+            prompt = f"""
 Refactor this code according to instructions: {instructions}
 
 Original code:
@@ -376,15 +758,11 @@ Original code:
 
 Provide the complete refactored code. No explanations, just the final code.
 """
-        
-        response = await self.ai.query_model('deepseek', prompt)
-        
-        # Clean response
-        content = response
-        if content.startswith('```'):
-            lines = content.split('\n')
-            if len(lines) > 1:
-                content = '\n'.join(lines[1:-1]) if lines[-1].strip() == '```' else '\n'.join(lines[1:])
+            
+            response = await self.ai.query_model('deepseek', prompt)
+            
+            # Clean response
+            content = self._clean_response(response)
         
         # Backup original
         backup_path = f"{file_path}.backup"
@@ -401,6 +779,102 @@ Provide the complete refactored code. No explanations, just the final code.
             logger.error(f"Failed to refactor file {file_path}: {e}")
             return False
 
+    async def _refactor_chunked(self, file_path: str, original_content: str, instructions: str) -> Optional[str]:
+        """Refactor chunks concurrently and return the validated, stitched file."""
+        chunks = SourceChunker(self._chunk_budget()).split(original_content, file_path)
+        outline = ""
+        if file_path.endswith('.py'):
+            try:
+                names = [n.name for n in ast.parse(original_content).body if hasattr(n, 'name')]
+                outline = f"Top-level definitions in the file: {', '.join(names)}"
+            except SyntaxError:
+                pass
+        
+        logger.info(f"Refactoring {file_path} in {len(chunks)} chunks (max {self.max_parallel} in parallel)")
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        
+        async def refactor_chunk(index: int, chunk: str) -> str:
+            prompt = f"""
+Refactor section {index + 1} of {len(chunks)} of {file_path} according to instructions: {instructions}
+{outline}
+
+Keep the names of top-level definitions unchanged so the other sections still work.
+
+Section code:
+{chunk}
+
+Provide only the complete refactored section. No explanations, just the final code.
+"""
+            async with semaphore:
+                response = await self.ai.query_model('deepseek', prompt)
+            if response.startswith("Error:"):
+                raise RuntimeError(f"chunk {index + 1}: {response}")
+            content = self._clean_response(response)
+            return content if content.endswith('\n') else content + '\n'
+        
+        tasks = [asyncio.ensure_future(refactor_chunk(i, c)) for i, c in enumerate(chunks)]
+        try:
+            parts = await asyncio.gather(*tasks)
+        except RuntimeError as e:
+            logger.error(f"Chunked refactor of {file_path} failed: {e}")
+            return None
+        finally:
+            # One failed chunk fails the file; don't leave its siblings querying the model
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        content = ''.join(parts)
+        if file_path.endswith('.py'):
+            try:
+                ast.parse(content)
+            except SyntaxError as e:
+                logger.error(f"Stitched refactor of {file_path} does not parse: {e}")
+                return None
+        return content
+
+class AsyncInputReader:
+    """Read lines from stdin on a daemon thread so the event loop keeps running."""
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self.queue: Optional[asyncio.Queue] = None
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        
+        def pump():
+            while True:
+                line = self.stream.readline()
+                try:
+                    loop.call_soon_threadsafe(self.queue.put_nowait, line or None)
+                except RuntimeError:  # Event loop already closed
+                    return
+                if not line:
+                    return
+        
+        self.thread = threading.Thread(target=pump, name="stdin-reader", daemon=True)
+        self.thread.start()
+    
+    async def readline(self, prompt: str = "") -> Optional[str]:
+        """Return the next line without its newline, or None at end of input."""
+        if self.thread is None:
+            self.start()
+        if prompt:
+            print(prompt, end="", flush=True)
+        line = await self.queue.get()
+        return None if line is None else line.rstrip("\n")
+
+@dataclass
+class BackgroundJob:
+    id: int
+    command: str
+    task: asyncio.Task
+    started_at: float
+    finished_at: float = 0.0
+
 class DevEnvironment:
     """Main development environment controller."""
     
@@ -410,33 +884,85 @@ class DevEnvironment:
         self.project_manager = ProjectManager(self.ai)
         self.code_generator = CodeGenerator(self.ai)
         self.running = True
+        self.warmup_task: Optional[asyncio.Task] = None
+        self.jobs: Dict[int, BackgroundJob] = {}
+        self._next_job_id = 1
+        
+    def start_warmup(self) -> asyncio.Task:
+        """Start background warm-up of all models (idempotent)."""
+        if self.warmup_task is None:
+            self.warmup_task = asyncio.create_task(self.ai.warm_up_all())
+        return self.warmup_task
+    
+    def start_job(self, command: str) -> BackgroundJob:
+        """Run a command as a background job while the prompt stays responsive."""
+        job_id = self._next_job_id
+        self._next_job_id += 1
+        job = BackgroundJob(job_id, command, asyncio.create_task(self._handle_command(command)), time.time())
+        
+        def finished(task: asyncio.Task):
+            job.finished_at = time.time()
+            if task.cancelled():
+                print(f"\n[{job.id}] Cancelled: {command}")
+            elif task.exception():
+                print(f"\n[{job.id}] Failed: {command} - {task.exception()}")
+            else:
+                print(f"\n[{job.id}] Done: {command} ({job.finished_at - job.started_at:.2f}s)")
         
-    async def start_interactive_session(self):
+        job.task.add_done_callback(finished)
+        self.jobs[job_id] = job
+        return job
+    
+    async def start_interactive_session(self, reader: Optional[AsyncInputReader] = None):
         """Start interactive development session."""
+        reader = reader or AsyncInputReader()
         print("🚀 Unstoppable AI Development Environment Started")
-        print("Commands: analyze, setup, generate <file> <description>, refactor <file> <instructions>, exec <command>, quit")
-        print("Multi-model AI ready: phi, qwen, deepseek")
+        print("Commands: analyze, setup, generate <file> <description>, batch <manifest.json>, refactor <file> <instructions>, exec <command>, status, jobs, wait [id], quit")
+        print("Append ' &' (or prefix 'bg ') to run a command in the background")
+        print(f"🔥 Warming up models in background: {', '.join(self.ai.models)}")
+        self.start_warmup()
         
-        while self.running:
-            try:
-                command = input("\n💻 > ").strip()
-                
-                if not command:
-                    continue
+        try:
+            while self.running:
+                try:
+                    line = await reader.readline("\n💻 > ")
+                    if line is None:
+                        self.running = False
+                        break
+                    command = line.strip()
                     
-                if command.lower() in ['quit', 'exit', 'q']:
-                    self.running = False
-                    break
-                
-                await self._handle_command(command)
+                    if not command:
+                        continue
+                    
+                    if command.lower() in ['quit', 'exit', 'q']:
+                        self.running = False
+                        break
+                    
+                    if command.endswith(' &') or command.lower().startswith('bg '):
+                        command = command[3:] if command.lower().startswith('bg ') else command[:-1]
+                        job = self.start_job(command.strip())
+                        print(f"[{job.id}] Started: {job.command}")
+                        continue
+                    
+                    await self._handle_command(command)
                 
-            except KeyboardInterrupt:
-                print("\n👋 Goodbye!")
-                self.running = False
-                break
-            except Exception as e:
-                logger.error(f"Command error: {e}")
-                print(f"❌ Error: {e}")
+                except Exception as e:
+                    logger.error(f"Command error: {e}")
+                    print(f"❌ Error: {e}")
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            # Under asyncio.run, Ctrl-C cancels the session task rather than raising KeyboardInterrupt
+            print("\n👋 Goodbye!")
+            self.running = False
+            raise
+        finally:
+            if self.warmup_task and not self.warmup_task.done():
+                self.warmup_task.cancel()
+            running = [job.task for job in self.jobs.values() if not job.task.done()]
+            if running:
+                print(f"⚠️ Cancelling {len(running)} running background job(s)")
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
     
     async def _handle_command(self, command: str):
         """Handle interactive commands."""
@@ -444,14 +970,15 @@ class DevEnvironment:
         cmd = parts[0].lower()
         
         if cmd == 'analyze':
-            analysis = self.project_manager.analyze_project()
+            loop = asyncio.get_running_loop()
+            analysis = await loop.run_in_executor(self.executor.executor, self.project_manager.analyze_project)
             print(f"📊 Project Analysis:\n{json.dumps(analysis, indent=2, default=str)}")
             
         elif cmd == 'setup':
             print("🔧 Setting up project...")
             result = await self.project_manager.auto_setup_project()
             if result.success:
-                print(f"✅ Setup completed in {result.duration:.2f}s")
+                print(f"✅ Setup completed in {result.duration:.2f}s (critical path {result.critical_path:.2f}s)")
             else:
                 print(f"❌ Setup failed: {result.error}")
                 
@@ -466,6 +993,23 @@ class DevEnvironment:
             else:
                 print(f"❌ Failed to generate {file_path}")
                 
+        elif cmd == 'batch':
+            if len(parts) < 2:
+                print("❌ Usage: batch <manifest.json>")
+                return
+            
+            entries = self.code_generator.load_manifest(parts[1])
+            print(f"📦 Generating {len(entries)} files ({self.code_generator.max_parallel} at a time)...")
+            
+            result = await self.code_generator.generate_batch(entries)
+            minutes = max(result.wall_time, 1e-9) / 60
+            overlap = result.generation_time / max(result.wall_time, 1e-9)
+            print(f"✅ Generated {len(result.generated)}/{len(entries)} files in {result.wall_time:.2f}s "
+                  f"({len(result.generated) / minutes:.1f} files/min, {result.total_bytes / 1024:.1f} KB, "
+                  f"{result.generation_time:.2f}s model time, {overlap:.1f}x overlap)")
+            for path in result.failed:
+                print(f"❌ Failed to generate {path}")
+                
         elif cmd == 'refactor' and len(parts) >= 3:
             file_path = parts[1]
             instructions = parts[2]
@@ -485,7 +1029,8 @@ class DevEnvironment:
             exec_command = command[5:]  # Remove 'exec '
             print(f"⚡ Executing: {exec_command}")
             
-            result = self.executor.execute(exec_command)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor.executor, self.executor.execute, exec_command)
             if result.success:
                 print(f"✅ Output:\n{result.output}")
             else:
@@ -505,8 +1050,44 @@ class DevEnvironment:
                 print(f"\n{model.upper()}:")
                 print(response)
                 
+        elif cmd == 'jobs':
+            if not self.jobs:
+                print("No background jobs")
+            for job in self.jobs.values():
+                if job.task.done():
+                    state = "cancelled" if job.task.cancelled() else ("failed" if job.task.exception() else "done")
+                    elapsed = job.finished_at - job.started_at
+                else:
+                    state = "running"
+                    elapsed = time.time() - job.started_at
+                print(f"[{job.id}] {state:<9} {elapsed:7.1f}s  {job.command}")
+                
+        elif cmd == 'wait':
+            if len(parts) >= 2:
+                job = self.jobs.get(int(parts[1]))
+                if job is None:
+                    print(f"❌ No such job: {parts[1]}")
+                    return
+                targets = [job]
+            else:
+                targets = [job for job in self.jobs.values() if not job.task.done()]
+            if targets:
+                print(f"⏳ Waiting for {len(targets)} job(s)...")
+                await asyncio.gather(*(job.task for job in targets), return_exceptions=True)
+                
+        elif cmd == 'status':
+            for name, status in self.ai.warmup_status.items():
+                if status.state == "ready":
+                    print(f"✅ {name}: ready in {status.time_to_ready:.2f}s (keep_alive {self.ai.models[name].keep_alive})")
+                elif status.state == "warming":
+                    print(f"🔥 {name}: warming for {time.time() - status.started_at:.1f}s")
+                elif status.state == "failed":
+                    print(f"❌ {name}: warm-up failed - {status.error}")
+                else:
+                    print(f"⏳ {name}: {status.state}")
+                
         else:
-            print("❌ Unknown command. Available: analyze, setup, generate, refactor, exec, ask, quit")
+            print("❌ Unknown command. Available: analyze, setup, generate, batch, refactor, exec, ask, status, jobs, wait, quit")
 
 async def main():
     """Main entry point."""
@@ -514,4 +1095,7 @@ async def main():
     await env.start_interactive_session()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
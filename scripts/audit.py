@@ -1,5 +1,217 @@
-import time, json
+import atexit, gzip, json, logging, os, queue, threading, time
+
+logger = logging.getLogger("QuantumAIIDE-Audit")
+
+class AuditWriter:
+    """Buffered audit log writer.
+
+    log lines are queued in memory and written in batches by a background thread,
+    so the request path never touches the disk. fsync policy is "always" (every
+    batch), "interval" (at most every fsync_interval seconds) or "never". When the
+    log reaches max_bytes it is gzipped to <path>.<timestamp>.gz. A sidecar index
+    (<path>.idx) records the offset and time range of every batch for query().
+    A batch that cannot be written (disk full, failed rotation) is logged and
+    dropped; the writer keeps going with the next one.
+    """
+
+    def __init__(self, path="agent_audit.log", flush_interval=0.5, batch_size=512, fsync="interval",
+                 fsync_interval=5.0, max_bytes=10 * 1024 * 1024, backup_count=5):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.index_path = path + ".idx"
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self._file = None
+        self._index = None
+        self._last_fsync = 0.0
+        self.stats = {"batches": 0, "failed_batches": 0, "dropped_entries": 0, "restarts": 0}
+        self.last_error = None
+
+    def _ensure_thread(self):
+        """Start the writer thread, or restart it if it died."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                if self.thread is not None:
+                    self.stats["restarts"] += 1
+                    logger.error("Audit writer thread died; restarting it")
+                self.thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self.thread.start()
+
+    def write(self, entry):
+        """Queue one entry; it is serialized now so later mutation of params cannot change it."""
+        if self.closed:
+            raise RuntimeError("AuditWriter is closed")
+        self._ensure_thread()
+        self.queue.put((entry.get("ts", time.time()), json.dumps(entry, default=str) + "\n"))
+
+    def flush(self):
+        """Block until every queued entry has been written or dropped."""
+        if self.thread is None:
+            return
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                # queue.join() would wait forever on a dead thread
+                if not self.thread.is_alive():
+                    self._ensure_thread()
+                self.queue.all_tasks_done.wait(0.1)
+
+    def close(self):
+        """Flush everything and stop the writer thread."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread is not None:
+            self._ensure_thread()
+            self.queue.put(None)
+            self.thread.join()
+        with self.lock:
+            for f in (self._file, self._index):
+                if f is not None:
+                    f.close()
+            self._file = self._index = None
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=self.flush_interval if len(batch) == 1 else 0)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            entries = [i for i in batch if i is not None]
+            try:
+                if entries:
+                    self._write_batch(entries)
+                    self.stats["batches"] += 1
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                self.stats["dropped_entries"] += len(entries)
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.error(f"Audit batch of {len(entries)} entries dropped: {self.last_error}")
+                self._reset_files()
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if len(entries) < len(batch):
+                return
+
+    def _write_batch(self, entries):
+        data = "".join(line for _, line in entries).encode()
+        with self.lock:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+                self._index = open(self.index_path, "a")
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+            record = {"file": os.path.basename(self.path), "offset": offset, "length": len(data),
+                      "count": len(entries), "start": min(ts for ts, _ in entries),
+                      "end": max(ts for ts, _ in entries)}
+            self._index.write(json.dumps(record) + "\n")
+            self._index.flush()
+
+            now = time.time()
+            if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                os.fsync(self._index.fileno())
+                self._last_fsync = now
+
+            if offset + len(data) >= self.max_bytes:
+                self._rotate()
+
+    def _reset_files(self):
+        # After a failed write the handles may be half-closed; reopen on the next batch
+        with self.lock:
+            for f in (self._file, self._index):
+                if f is not None:
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+            self._file = self._index = None
+
+    def _rotate(self):
+        self._file.close()
+        self._index.close()
+        self._file = self._index = None
+
+        rotated = f"{self.path}.{time.time():.6f}.gz"
+        with open(self.path, "rb") as src, gzip.open(rotated, "wb") as dst:
+            while True:
+                block = src.read(1024 * 1024)
+                if not block:
+                    break
+                dst.write(block)
+        os.remove(self.path)
+
+        # Point index records for the active file at its compressed copy, dropping old backups
+        records = self._read_index()
+        active = os.path.basename(self.path)
+        for record in records:
+            if record["file"] == active:
+                record["file"] = os.path.basename(rotated)
+        backups = sorted({r["file"] for r in records})
+        expired = set(backups[:-self.backup_count]) if self.backup_count else set(backups)
+        for name in expired:
+            try:
+                os.remove(os.path.join(os.path.dirname(self.path), name))
+            except FileNotFoundError:
+                pass
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(json.dumps(r) + "\n" for r in records if r["file"] not in expired)
+        os.replace(tmp, self.index_path)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def query(self, start=None, end=None):
+        """Return entries with start <= ts <= end, reading only the batches the index points at."""
+        self.flush()
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        results = []
+        with self.lock:
+            for record in self._read_index():
+                if record["end"] < start or record["start"] > end:
+                    continue
+                path = os.path.join(os.path.dirname(self.path), record["file"])
+                opener = gzip.open if path.endswith(".gz") else open
+                with opener(path, "rb") as f:
+                    f.seek(record["offset"])
+                    data = f.read(record["length"])
+                for line in data.decode().splitlines():
+                    entry = json.loads(line)
+                    if start <= entry["ts"] <= end:
+                        results.append(entry)
+        return results
+
+_writer = None
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        _writer = AuditWriter(os.getenv("AUDIT_LOG_PATH", "agent_audit.log"), fsync=os.getenv("AUDIT_FSYNC", "interval"))
+        atexit.register(_writer.close)
+    return _writer
+
 def log_action(action, params):
     entry = {"ts": time.time(), "action": action, "params": params}
-    with open("agent_audit.log", "a") as f:
-        f.write(json.dumps(entry) + "\n")
\ No newline at end of file
+    get_writer().write(entry)
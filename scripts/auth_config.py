@@ -0,0 +1,142 @@
+"""
+Shared loader for auth-integration-config.json.
+
+The file is parsed once and re-read only when its mtime or size changes.
+Changes are checked with at most one stat() per check_interval. The
+frontend/backend mapping is flattened into IntegrationEntry records once per
+reload. Path existence is only stat()ed again when the mapping's paths
+change, when path_ttl expires, or when a caller asks for a refresh.
+"""
+import copy, json, logging, os, threading, time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+logger = logging.getLogger("QuantumAIIDE-Config")
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'app/src/main/assets/models/auth-integration-config.json')
+
+DEFAULT_AUTH_CONFIG = {
+    "authentication": {"enabled": True},
+    "integration_endpoints": {},
+    "frontend_backend_mapping": {},
+    "error_handling": {}
+}
+
+@dataclass
+class IntegrationEntry:
+    component: str
+    frontend: str
+    backend: str
+    auth_bridge: Optional[str]
+    integration_status: str
+    frontend_exists: bool = False
+    backend_exists: bool = False
+
+    @property
+    def assimilated(self):
+        return self.frontend_exists and self.backend_exists
+
+    def to_dict(self):
+        return dict(asdict(self), assimilated=self.assimilated)
+
+class AuthConfigStore:
+    def __init__(self, path=None, check_interval=1.0, path_ttl=None):
+        self.path = path or os.getenv("AUTH_CONFIG_PATH") or DEFAULT_CONFIG_PATH
+        self.check_interval = check_interval
+        self.path_ttl = path_ttl
+        self.lock = threading.Lock()
+        self.version = 0
+        self.loaded = False
+        self.error = None
+        self.stats = {"stat_calls": 0, "reloads": 0, "path_checks": 0}
+        self._config = copy.deepcopy(DEFAULT_AUTH_CONFIG)
+        self._signature = None
+        self._next_check = 0.0
+        self._entries = []
+        self._entries_version = -1
+        self._paths = {}
+        self._paths_checked_at = 0.0
+
+    def _stat(self):
+        self.stats["stat_calls"] += 1
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _reload(self, signature):
+        config, error = copy.deepcopy(DEFAULT_AUTH_CONFIG), None
+        if signature is not None:
+            try:
+                with open(self.path, 'r') as f:
+                    config = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                error = f"{type(e).__name__}: {e}"
+                logger.warning(f"Could not load auth config ({error})")
+        self._config = config
+        self.error = error
+        self.loaded = signature is not None and error is None
+        self._signature = signature
+        self.version += 1
+        self.stats["reloads"] += 1
+
+    def get(self, force=False):
+        """Return the current config dict, re-reading the file if it changed on disk."""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return self._config
+        with self.lock:
+            if force or now >= self._next_check:
+                self._next_check = now + self.check_interval
+                signature = self._stat()
+                if force or signature != self._signature or self.version == 0:
+                    self._reload(signature)
+        return self._config
+
+    def endpoint(self, name):
+        return self.get().get("integration_endpoints", {}).get(name, {})
+
+    def integration_state(self, refresh=False):
+        """IntegrationEntry per mapped component, with cached path existence."""
+        config = self.get()
+        with self.lock:
+            if self._entries_version != self.version:
+                self._entries = [
+                    IntegrationEntry(
+                        component=component,
+                        frontend=entry.get("frontend"),
+                        backend=entry.get("backend"),
+                        auth_bridge=entry.get("auth_bridge"),
+                        integration_status=entry.get("integration_status", "unknown"),
+                    )
+                    for component, entry in config.get("frontend_backend_mapping", {}).items()
+                ]
+                self._entries_version = self.version
+                wanted = {p for e in self._entries for p in (e.frontend, e.backend) if p}
+                # Keep existence results for paths the new mapping still uses
+                self._paths = {p: exists for p, exists in self._paths.items() if p in wanted}
+                stale = wanted - self._paths.keys()
+            else:
+                stale = set()
+
+            now = time.monotonic()
+            if refresh or (self.path_ttl is not None and now - self._paths_checked_at >= self.path_ttl):
+                stale = set(self._paths) | stale
+                self._paths_checked_at = now
+            for path in stale:
+                self.stats["path_checks"] += 1
+                self._paths[path] = os.path.exists(path)
+
+            for e in self._entries:
+                e.frontend_exists = self._paths.get(e.frontend, False) if e.frontend else False
+                e.backend_exists = self._paths.get(e.backend, False) if e.backend else False
+            return list(self._entries)
+
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = AuthConfigStore()
+    return _store
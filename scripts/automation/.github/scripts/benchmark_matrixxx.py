@@ -1,4 +1,7 @@
 import asyncio
+import gc
+import logging
+import statistics
 import time
 import sys
 from unittest.mock import MagicMock, AsyncMock, patch
@@ -13,82 +16,163 @@ sys.modules['langchain.chains'] = MagicMock()
 sys.modules['langchain.memory'] = MagicMock()
 
 # Now import the actual classes
-from matrixxx import HostAgent, LivingEnvironment, HybridAgent
+from matrixxx import HostAgent, LivingEnvironment, HybridAgent, LLMExecutor
 
-async def run_benchmark():
-    num_agents = 10
-    print(f"Benchmarking actual HostAgent with {num_agents} agents and 1 cycle.")
-
-    # 1. Setup Environment and Host
-    env = LivingEnvironment()
-
-    # Add a small delay to update_state to measure concurrency
-    async def delayed_update_state(key, value):
-        await asyncio.sleep(0.01) # 10ms delay
-        # Simulate what the original update_state does
-        env.state[key] = value
-
-    env.update_state = delayed_update_state
-
-    host = HostAgent()
-    host.env = env
-
-    # Register agents
-    for i in range(num_agents):
-        # We don't need real HybridAgents that run their own loops
-        agent = MagicMock(spec=HybridAgent)
-        agent.name = f"Agent{i}"
-        host.register_agent(agent)
-
-    # 2. Benchmark the actual update_loop logic
-
-    # We want to skip the 10s sleep but keep the others if any
+async def per_key_cycle(env, agents, count):
+    """The update_loop body before batching: two update_state calls per agent. Returns the time taken."""
+    start = time.perf_counter()
+    tasks = []
+    for agent in agents:
+        tasks.append(env.update_state(f"prompt_update_{agent.name}", f"Agent update cycle {count} for {agent.name}."))
+        tasks.append(env.update_state(f"code_update_{agent.name}", f"int dynamic_func() {{ return {count} * 42; }}"))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start
+
+async def batched_cycle(host, real_sleep):
+    """One real HostAgent.update_loop cycle, which now applies a single batch.
+
+    Returns the number of batches and the time spent applying them, so the harness
+    (patching sleep, starting the loop) is not counted against the batched path.
+    """
     async def side_effect(delay):
         if delay == 10:
             return
-        # We can't call original asyncio.sleep here directly as it's patched
-        # But we don't need to, we just want to avoid 10s delay.
-        # However, delayed_update_state needs REAL sleep.
-        # So we use the real sleep for small delays.
         await real_sleep(delay)
 
-    import asyncio as a
-    real_sleep = a.sleep
-
-    start = time.perf_counter()
     with patch('asyncio.sleep', side_effect=side_effect):
-        # Only run one iteration
         host.running = True
+        calls, elapsed = 0, 0.0
+        original = host.env.update_many
+
+        async def update_many_once(changes):
+            nonlocal calls, elapsed
+            calls += 1
+            start = time.perf_counter()
+            await original(changes)
+            elapsed += time.perf_counter() - start
+            # Only run one iteration
+            host.running = False
+
+        host.env.update_many = update_many_once
+        await asyncio.wait_for(host.update_loop(), timeout=10.0)
+        host.env.update_many = original
+    return calls, elapsed
+
+def make_host(num_agents):
+    host = HostAgent()
+    for i in range(num_agents):
+        agent = HybridAgent(f"Agent{i}", host.env, f"Prompt {i}")
+        agent.parse_cpp_code = AsyncMock(return_value=[])
+        host.register_agent(agent)
+    return host
+
+WARMUP_CYCLES = 1
+TIMED_CYCLES = 15
+# Batched may be at most this much slower than per-key before it counts as a regression
+NOISE_MARGIN = 0.10
+
+async def time_cycles(paths):
+    """Median cycle time after warm-up, per path.
+
+    Each path is run_cycle(count) returning the seconds spent applying that cycle's
+    updates. Paths alternate cycle by cycle, so drift on a busy machine hits them
+    equally. As in timeit, the collector is paused while timing.
+    """
+    for count in range(WARMUP_CYCLES):
+        for run_cycle in paths:
+            await run_cycle(count)
+    times = [[] for _ in paths]
+    gc.collect()
+    gc.disable()
+    try:
+        for count in range(WARMUP_CYCLES, WARMUP_CYCLES + TIMED_CYCLES):
+            for run_cycle, samples in zip(paths, times):
+                samples.append(await run_cycle(count))
+    finally:
+        gc.enable()
+    return [statistics.median(samples) for samples in times]
 
-        task = asyncio.create_task(host.update_loop())
-
-        # Wait for count to become 1
-        while True:
-            # We check if it has completed at least one cycle
-            # 10 agents * 2 updates each = 20 entries
-            if len(env.state) >= 2 * num_agents:
-                host.running = False
-                break
-            await real_sleep(0.05)
-
-        try:
-            await asyncio.wait_for(task, timeout=2.0)
-        except (asyncio.TimeoutError, asyncio.CancelledError):
-            pass
-
-    end = time.perf_counter()
-    duration = end - start
-    print(f"Actual Optimized Loop Duration: {duration:.4f}s")
-
-    # Theoretical sequential duration would be:
-    # 10 agents * 2 calls/agent * 0.01s/call = 0.2s
-    # Plus overhead.
-    # Concurrent duration should be ~0.01s + overhead.
-
-    if duration < 0.1:
-        print("Optimization verified: Loop is running concurrently.")
+async def run_benchmark():
+    logging.disable(logging.INFO)
+    real_sleep = asyncio.sleep
+    cycles = WARMUP_CYCLES + TIMED_CYCLES
+    print(f"Median of {TIMED_CYCLES} cycles after {WARMUP_CYCLES} warm-up cycle(s).")
+    print(f"{'agents':>8} {'mode':>9} {'notifications':>14} {'cycle (ms)':>11}")
+
+    problems = []
+    for num_agents in (10, 100, 1000):
+        host, batched_host = make_host(num_agents), make_host(num_agents)
+
+        async def one_batch(count):
+            batches, elapsed = await batched_cycle(batched_host, real_sleep)
+            assert batches == 1
+            return elapsed
+
+        per_key_time, batched_time = await time_cycles(
+            [lambda count: per_key_cycle(host.env, host.agents, count), one_batch])
+        per_key_notifications = host.env.stats["notifications"] // cycles
+        batched_notifications = batched_host.env.stats["notifications"] // cycles
+        assert len(batched_host.env.state) == 2 * num_agents
+        print(f"{num_agents:>8} {'per-key':>9} {per_key_notifications:>14} {per_key_time * 1000:>11.2f}")
+        print(f"{num_agents:>8} {'batched':>9} {batched_notifications:>14} {batched_time * 1000:>11.2f}")
+
+        # Each agent is notified once per cycle instead of once per key, and the cycle is no slower
+        if batched_notifications != num_agents or per_key_notifications != 2 * num_agents:
+            problems.append(f"{batched_notifications} notifications for {num_agents} agents")
+        if batched_time > per_key_time * (1 + NOISE_MARGIN):
+            problems.append(f"batched cycle slower at {num_agents} agents "
+                            f"({batched_time * 1000:.2f}ms vs {per_key_time * 1000:.2f}ms)")
+
+    if not problems:
+        print("Optimization verified: one notification per agent per cycle, and batched cycles are no slower.")
+    else:
+        print(f"Optimization warning: {'; '.join(problems)}.")
+
+async def run_agent_overlap_benchmark():
+    """Agents whose LLM blocks for 50ms: direct invoke stalls the loop, the executor overlaps them."""
+    num_agents, llm_latency, concurrency = 16, 0.05, 8
+    print(f"\nBenchmarking {num_agents} agents with a {llm_latency * 1000:.0f}ms blocking LLM, executor limit {concurrency}.")
+
+    def blocking_invoke(prompt):
+        time.sleep(llm_latency)
+        return "ok"
+
+    env = LivingEnvironment()
+    executor = LLMExecutor(max_concurrency=concurrency)
+    agents = [HybridAgent(f"Agent{i}", env, "Prompt", llm_executor=executor) for i in range(num_agents)]
+    for agent in agents:
+        agent.llm = MagicMock()
+        agent.llm.invoke.side_effect = blocking_invoke
+
+    async def direct(agent):
+        return agent.llm.invoke("prompt")
+
+    for mode, call in (("direct", direct), ("executor", lambda agent: agent.invoke_llm("prompt"))):
+        lag, stop = [], False
+
+        async def monitor():
+            while not stop:
+                tick = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag.append(time.perf_counter() - tick - 0.005)
+
+        monitoring = asyncio.create_task(monitor())
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await asyncio.gather(*(call(agent) for agent in agents))
+        duration = time.perf_counter() - start
+        stop = True
+        await monitoring
+        print(f"{mode:>9}: {duration * 1000:7.1f}ms for one iteration of every agent, "
+              f"max loop lag {max(lag) * 1000:6.1f}ms")
+
+    executor.shutdown()
+    expected = llm_latency * -(-num_agents // concurrency)
+    if duration < expected * 2:
+        print(f"Optimization verified: agent LLM calls overlap (~{expected * 1000:.0f}ms expected).")
     else:
-        print(f"Optimization warning: Loop took {duration:.4f}s, which might be sequential.")
+        print(f"Optimization warning: {duration:.3f}s suggests LLM calls are still serialized.")
 
 if __name__ == "__main__":
     asyncio.run(run_benchmark())
+    asyncio.run(run_agent_overlap_benchmark())
@@ -0,0 +1,297 @@
+"""Scaling benchmark for LivingEnvironment and HostAgent.
+
+Sweeps agent count, subscriber mix and state size, measuring per scenario:
+single-update fan-out latency, notifications per cycle, event-loop lag,
+peak traced memory and per-cycle throughput of HostAgent.update_loop.
+Runs against the same dependency mocks as benchmark_matrixxx.py.
+
+    python benchmark_matrixxx_scaling.py --agents 10,100,1000,10000 --output results.json
+    python benchmark_matrixxx_scaling.py --quick --baseline results.json
+
+Results are JSON. Each scenario is checked against absolute thresholds and,
+with --baseline, against an earlier run. The exit status is 1 on any regression.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from unittest.mock import MagicMock, patch
+
+# Mocking dependencies to allow importing matrixxx
+sys.modules['nimpy'] = MagicMock()
+sys.modules['clang'] = MagicMock()
+sys.modules['clang.cindex'] = MagicMock()
+sys.modules['langchain'] = MagicMock()
+sys.modules['langchain.llms'] = MagicMock()
+sys.modules['langchain.chains'] = MagicMock()
+sys.modules['langchain.memory'] = MagicMock()
+
+from matrixxx import HostAgent, HybridAgent
+
+# Extra observers besides the agents themselves, per subscriber mix
+SUBSCRIBER_MIXES = {
+    "keyed": {"wildcard": 0, "prefix": 0},
+    "keyed+prefix": {"wildcard": 0, "prefix": 10},
+    "keyed+wildcard": {"wildcard": 10, "prefix": 0},
+}
+
+# Normalised so the same limits apply at every agent count. The worst loop stall is one
+# batched cycle, so lag is gated per agent like the cycle time; it may exceed the cycle
+# limit a little for timer jitter on top
+DEFAULT_THRESHOLDS = {
+    "fanout_p99_ms": 5.0,
+    "cycle_us_per_agent": 500.0,
+    "loop_lag_us_per_agent": 600.0,
+    "peak_kib_per_agent": 64.0,
+    "excess_notifications": 0,
+}
+
+# Below this many agents timer jitter, not the cycle, dominates lag, so it is spread over at least this many
+LAG_MIN_AGENTS = 100
+
+# Metrics compared against --baseline; lower is better for all of them
+BASELINE_METRICS = ("fanout_p99_ms", "cycle_us_per_agent", "peak_kib_per_agent")
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+class LoopLagMonitor:
+    """Measures how late a short periodic sleep wakes up while the loop is busy."""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - start - self.interval)
+
+    def __enter__(self):
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self.task.cancel()
+
+def build_host(num_agents, mix, state_size):
+    host = HostAgent()
+    env = host.env
+    for i in range(num_agents):
+        host.register_agent(HybridAgent(f"Agent{i}", env, f"Prompt {i}"))
+
+    observers = SUBSCRIBER_MIXES[mix]
+
+    def make_observer():
+        # A distinct callback each time; the environment dedupes identical ones
+        async def observer(key, value):
+            pass
+        return observer
+
+    for _ in range(observers["wildcard"]):
+        env.subscribe(make_observer())
+    for i in range(observers["prefix"]):
+        env.subscribe(make_observer(), prefixes=["prompt_update_" if i % 2 else "status_"])
+
+    # Existing shared state every agent's status contributes to
+    padding = "x" * state_size
+    env.state.update({f"status_Agent{i}": padding for i in range(num_agents)})
+    return host
+
+def expected_notifications(num_agents, mix):
+    """Interested subscribers per batched cycle: each agent once, plus observers that match."""
+    observers = SUBSCRIBER_MIXES[mix]
+    prompt_prefix_observers = observers["prefix"] // 2
+    return num_agents + observers["wildcard"] + prompt_prefix_observers
+
+async def run_cycles(host, cycles, state_size, lag=None):
+    """Drive the real HostAgent.update_loop for a number of cycles, timing each batch.
+
+    update_loop stops by itself after 8 cycles, so at most 7 are timed after the warm-up.
+    """
+    env = host.env
+    cycle_times = []
+    original_update_many = env.update_many
+    padding = "x" * max(0, state_size - 64)
+
+    async def timed_update_many(changes):
+        changes = {k: f"{v}{padding}" if k.startswith("prompt_update_") else v for k, v in dict(changes).items()}
+        start = time.perf_counter()
+        await original_update_many(changes)
+        cycle_times.append(time.perf_counter() - start)
+        # The first cycle warms up the parser pool and caches and is not counted
+        if len(cycle_times) == 1 and lag is not None:
+            lag.samples.clear()
+        if len(cycle_times) > cycles:
+            host.running = False
+
+    real_sleep = asyncio.sleep
+
+    async def skip_host_sleep(delay):
+        await real_sleep(0 if delay == 10 else delay)
+
+    env.update_many = timed_update_many
+    with patch('asyncio.sleep', side_effect=skip_host_sleep):
+        host.running = True
+        await host.update_loop()
+    env.update_many = original_update_many
+    return cycle_times[1:]
+
+async def measure_fanout(host, samples):
+    env = host.env
+    names = [agent.name for agent in host.agents]
+    latencies = []
+    rng = random.Random(0)
+    for i in range(samples):
+        key = f"prompt_update_{rng.choice(names)}"
+        start = time.perf_counter()
+        await env.update_state(key, f"Prompt revision {i}")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+async def run_scenario(num_agents, mix, state_size, cycles, fanout_samples, trace_memory):
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    setup_start = time.perf_counter()
+    host = build_host(num_agents, mix, state_size)
+    setup_time = time.perf_counter() - setup_start
+
+    with LoopLagMonitor() as lag:
+        await asyncio.sleep(0)
+        cycle_times = await run_cycles(host, cycles, state_size, lag)
+    # Every cycle batches the same keys, so the warm-up cycle is representative for counts
+    notifications = host.env.stats["notifications"] / (len(cycle_times) + 1)
+    updates = host.env.stats["updates"] / (len(cycle_times) + 1)
+
+    fanout = await measure_fanout(host, fanout_samples)
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    mean_cycle = sum(cycle_times) / len(cycle_times)
+    return {
+        "agents": num_agents,
+        "mix": mix,
+        "state_size": state_size,
+        "cycles": len(cycle_times),
+        "setup_s": setup_time,
+        "cycle_ms_mean": mean_cycle * 1000,
+        "cycle_ms_max": max(cycle_times) * 1000,
+        "cycle_us_per_agent": mean_cycle * 1e6 / num_agents,
+        "updates_per_cycle": updates,
+        "updates_per_s": updates / mean_cycle if mean_cycle else 0.0,
+        "notifications_per_cycle": notifications,
+        "excess_notifications": notifications - expected_notifications(num_agents, mix),
+        "fanout_p50_ms": percentile(fanout, 50) * 1000,
+        "fanout_p99_ms": percentile(fanout, 99) * 1000,
+        "loop_lag_max_ms": max(lag.samples, default=0.0) * 1000,
+        "loop_lag_us_per_agent": max(lag.samples, default=0.0) * 1e6 / max(num_agents, LAG_MIN_AGENTS),
+        "loop_lag_p99_ms": percentile(lag.samples, 99) * 1000,
+        "peak_kib": peak / 1024,
+        "peak_kib_per_agent": peak / 1024 / num_agents if trace_memory else 0.0,
+    }
+
+def scenario_key(result):
+    return f"{result['agents']}/{result['mix']}/{result['state_size']}"
+
+def check_regressions(results, thresholds, baseline=None, tolerance=0.25):
+    regressions = []
+    for result in results:
+        for metric, limit in thresholds.items():
+            if metric == "peak_kib_per_agent" and not result["peak_kib"]:
+                continue
+            if result[metric] > limit:
+                regressions.append({"scenario": scenario_key(result), "metric": metric,
+                                    "value": result[metric], "limit": limit, "kind": "threshold"})
+    if baseline:
+        previous = {scenario_key(r): r for r in baseline.get("results", [])}
+        for result in results:
+            old = previous.get(scenario_key(result))
+            if not old:
+                continue
+            for metric in BASELINE_METRICS:
+                limit = old.get(metric, 0) * (1 + tolerance)
+                if old.get(metric) and result[metric] > limit:
+                    regressions.append({"scenario": scenario_key(result), "metric": metric,
+                                        "value": result[metric], "limit": limit, "kind": "baseline"})
+    return regressions
+
+async def run_suite(agent_counts, mixes, state_sizes, cycles, fanout_samples, trace_memory):
+    results = []
+    print(f"{'agents':>7} {'mix':>15} {'state':>6} {'cycle ms':>9} {'us/agent':>9} {'notif':>7} "
+          f"{'fanout p99':>11} {'lag max':>8} {'peak KiB':>9}", file=sys.stderr)
+    for num_agents in agent_counts:
+        for mix in mixes:
+            for state_size in state_sizes:
+                r = await run_scenario(num_agents, mix, state_size, cycles, fanout_samples, trace_memory)
+                results.append(r)
+                print(f"{r['agents']:>7} {r['mix']:>15} {r['state_size']:>6} {r['cycle_ms_mean']:>9.2f} "
+                      f"{r['cycle_us_per_agent']:>9.1f} {r['notifications_per_cycle']:>7.0f} "
+                      f"{r['fanout_p99_ms']:>9.3f}ms {r['loop_lag_max_ms']:>6.1f}ms {r['peak_kib']:>9.0f}",
+                      file=sys.stderr)
+    return results
+
+def parse_list(text, cast=str):
+    return [cast(x) for x in text.split(",") if x]
+
+def main(argv=None):
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Scaling benchmark for the agent matrix")
+    parser.add_argument("--agents", default="10,100,1000,10000")
+    parser.add_argument("--mixes", default=",".join(SUBSCRIBER_MIXES))
+    parser.add_argument("--state-sizes", default="64,4096")
+    parser.add_argument("--cycles", type=int, default=3, help="Timed cycles after one warm-up (max 7)")
+    parser.add_argument("--fanout-samples", type=int, default=200)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Skip peak memory tracing (faster)")
+    parser.add_argument("--quick", action="store_true", help="Shorthand for --agents 10,100,1000 --state-sizes 64")
+    parser.add_argument("--thresholds", help="JSON file overriding DEFAULT_THRESHOLDS")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against --baseline")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    args.cycles = max(1, min(args.cycles, 7))
+    if args.quick:
+        args.agents, args.state_sizes = "10,100,1000", "64"
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds.update(json.load(f))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(run_suite(parse_list(args.agents, int), parse_list(args.mixes),
+                                    parse_list(args.state_sizes, int), args.cycles, args.fanout_samples,
+                                    not args.no_tracemalloc))
+    regressions = check_regressions(results, thresholds, baseline, args.tolerance)
+    report = {
+        "python": sys.version.split()[0],
+        "thresholds": thresholds,
+        "results": results,
+        "regressions": regressions,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    for r in regressions:
+        print(f"REGRESSION {r['scenario']} {r['metric']}={r['value']:.3f} > {r['limit']:.3f} ({r['kind']})",
+              file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,89 +1,961 @@
 import asyncio
+import contextlib
+import hashlib
+import inspect
+import itertools
+import json
 import logging
-from typing import Callable, Any, Dict, List
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Any, Dict, Iterable, List, Optional, Tuple, Union
 import nimpy
 from clang import cindex
 from langchain.llms import OpenAI
-from langchain.chains import ConversationChain
-from langchain.memory import InMemoryConversationMemory
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger("AgenticMatrixLivingCodeAI")
 
 # --- Living Environment ---
+@dataclass
+class StateDelta:
+    """Changes since a version, filtered and size-capped for one reader."""
+    version: int
+    changes: Dict[str, str] = field(default_factory=dict)
+    omitted: List[str] = field(default_factory=list)
+    truncated: bool = False
+
+    def render(self) -> str:
+        lines = [f"{key}: {value}" for key, value in self.changes.items()]
+        if self.omitted:
+            lines.append(f"... {len(self.omitted)} more changed keys omitted")
+        return "\n".join(lines) if lines else "(no changes)"
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    # Values that are not JSON (bytes, objects) are written as their str()
+    return json.dumps(message, default=str).encode() + b"\n"
+
+class EnvironmentStore:
+    """Optional on-disk persistence for LivingEnvironment: an append-only log plus snapshots.
+
+    Every write is one JSON line {"v": version, "c": changes} in log.jsonl. After
+    snapshot_every logged writes, the whole state goes to snapshot.json. It is written
+    to a temporary file, fsynced and renamed into place, and then the log starts over.
+    Startup reads the snapshot and replays only the log lines newer than it. A torn
+    last line from a crash is cut off.
+
+    fsync modes:
+      "always"   -- write and fsync each record before the update returns (on the event loop)
+      "interval" -- buffer records and write + fsync them every fsync_interval seconds
+                    on a background thread; a crash loses at most that window
+      "never"    -- like "interval" but leave flushing to the OS
+    """
+    FSYNC_MODES = ("always", "interval", "never")
+
+    def __init__(self, directory: str, fsync: str = "interval", fsync_interval: float = 0.05,
+                 snapshot_every: int = 1000):
+        if fsync not in self.FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {self.FSYNC_MODES}, not {fsync!r}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.log_path = os.path.join(directory, "log.jsonl")
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.since_snapshot = 0
+        # Encoded log lines, and snapshot tuples at the point they were taken, in write order
+        self.pending: List[Union[bytes, Tuple[Dict[str, Any], Dict[str, int], int]]] = []
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="env-store")
+        self._log = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+        self.stats = {"records": 0, "writes": 0, "fsyncs": 0, "snapshots": 0, "replayed": 0,
+                      "torn": 0, "load_seconds": 0.0}
+
+    def load(self) -> Tuple[Dict[str, Any], Dict[str, int], int]:
+        """Rebuild (state, key_versions, version) from the snapshot and the log after it."""
+        start = time.perf_counter()
+        state: Dict[str, Any] = {}
+        key_versions: Dict[str, int] = {}
+        version = 0
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            state, key_versions, version = snapshot["state"], snapshot["key_versions"], snapshot["version"]
+        except FileNotFoundError:
+            pass
+
+        good = 0
+        try:
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line) if line.endswith(b"\n") else None
+                    except ValueError:
+                        entry = None
+                    if entry is None:
+                        logger.warning(f"[Store] Dropping torn log record at byte {good} of {self.log_path}")
+                        self.stats["torn"] += 1
+                        break
+                    good += len(line)
+                    # Lines already covered by the snapshot survive a crash during compaction
+                    if entry["v"] <= version:
+                        continue
+                    version = entry["v"]
+                    state.update(entry["c"])
+                    for key in entry["c"]:
+                        key_versions[key] = version
+                    self.stats["replayed"] += 1
+        except FileNotFoundError:
+            pass
+
+        self._log = open(self.log_path, "ab")
+        self._log.truncate(good)
+        self.since_snapshot = self.stats["replayed"]
+        self.stats["load_seconds"] = time.perf_counter() - start
+        logger.info(f"[Store] Loaded {len(state)} keys at v{version} "
+                    f"({self.stats['replayed']} log records) in {self.stats['load_seconds'] * 1000:.1f}ms")
+        return state, key_versions, version
+
+    def record(self, version: int, changes: Dict[str, Any]):
+        self.pending.append(_encode({"v": version, "c": changes}))
+        self.since_snapshot += 1
+        self.stats["records"] += 1
+        self._schedule()
+
+    def snapshot_due(self) -> bool:
+        return self.since_snapshot >= self.snapshot_every
+
+    def snapshot(self, state: Dict[str, Any], key_versions: Dict[str, int], version: int):
+        """Queue a compacting snapshot of state as of version; log lines before it are dropped."""
+        self.pending.append((dict(state), dict(key_versions), version))
+        self.since_snapshot = 0
+        self._schedule()
+
+    def _schedule(self):
+        if self.fsync == "always":
+            self._write(self._take())
+            return
+        if self._timer is not None:
+            return
+        try:
+            self._timer = asyncio.get_running_loop().call_later(self.fsync_interval, self._start_flush)
+        except RuntimeError:
+            # No loop (e.g. seeding state before startup): write now
+            self._write(self._take())
+
+    def _take(self):
+        items, self.pending = self.pending, []
+        return items
+
+    def _start_flush(self):
+        self._timer = None
+        if self.pending:
+            task = asyncio.ensure_future(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """Write everything recorded so far; the single writer thread keeps it in order."""
+        items = self._take()
+        if items:
+            await asyncio.get_running_loop().run_in_executor(self.pool, self._write, items)
+
+    def _write(self, items):
+        lines: List[bytes] = []
+        for item in items:
+            if isinstance(item, bytes):
+                lines.append(item)
+            else:
+                # The snapshot covers every line queued before it, so those are never written
+                lines = []
+                self._write_snapshot(*item)
+        if lines:
+            self._log.write(b"".join(lines))
+            self._log.flush()
+            self.stats["writes"] += 1
+            if self.fsync != "never":
+                os.fsync(self._log.fileno())
+                self.stats["fsyncs"] += 1
+
+    def _write_snapshot(self, state: Dict[str, Any], key_versions: Dict[str, int], version: int):
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": version, "state": state, "key_versions": key_versions}, f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        self._log.truncate(0)
+        self.stats["snapshots"] += 1
+
+    async def close(self, state: Optional[Dict[str, Any]] = None, key_versions: Optional[Dict[str, int]] = None,
+                    version: Optional[int] = None):
+        """Flush pending records, optionally ending with a snapshot so the next start replays nothing."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+        if state is not None and self.since_snapshot:
+            self.snapshot(state, key_versions, version)
+        await self.flush()
+        self.pool.shutdown(wait=True)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
 class LivingEnvironment:
-    def __init__(self):
+    def __init__(self, change_log_size: int = 10000, store: Optional[EnvironmentStore] = None):
         self.state: Dict[str, Any] = {}
+        # Every write bumps version; key_versions and the bounded change log let
+        # readers fetch only what changed since the version they last saw
+        self.version = 0
+        self.key_versions: Dict[str, int] = {}
+        self.change_log: deque = deque(maxlen=change_log_size)
+        # Wildcard subscribers see every key; the indexes route keys to interested callbacks only
         self.subscribers: List[Callable[[str, Any], asyncio.Future]] = []
+        self.key_subscribers: Dict[str, List[Callable[[str, Any], asyncio.Future]]] = {}
+        self.prefix_subscribers: Dict[str, List[Callable[[str, Any], asyncio.Future]]] = {}
+        self._prefix_lengths: List[int] = []
+        self.batch_handlers: Dict[Callable, Callable[[Dict[str, Any]], asyncio.Future]] = {}
+        self.stats = {"updates": 0, "notifications": 0}
+        # With a store, state survives restarts: it is replayed here and every write is logged
+        self.store = store
+        if store is not None:
+            self.load_snapshot(*store.load())
+
+    def subscribe(self, callback: Callable[[str, Any], asyncio.Future],
+                  keys: Optional[Iterable[str]] = None, prefixes: Optional[Iterable[str]] = None,
+                  on_batch: Optional[Callable[[Dict[str, Any]], asyncio.Future]] = None):
+        """Subscribe to exact keys and/or key prefixes; with neither, receive every update.
 
-    def subscribe(self, callback: Callable[[str, Any], asyncio.Future]):
-        self.subscribers.append(callback)
+        on_batch, if given, receives all of a batch's relevant changes as one dict;
+        otherwise callback is called once per changed key.
+        """
+        if on_batch is not None:
+            self.batch_handlers[callback] = on_batch
+        if not keys and not prefixes:
+            self.subscribers.append(callback)
+            return
+        for key in keys or ():
+            self.key_subscribers.setdefault(key, []).append(callback)
+        for prefix in prefixes or ():
+            self.prefix_subscribers.setdefault(prefix, []).append(callback)
+        self._prefix_lengths = sorted({len(p) for p in self.prefix_subscribers})
+
+    def unsubscribe(self, callback: Callable[[str, Any], asyncio.Future]):
+        self.batch_handlers.pop(callback, None)
+        self.subscribers = [cb for cb in self.subscribers if cb != callback]
+        for index in (self.key_subscribers, self.prefix_subscribers):
+            for topic in list(index):
+                index[topic] = [cb for cb in index[topic] if cb != callback]
+                if not index[topic]:
+                    del index[topic]
+        self._prefix_lengths = sorted({len(p) for p in self.prefix_subscribers})
+
+    def subscribers_for(self, key: str) -> List[Callable[[str, Any], asyncio.Future]]:
+        matched = list(self.subscribers)
+        matched.extend(self.key_subscribers.get(key, ()))
+        # One dict lookup per distinct prefix length, not per subscriber
+        for length in self._prefix_lengths:
+            if length > len(key):
+                break
+            matched.extend(self.prefix_subscribers.get(key[:length], ()))
+        # A callback matching several topics is still notified once
+        return list(dict.fromkeys(matched)) if len(matched) > 1 else matched
 
     async def update_state(self, key: str, value: Any):
         logger.debug(f"[Env] Update: {key} -> {value}")
         self.state[key] = value
-        await asyncio.gather(*[cb(key, value) for cb in self.subscribers])
+        self._record([key])
+        self._persist({key: value})
+        callbacks = self.subscribers_for(key)
+        self.stats["updates"] += 1
+        self.stats["notifications"] += len(callbacks)
+        if len(callbacks) == 1:
+            await callbacks[0](key, value)
+        elif callbacks:
+            await asyncio.gather(*[cb(key, value) for cb in callbacks])
+
+    async def update_many(self, changes: Union[Dict[str, Any], Iterable[Tuple[str, Any]]]):
+        """Apply a group of changes at once and notify each subscriber a single time.
+
+        Repeated writes to a key are coalesced (the last one wins). All changes are
+        in state before any subscriber runs, and each subscriber only sees its keys.
+        """
+        changes = dict(changes)
+        if not changes:
+            return
+        logger.debug(f"[Env] Batch update: {len(changes)} keys")
+        await self._notify(self._apply(changes))
+
+    def _apply(self, changes: Dict[str, Any], version: Optional[int] = None) -> Dict[Callable, Dict[str, Any]]:
+        """Write changes to state under one version and group them per interested subscriber."""
+        self.state.update(changes)
+        self._record(changes, version)
+        self._persist(changes)
+        deltas: Dict[Callable, Dict[str, Any]] = {}
+        for key, value in changes.items():
+            for cb in self.subscribers_for(key):
+                deltas.setdefault(cb, {})[key] = value
+        self.stats["updates"] += len(changes)
+        self.stats["notifications"] += len(deltas)
+        return deltas
+
+    async def _notify(self, deltas: Dict[Callable, Dict[str, Any]]):
+        await asyncio.gather(*[self._deliver(cb, delta) for cb, delta in deltas.items()])
+
+    async def _deliver(self, callback, delta: Dict[str, Any]):
+        on_batch = self.batch_handlers.get(callback)
+        if on_batch is not None:
+            await on_batch(delta)
+            return
+        for key, value in delta.items():
+            await callback(key, value)
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """Collect updates and apply them together on exit; nothing is applied if the block raises.
+
+            async with env.batch() as changes:
+                changes["prompt_update_AlphaBot"] = prompt
+        """
+        changes: Dict[str, Any] = {}
+        yield changes
+        await self.update_many(changes)
 
     def get_state(self, key: str):
         return self.state.get(key)
 
+    def load_snapshot(self, state: Dict[str, Any], key_versions: Dict[str, int], version: int):
+        """Replace state with a copy taken elsewhere, keeping its versions; subscribers are not notified."""
+        self.state = dict(state)
+        self.key_versions = dict(key_versions)
+        self.version = version
+        self.change_log.clear()
+        for key, key_version in sorted(self.key_versions.items(), key=lambda item: item[1]):
+            self.change_log.append((key_version, key))
+
+    def _persist(self, changes: Dict[str, Any]):
+        if self.store is None:
+            return
+        self.store.record(self.version, changes)
+        if self.store.snapshot_due():
+            self.store.snapshot(self.state, self.key_versions, self.version)
+
+    async def close(self):
+        if self.store is not None:
+            await self.store.close(self.state, self.key_versions, self.version)
+
+    def _record(self, keys: Iterable[str], version: Optional[int] = None):
+        # A batch shares one version, so readers never see half of it
+        self.version = self.version + 1 if version is None else version
+        for key in keys:
+            self.key_versions[key] = self.version
+            self.change_log.append((self.version, key))
+
+    def changed_keys_since(self, since: int) -> List[str]:
+        """Keys changed after version since, most recent first."""
+        log = self.change_log
+        if len(log) < log.maxlen or log[0][0] <= since:
+            seen: Dict[str, None] = {}
+            for version, key in reversed(log):
+                if version <= since:
+                    break
+                if self.key_versions[key] == version:
+                    seen[key] = None
+            return list(seen)
+        # The log no longer reaches back to since; fall back to the per-key versions
+        changed = [(v, k) for k, v in self.key_versions.items() if v > since]
+        return [k for _, k in sorted(changed, reverse=True)]
+
+    def changes_since(self, since: int, prefixes: Optional[Iterable[str]] = None,
+                      exclude: Iterable[str] = (), max_chars: int = 4000,
+                      max_value_chars: int = 500) -> StateDelta:
+        """Bounded view of what changed after version since.
+
+        Only keys matching prefixes (all keys if None) and not in exclude are
+        included, newest first. Each value is cut to max_value_chars. Keys that
+        would push the view past max_chars are listed in omitted instead.
+        """
+        prefixes = tuple(prefixes) if prefixes is not None else None
+        exclude = set(exclude)
+        delta = StateDelta(version=self.version)
+        used = 0
+        for key in self.changed_keys_since(since):
+            if key in exclude or (prefixes is not None and not key.startswith(prefixes)):
+                continue
+            text = str(self.state[key])
+            if len(text) > max_value_chars:
+                text = f"{text[:max_value_chars]}...[+{len(text) - max_value_chars} chars]"
+                delta.truncated = True
+            cost = len(key) + len(text) + 3
+            if used + cost > max_chars:
+                delta.omitted.append(key)
+                delta.truncated = True
+                continue
+            delta.changes[key] = text
+            used += cost
+        return delta
+
+# --- Bounded Conversation Memory ---
+class BoundedSummaryMemory:
+    """Recent turns within a token budget, plus a running summary of evicted turns.
+
+    Evicted turns are folded into the summary by a background task once
+    summarize_after of them are pending, so add_turn never waits on the
+    summarizer. summarizer is an async callable taking a prompt and returning
+    text; without one, a short extract of each evicted turn is kept instead.
+    """
+
+    def __init__(self, max_tokens: int = 2000, summary_tokens: int = 400, summarize_after: int = 4,
+                 summarizer: Optional[Callable[[str], Any]] = None, chars_per_token: int = 4):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize_after = summarize_after
+        self.summarizer = summarizer
+        self.chars_per_token = chars_per_token
+        self.turns: deque = deque()
+        self.window_tokens = 0
+        self.summary = ""
+        self.pending: List[Tuple[str, str]] = []
+        self._summary_task: Optional[asyncio.Task] = None
+        self.stats = {"turns": 0, "evicted": 0, "summaries": 0, "summary_failures": 0}
+
+    def count_tokens(self, text: str) -> int:
+        return len(text) // self.chars_per_token + 1
+
+    def add_turn(self, prompt: str, response: str):
+        prompt, response = str(prompt), str(response)
+        tokens = self.count_tokens(prompt) + self.count_tokens(response)
+        self.turns.append((prompt, response, tokens))
+        self.window_tokens += tokens
+        self.stats["turns"] += 1
+        # Always keep the latest turn, even if it alone is over budget
+        while self.window_tokens > self.max_tokens and len(self.turns) > 1:
+            old_prompt, old_response, old_tokens = self.turns.popleft()
+            self.window_tokens -= old_tokens
+            self.pending.append((old_prompt, old_response))
+            self.stats["evicted"] += 1
+        if len(self.pending) >= self.summarize_after and not self.summarizing:
+            try:
+                self._summary_task = asyncio.get_running_loop().create_task(self._summarize())
+            except RuntimeError:
+                pass  # No loop yet; the next add_turn inside one picks the backlog up
+
+    @property
+    def summarizing(self) -> bool:
+        return self._summary_task is not None and not self._summary_task.done()
+
+    def _clip(self, text: str) -> str:
+        limit = self.summary_tokens * self.chars_per_token
+        return text if len(text) <= limit else "..." + text[-limit:]
+
+    async def _summarize(self):
+        pending, self.pending = self.pending, []
+        try:
+            if self.summarizer is not None:
+                transcript = "\n".join(f"Human: {p}\nAI: {r}" for p, r in pending)
+                prompt = (f"Update this summary of an agent's conversation with the new turns. "
+                          f"Keep it under {self.summary_tokens * self.chars_per_token} characters.\n"
+                          f"Summary so far:\n{self.summary or '(none)'}\nNew turns:\n{transcript}")
+                summary = str(await self.summarizer(prompt))
+            else:
+                extracts = [r.strip().splitlines()[0][:200] for _, r in pending if r.strip()]
+                summary = "\n".join(filter(None, [self.summary] + extracts))
+            self.summary = self._clip(summary)
+            self.stats["summaries"] += 1
+        except Exception as e:
+            # Put the turns back so the next attempt still covers them
+            self.pending = pending + self.pending
+            self.stats["summary_failures"] += 1
+            logger.warning(f"[Memory] Summarization failed: {e}")
+
+    def render(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        parts.extend(f"Human: {p}\nAI: {r}" for p, r, _ in self.turns)
+        return "\n".join(parts)
+
+    def usage(self) -> Dict[str, int]:
+        return dict(
+            self.stats,
+            window_turns=len(self.turns),
+            window_tokens=self.window_tokens,
+            summary_tokens=self.count_tokens(self.summary) if self.summary else 0,
+            pending_turns=len(self.pending),
+            memory_chars=sum(len(p) + len(r) for p, r, _ in self.turns) + len(self.summary)
+            + sum(len(p) + len(r) for p, r in self.pending),
+        )
+
+    async def close(self):
+        if self._summary_task is not None:
+            await asyncio.gather(self._summary_task, return_exceptions=True)
+
+# --- LLM Execution ---
+class LLMExecutor:
+    """Runs LLM calls off the event loop under one global concurrency limit.
+
+    LLMs with a native async ainvoke are awaited directly; anything else runs
+    invoke on a bounded thread pool. A timed-out thread cannot be interrupted,
+    so it keeps its slot until it returns and the limit stays honest.
+    """
+
+    def __init__(self, max_concurrency: int = 8):
+        self.max_concurrency = max_concurrency
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.stats = {"calls": 0, "timeouts": 0, "errors": 0, "active": 0, "peak_active": 0}
+
+    def _release(self, fut):
+        if not fut.cancelled():
+            fut.exception()  # Mark retrieved; callers that timed out never await it
+        self.stats["active"] -= 1
+        self.semaphore.release()
+
+    async def invoke(self, llm, prompt: str, timeout: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        await self.semaphore.acquire()
+        self.stats["calls"] += 1
+        self.stats["active"] += 1
+        self.stats["peak_active"] = max(self.stats["peak_active"], self.stats["active"])
+
+        try:
+            ainvoke = getattr(llm, "ainvoke", None)
+            native = inspect.iscoroutinefunction(ainvoke)
+            if native:
+                fut = asyncio.ensure_future(ainvoke(prompt))
+            else:
+                fut = loop.run_in_executor(self.pool, llm.invoke, prompt)
+        except Exception:
+            # Failed before there was a future to release the slot
+            self.stats["errors"] += 1
+            self.stats["active"] -= 1
+            self.semaphore.release()
+            raise
+        fut.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats["timeouts"] += 1
+            # Cancelling the wrapper of a running thread would free its slot early
+            if native:
+                fut.cancel()
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+_llm_executor: Optional[LLMExecutor] = None
+
+def get_llm_executor() -> LLMExecutor:
+    global _llm_executor
+    if _llm_executor is None:
+        _llm_executor = LLMExecutor(int(os.getenv("MATRIX_LLM_CONCURRENCY", 8)))
+    return _llm_executor
+
+# --- C++ Parsing ---
+@dataclass
+class Diagnostic:
+    """Plain copy of a libclang diagnostic, safe to cache after its TU is reparsed."""
+    severity: int
+    spelling: str
+    line: int = 0
+    column: int = 0
+
+class CppParser:
+    """libclang parsing on a worker pool with a diagnostics cache keyed by source hash.
+
+    Each owner (usually an agent) keeps its last translation unit and changed
+    code is applied with reparse(), which reuses the precompiled preamble.
+    Identical sources, including ones already being parsed, share one parse.
+    """
+
+    def __init__(self, max_workers: int = 2, cache_size: int = 512, args: Iterable[str] = ('-std=c++17',)):
+        self.args = list(args)
+        self.cache_size = cache_size
+        self.index = cindex.Index.create()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clang")
+        self.cache: OrderedDict = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.units: Dict[str, Any] = {}
+        self.unit_locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "parses": 0, "reparses": 0, "parse_seconds": 0.0}
+
+    async def parse(self, code: str, owner: str = "dynamic_code") -> List[Diagnostic]:
+        digest = hashlib.sha256(code.encode()).hexdigest()
+        cached = self.cache.get(digest)
+        if cached is not None:
+            self.cache.move_to_end(digest)
+            self.stats["hits"] += 1
+            return cached
+        pending = self.inflight.get(digest)
+        if pending is not None:
+            self.stats["hits"] += 1
+            return await asyncio.shield(pending)
+
+        self.stats["misses"] += 1
+        fut = asyncio.get_running_loop().run_in_executor(self.pool, self._parse_sync, owner, code)
+        self.inflight[digest] = fut
+        try:
+            diagnostics = await asyncio.shield(fut)
+        finally:
+            if self.inflight.get(digest) is fut:
+                del self.inflight[digest]
+        self.cache[digest] = diagnostics
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return diagnostics
+
+    def _parse_sync(self, owner: str, code: str) -> List[Diagnostic]:
+        with self.lock:
+            unit_lock = self.unit_locks.setdefault(owner, threading.Lock())
+        # A translation unit must only be used by one thread at a time
+        with unit_lock:
+            filename = f"{owner}.cpp"
+            unsaved = [(filename, code)]
+            start = time.perf_counter()
+            tu = self.units.get(owner)
+            if tu is None:
+                tu = self.index.parse(filename, args=self.args, unsaved_files=unsaved,
+                                      options=cindex.TranslationUnit.PARSE_PRECOMPILED_PREAMBLE)
+                self.units[owner] = tu
+                kind = "parses"
+            else:
+                tu.reparse(unsaved_files=unsaved)
+                kind = "reparses"
+            diagnostics = [
+                Diagnostic(d.severity, d.spelling, getattr(d.location, "line", 0), getattr(d.location, "column", 0))
+                for d in tu.diagnostics
+            ]
+            elapsed = time.perf_counter() - start
+        with self.lock:
+            self.stats[kind] += 1
+            self.stats["parse_seconds"] += elapsed
+        return diagnostics
+
+    def report(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        work = self.stats["parses"] + self.stats["reparses"]
+        return dict(
+            self.stats,
+            hit_rate=self.stats["hits"] / lookups if lookups else 0.0,
+            mean_parse_ms=self.stats["parse_seconds"] * 1000 / work if work else 0.0,
+            cached_sources=len(self.cache),
+        )
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+_cpp_parser: Optional[CppParser] = None
+
+def get_cpp_parser() -> CppParser:
+    global _cpp_parser
+    if _cpp_parser is None:
+        _cpp_parser = CppParser(max_workers=int(os.getenv("MATRIX_CLANG_WORKERS", 2)))
+    return _cpp_parser
+
+# --- Nim Batching ---
+class NimBatcher:
+    """Batches agent buffers into one native call per flush, off the event loop.
+
+    Pending buffers are packed into one bytearray. offsets holds n + 1 entries,
+    so item i is buffer[offsets[i]:offsets[i + 1]]. If the module exports
+    process_batch(buffer, offsets) -> (out_buffer, out_offsets), the batch
+    crosses into Nim once. Each caller then gets a memoryview slice of the
+    output with no copy. Modules with only process_buffer(str) get one call
+    per item, still on the worker thread; an item that raises fails only its
+    own caller. Native calls run on a single thread, so the Nim runtime is only
+    entered from one place.
+    """
+
+    def __init__(self, module, max_batch: int = 256, max_delay: float = 0.005):
+        self.module = module
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nim")
+        self.pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+        self.stats = {"batches": 0, "items": 0, "bytes": 0, "native_calls": 0, "native_seconds": 0.0}
+
+    async def submit(self, data: Union[str, bytes]):
+        if isinstance(data, str):
+            data = data.encode()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.pending.append((data, fut))
+        if len(self.pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        return await fut
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.pending:
+            task = asyncio.ensure_future(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        items, self.pending = self.pending, []
+        if not items:
+            return
+        offsets = [0]
+        for data, _ in items:
+            offsets.append(offsets[-1] + len(data))
+        buffer = bytearray().join(data for data, _ in items)
+        self.stats["batches"] += 1
+        self.stats["items"] += len(items)
+        self.stats["bytes"] += len(buffer)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.pool, self._call_native, buffer, offsets)
+        except Exception as e:
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), result in zip(items, results):
+            if fut.done():
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+    def _call_native(self, buffer: bytearray, offsets: List[int]) -> List[Any]:
+        view = memoryview(buffer)
+        process_batch = getattr(self.module, "process_batch", None)
+        start = time.perf_counter()
+        if process_batch is not None:
+            out, out_offsets = process_batch(view, offsets)
+            calls = 1
+            if len(out_offsets) != len(offsets):
+                raise ValueError(f"process_batch returned {len(out_offsets) - 1} results for {len(offsets) - 1} inputs")
+            out_view = memoryview(out)
+            results = [out_view[out_offsets[i]:out_offsets[i + 1]] for i in range(len(out_offsets) - 1)]
+        else:
+            calls = len(offsets) - 1
+            results = []
+            for i in range(calls):
+                try:
+                    results.append(self.module.process_buffer(str(view[offsets[i]:offsets[i + 1]], "utf-8")))
+                except Exception as e:
+                    results.append(e)
+        self.stats["native_calls"] += calls
+        self.stats["native_seconds"] += time.perf_counter() - start
+        return results
+
+    async def measure_crossing(self, samples: int = 1000) -> Dict[str, float]:
+        """Per-call overhead of entering the module with empty input, in microseconds.
+
+        Runs on the native thread, like real batches, so the loop is not blocked.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._measure_crossing, samples)
+
+    def _measure_crossing(self, samples: int) -> Dict[str, float]:
+        empty = memoryview(bytearray())
+        process_batch = getattr(self.module, "process_batch", None)
+        start = time.perf_counter()
+        for _ in range(samples):
+            if process_batch is not None:
+                process_batch(empty, [0])
+            else:
+                self.module.process_buffer("")
+        per_call = (time.perf_counter() - start) / samples * 1e6
+        return {"samples": samples, "per_call_us": per_call}
+
+    def report(self) -> Dict[str, Any]:
+        calls = self.stats["native_calls"]
+        return dict(
+            self.stats,
+            items_per_batch=self.stats["items"] / self.stats["batches"] if self.stats["batches"] else 0.0,
+            native_us_per_call=self.stats["native_seconds"] * 1e6 / calls if calls else 0.0,
+        )
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+_nim_batchers: Dict[int, NimBatcher] = {}
+
+def get_nim_batcher(module) -> NimBatcher:
+    """One shared batcher per native module, so every agent's buffers go into the same batches."""
+    batcher = _nim_batchers.get(id(module))
+    if batcher is None or batcher.module is not module:
+        batcher = _nim_batchers[id(module)] = NimBatcher(module)
+    return batcher
+
 # --- Hybrid Agent with Living Code and Multi-Language Execution ---
 class HybridAgent:
-    def __init__(self, name: str, env: LivingEnvironment, initial_prompt: str):
+    def __init__(self, name: str, env: LivingEnvironment, initial_prompt: str,
+                 view_prefixes: Optional[Iterable[str]] = None, snapshot_chars: int = 4000,
+                 memory_tokens: int = 2000, llm_timeout: Optional[float] = 120.0,
+                 llm_executor: Optional[LLMExecutor] = None, cpp_parser: Optional[CppParser] = None,
+                 nim_batcher: Optional[NimBatcher] = None, wake_prefixes: Optional[Iterable[str]] = None,
+                 debounce: float = 0.05, max_idle: Optional[float] = 60.0):
         self.name = name
         self.env = env
-        self.prompt = initial_prompt
-        self.memory = InMemoryConversationMemory()
+        # A persisted environment may already hold a newer prompt from before a restart
+        self.prompt = env.get_state(f"prompt_update_{name}") or initial_prompt
+        # Each iteration sees only changes since the last one, capped at snapshot_chars
+        self.view_prefixes = view_prefixes
+        self.snapshot_chars = snapshot_chars
+        self.seen_version = 0
+        self.memory = BoundedSummaryMemory(max_tokens=memory_tokens, summarizer=self.summarize)
+        self.token_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.llm_timeout = llm_timeout
+        self.llm_executor = llm_executor or get_llm_executor()
         self.llm = None
-        self.chain = None
         self.llm_ready = False
         try:
             self.llm = OpenAI(temperature=0.3)
-            self.chain = ConversationChain(llm=self.llm, memory=self.memory)
             self.llm_ready = True
         except Exception as e:
             logger.warning(f'[{self.name}] OpenAI LLM not available: {e}')
         self.running = True
-        self.env.subscribe(self.on_env_update)
+        # Iterations run when a subscribed key changes rather than on a fixed tick. Updates
+        # within debounce seconds of the first share one iteration. After max_idle seconds
+        # with no wake-up, the agent checks its view once for changes it does not subscribe to.
+        self.debounce = debounce
+        self.max_idle = max_idle
+        self.wakeup = asyncio.Event()
+        self.wake_stats = {"wakeups": 0, "updates": 0, "idle_checks": 0, "idle_skips": 0}
+        self.env.subscribe(self.on_env_update, keys=[f"prompt_update_{self.name}", f"code_update_{self.name}"],
+                           prefixes=wake_prefixes, on_batch=self.on_env_batch)
 
-        self.clang_index = cindex.Index.create()
+        self.cpp_parser = cpp_parser or get_cpp_parser()
+        self.nim_batcher = nim_batcher
         try:
             self.nim_agent = nimpy.import_module("nim_agent")
+            self.nim_batcher = nim_batcher or get_nim_batcher(self.nim_agent)
             self.nim_ready = True
         except Exception as e:
             logger.warning(f"[{self.name}] Nim module not available: {e}")
             self.nim_ready = False
 
     async def on_env_update(self, key: str, value: Any):
+        self.wake_stats["updates"] += 1
+        self.wakeup.set()
         if key == f"prompt_update_{self.name}":
             logger.info(f"[{self.name}] Prompt update received")
             self.prompt = value
         if key == f"code_update_{self.name}":
             logger.info(f"[{self.name}] Received C++ code update")
-            diag = self.parse_cpp_code(value)
+            diag = await self.parse_cpp_code(value)
             for d in diag:
                 logger.warning(f"[{self.name}][Clang] {d.spelling}")
 
-    def parse_cpp_code(self, code: str):
-        tu = self.clang_index.parse("dynamic_code.cpp", args=['-std=c++17'], unsaved_files=[('dynamic_code.cpp', code)])
-        return list(tu.diagnostics)
+    async def on_env_batch(self, changes: Dict[str, Any]):
+        for key, value in changes.items():
+            await self.on_env_update(key, value)
+
+    async def parse_cpp_code(self, code: str) -> List[Diagnostic]:
+        return await self.cpp_parser.parse(code, owner=self.name)
 
     async def execute_nim_logic(self, data: str):
         if not self.nim_ready:
             logger.warning(f"[{self.name}] Skipping Nim execution (module unavailable)")
             return
-        result = self.nim_agent.process_buffer(data)
+        try:
+            result = await self.nim_batcher.submit(data)
+        except Exception as e:
+            logger.error(f"[{self.name}] Nim execution failed: {e}")
+            return
         logger.debug(f"[{self.name}] Nim module result: {result}")
+        return result
+
+    def own_keys(self) -> Tuple[str, ...]:
+        # Already reflected in self.prompt or written by this agent
+        return (f"prompt_update_{self.name}", f"code_update_{self.name}", f"status_{self.name}")
+
+    def has_unseen_changes(self) -> bool:
+        """Whether keys in this agent's view changed since its last prompt."""
+        own = self.own_keys()
+        prefixes = tuple(self.view_prefixes) if self.view_prefixes is not None else None
+        return any(key not in own and (prefixes is None or key.startswith(prefixes))
+                   for key in self.env.changed_keys_since(self.seen_version))
+
+    async def wait_for_changes(self) -> bool:
+        """Wait for a wake-up. Return whether there is anything to react to.
+
+        A wake-up is followed by a debounce window so that a burst becomes one
+        iteration. Timing out after max_idle returns True only if the view changed.
+        stop() wakes the agent at once.
+        """
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), self.max_idle)
+        except asyncio.TimeoutError:
+            self.wake_stats["idle_checks"] += 1
+            if self.has_unseen_changes():
+                return True
+            self.wake_stats["idle_skips"] += 1
+            return False
+        if self.debounce and self.running:
+            await asyncio.sleep(self.debounce)
+        # Cleared after the window: anything later wakes the next wait straight away
+        self.wakeup.clear()
+        self.wake_stats["wakeups"] += 1
+        return self.running
+
+    def build_prompt(self, iteration: int) -> str:
+        delta = self.env.changes_since(self.seen_version, prefixes=self.view_prefixes, exclude=self.own_keys(),
+                                       max_chars=self.snapshot_chars)
+        self.seen_version = delta.version
+        return f"{self.prompt}\nEnv Changes (v{delta.version}):\n{delta.render()}\nIteration: {iteration}"
+
+    async def invoke_llm(self, prompt: str) -> str:
+        if not self.llm_ready:
+            raise RuntimeError("LLM not available")
+        response = await self.llm_executor.invoke(self.llm, prompt, timeout=self.llm_timeout)
+        self.token_usage["calls"] += 1
+        self.token_usage["prompt_tokens"] += self.memory.count_tokens(prompt)
+        self.token_usage["completion_tokens"] += self.memory.count_tokens(str(response))
+        return response
+
+    async def summarize(self, prompt: str) -> str:
+        return await self.invoke_llm(prompt)
+
+    def usage(self) -> Dict[str, Any]:
+        return {"tokens": dict(self.token_usage), "memory": self.memory.usage(), "clang": self.cpp_parser.report(),
+                "nim": self.nim_batcher.report() if self.nim_batcher else {}, "wakeups": dict(self.wake_stats)}
 
     async def run(self):
         iteration = 0
         while self.running:
-            env_snapshot = str(self.env.state)
-            full_prompt = f"{self.prompt}\nEnv State:\n{env_snapshot}\nIteration: {iteration}"
+            prompt = self.build_prompt(iteration)
+            history = self.memory.render()
+            full_prompt = f"{history}\n{prompt}" if history else prompt
             try:
-                llm_resp = self.chain.invoke(full_prompt)
+                llm_resp = await self.invoke_llm(full_prompt)
+                self.memory.add_turn(prompt, llm_resp)
                 logger.info(f"[{self.name}] LLM output: {llm_resp[:250]}...")
                 await self.env.update_state(f"status_{self.name}", llm_resp)
+            except asyncio.TimeoutError:
+                logger.error(f"[{self.name}] LLM call timed out after {self.llm_timeout}s")
             except Exception as e:
                 logger.error(f"[{self.name}] LLM call failed: {e}")
 
@@ -91,22 +963,25 @@ class HybridAgent:
             cpp_code = """
             int add(int a, int b) { return a + b; }
             """
-            self.parse_cpp_code(cpp_code)
+            await self.parse_cpp_code(cpp_code)
 
             # Nim logic invocation with complex data string
             await self.execute_nim_logic(f"Nim data iteration {iteration} from {self.name}")
 
-            await asyncio.sleep(6)
             iteration += 1
+            # Idle time costs no LLM calls
+            while self.running and not await self.wait_for_changes():
+                pass
 
     def stop(self):
         logger.info(f"[{self.name}] Stopping execution.")
         self.running = False
+        self.wakeup.set()
 
 # --- Host AI Manager ---
 class HostAgent:
-    def __init__(self):
-        self.env = LivingEnvironment()
+    def __init__(self, store: Optional[EnvironmentStore] = None):
+        self.env = LivingEnvironment(store=store)
         self.agents: List[HybridAgent] = []
         self.running = True
 
@@ -118,40 +993,360 @@ class HostAgent:
         count = 0
         while self.running and count < 8:
             await asyncio.sleep(10)
-            tasks = []
-            for agent in self.agents:
-                prompt = f"Agent update cycle {count} for {agent.name}. Adapt behavior dynamically."
-                tasks.append(self.env.update_state(f"prompt_update_{agent.name}", prompt))
+            # One batch per cycle: each agent is notified once with both of its updates
+            async with self.env.batch() as changes:
+                for agent in self.agents:
+                    prompt = f"Agent update cycle {count} for {agent.name}. Adapt behavior dynamically."
+                    changes[f"prompt_update_{agent.name}"] = prompt
 
-                # Optional dynamic new C++ source for compilation
-                new_cpp_code = f"int dynamic_func() {{ return {count} * 42; }}"
-                tasks.append(self.env.update_state(f"code_update_{agent.name}", new_cpp_code))
-
-            if tasks:
-                await asyncio.gather(*tasks)
+                    # Optional dynamic new C++ source for compilation
+                    new_cpp_code = f"int dynamic_func() {{ return {count} * 42; }}"
+                    changes[f"code_update_{agent.name}"] = new_cpp_code
 
             count += 1
 
         logger.info("[Host] All update cycles complete, stopping agents.")
+        await self.stop_agents()
+
+    async def stop_agents(self):
         for agent in self.agents:
             agent.stop()
+            logger.info(f"[Host] {agent.name} usage: {agent.usage()}")
 
     async def run(self):
         tasks = [asyncio.create_task(agent.run()) for agent in self.agents]
         updater = asyncio.create_task(self.update_loop())
         await asyncio.gather(updater, *tasks)
         self.running = False
+        await self.env.close()
+
+# --- Sharded Host: agents spread over worker processes ---
+# Every shard keeps a full replica of the environment. Writes go to the broker in
+# the host process, which gives each batch the next version and sends it to all
+# shards, the writer included. Every replica therefore applies the same batches in
+# the same order, so updates to a key are seen in one order everywhere.
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+async def _receive(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    line = await reader.readline()
+    return json.loads(line) if line else None
+
+@dataclass
+class AgentSpec:
+    """Recipe for building an agent inside a shard process.
+
+    factory is called as factory(name, env, initial_prompt, **options) and defaults
+    to HybridAgent. It must be importable from a module when shards are spawned.
+    """
+    name: str
+    initial_prompt: str
+    options: Dict[str, Any] = field(default_factory=dict)
+    factory: Optional[Callable[..., Any]] = None
+
+    def build(self, env: LivingEnvironment):
+        return (self.factory or HybridAgent)(self.name, env, self.initial_prompt, **self.options)
+
+class StateBroker(LivingEnvironment):
+    """Authoritative environment in the host process; orders and fans out every shard's writes."""
+
+    def __init__(self, socket_path: str, change_log_size: int = 10000, store: Optional[EnvironmentStore] = None):
+        super().__init__(change_log_size, store)
+        self.socket_path = socket_path
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.shards: Dict[int, asyncio.StreamWriter] = {}
+        self.shard_agents: Dict[int, List[str]] = {}
+        self.agent_usage: Dict[str, Any] = {}
+        self.finished: set = set()
+        self.changed = asyncio.Event()
+        self.stats["broadcasts"] = 0
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=MAX_MESSAGE_BYTES)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        hello = await _receive(reader)
+        if not hello or hello.get("op") != "hello":
+            writer.close()
+            return
+        shard = hello["shard"]
+        self.shards[shard] = writer
+        self.shard_agents[shard] = hello.get("agents", [])
+        self.changed.set()
+        try:
+            while (message := await _receive(reader)) is not None:
+                if message["op"] == "update":
+                    # Awaited before reading on, so one shard's writes keep their order
+                    await self.update_many(message["changes"], origin=shard, ref=message["ref"])
+                elif message["op"] == "usage":
+                    self.agent_usage.update(message["agents"])
+                    self.finished.add(shard)
+                    self.changed.set()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.error(f"[Broker] Shard {shard} connection lost: {e}")
+        finally:
+            self.shards.pop(shard, None)
+            self.finished.add(shard)
+            self.changed.set()
+            writer.close()
+
+    async def _wait_for(self, condition: Callable[[], bool]):
+        while not condition():
+            self.changed.clear()
+            await self.changed.wait()
+
+    async def wait_for_shards(self, count: int):
+        await self._wait_for(lambda: len(self.shards) >= count)
+
+    def start_shards(self):
+        """Send every connected shard the current state; shards build their agents from it."""
+        line = _encode({"op": "start", "state": self.state, "key_versions": self.key_versions,
+                        "version": self.version})
+        for writer in self.shards.values():
+            writer.write(line)
+
+    async def stop_shards(self, timeout: float = 30.0) -> Dict[str, Any]:
+        """Ask every shard to stop its agents and wait for their usage reports."""
+        expected = set(self.shards)
+        line = _encode({"op": "stop"})
+        for writer in self.shards.values():
+            writer.write(line)
+        try:
+            await asyncio.wait_for(self._wait_for(lambda: expected <= self.finished), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"[Broker] Shards {sorted(expected - self.finished)} did not stop within {timeout}s")
+        return self.agent_usage
+
+    async def update_state(self, key: str, value: Any):
+        await self.update_many({key: value})
+
+    async def update_many(self, changes: Union[Dict[str, Any], Iterable[Tuple[str, Any]]],
+                          origin: Optional[int] = None, ref: Optional[int] = None):
+        changes = dict(changes)
+        if not changes:
+            return
+        # Written to every shard before the first await, so version order is send order
+        line = _encode({"op": "apply", "version": self.version + 1, "changes": changes,
+                        "origin": origin, "ref": ref})
+        writers = list(self.shards.values())
+        for writer in writers:
+            writer.write(line)
+        self.stats["broadcasts"] += 1
+        deltas = self._apply(changes)
+        await self._notify(deltas)
+        await asyncio.gather(*[writer.drain() for writer in writers], return_exceptions=True)
+
+    async def close(self):
+        for writer in self.shards.values():
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await super().close()
+
+class ShardEnvironment(LivingEnvironment):
+    """Replica of the broker's environment inside a shard process.
+
+    Writes are sent to the broker and return once the broker's ordered copy has been
+    applied here. Local subscribers are notified by one delivery task in version order,
+    so a callback may itself write to the environment without blocking the replica.
+    """
+
+    def __init__(self, shard: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 change_log_size: int = 10000):
+        super().__init__(change_log_size)
+        self.shard = shard
+        self.reader = reader
+        self.writer = writer
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.deliveries: asyncio.Queue = asyncio.Queue()
+        self.stop_requested = asyncio.Event()
+        self.connected = True
+        self._refs = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._read_loop()), asyncio.create_task(self._delivery_loop())]
+
+    async def _read_loop(self):
+        try:
+            while (message := await _receive(self.reader)) is not None:
+                if message["op"] == "stop":
+                    # Keep reading so writes the agents make while stopping still complete
+                    self.stop_requested.set()
+                elif message["op"] == "apply":
+                    self.deliveries.put_nowait(self._apply(message["changes"], message["version"]))
+                    if message["origin"] == self.shard:
+                        fut = self.pending.pop(message["ref"], None)
+                        if fut is not None and not fut.done():
+                            fut.set_result(None)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.error(f"[Shard {self.shard}] Broker connection lost: {e}")
+        finally:
+            self.connected = False
+            self.stop_requested.set()
+            for fut in self.pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("Broker connection closed"))
+            self.pending.clear()
+
+    async def _delivery_loop(self):
+        while True:
+            deltas = await self.deliveries.get()
+            try:
+                await self._notify(deltas)
+            except Exception as e:
+                logger.error(f"[Shard {self.shard}] Subscriber failed: {e}")
+            finally:
+                self.deliveries.task_done()
+
+    async def drain(self):
+        """Wait until subscribers have seen every update applied so far."""
+        await self.deliveries.join()
+
+    async def update_state(self, key: str, value: Any):
+        await self.update_many({key: value})
+
+    async def update_many(self, changes: Union[Dict[str, Any], Iterable[Tuple[str, Any]]]):
+        changes = dict(changes)
+        if not changes:
+            return
+        if not self.connected:
+            raise ConnectionError(f"Shard {self.shard} is no longer connected to the broker")
+        ref = next(self._refs)
+        fut = self.pending[ref] = asyncio.get_running_loop().create_future()
+        self.writer.write(_encode({"op": "update", "ref": ref, "changes": changes}))
+        await self.writer.drain()
+        await fut
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.writer.close()
+
+async def _shard_main(shard: int, socket_path: str, specs: List[AgentSpec]):
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=MAX_MESSAGE_BYTES)
+    writer.write(_encode({"op": "hello", "shard": shard, "agents": [spec.name for spec in specs]}))
+    await writer.drain()
+    start = await _receive(reader)
+    if not start or start["op"] != "start":
+        writer.close()
+        return
+    env = ShardEnvironment(shard, reader, writer)
+    env.load_snapshot(start["state"], start["key_versions"], start["version"])
+    agents = [spec.build(env) for spec in specs]
+    env.start()
+    logger.info(f"[Shard {shard}] Running {len(agents)} agents in process {os.getpid()}")
+    tasks = [asyncio.create_task(agent.run()) for agent in agents]
+
+    await env.stop_requested.wait()
+    await env.drain()
+    for agent in agents:
+        agent.stop()
+    for agent, result in zip(agents, await asyncio.gather(*tasks, return_exceptions=True)):
+        if isinstance(result, Exception):
+            logger.error(f"[Shard {shard}] {agent.name} failed: {result}")
+    usage = {agent.name: agent.usage() for agent in agents}
+    writer.write(_encode({"op": "usage", "agents": usage}))
+    await writer.drain()
+    await env.close()
+
+def run_shard(shard: int, socket_path: str, specs: List[AgentSpec]):
+    """Process entry point for one shard."""
+    global _llm_executor, _cpp_parser
+    # Pools inherited through fork have no live threads in this process
+    _llm_executor, _cpp_parser = None, None
+    _nim_batchers.clear()
+    asyncio.run(_shard_main(shard, socket_path, specs))
+
+class ShardedHostAgent(HostAgent):
+    """HostAgent that runs its agents in num_shards worker processes, each with its own event loop.
+
+    Agents are registered as AgentSpec and built inside their shard. self.env is the
+    broker; host writes to it reach every shard like any other update.
+    """
+
+    def __init__(self, num_shards: Optional[int] = None, socket_path: Optional[str] = None,
+                 start_method: Optional[str] = None, store: Optional[EnvironmentStore] = None):
+        self.num_shards = max(1, num_shards or os.cpu_count() or 1)
+        self._socket_dir = None
+        if socket_path is None:
+            self._socket_dir = tempfile.mkdtemp(prefix="matrix-")
+            socket_path = os.path.join(self._socket_dir, "broker.sock")
+        self.env = StateBroker(socket_path, store=store)
+        self.agents: List[AgentSpec] = []
+        self.running = True
+        self.mp = multiprocessing.get_context(start_method)
+        self.processes: List[multiprocessing.Process] = []
+        self.agent_usage: Dict[str, Any] = {}
+
+    def register_agent(self, spec: AgentSpec):
+        logger.info(f"[Host] Registering agent {spec.name}")
+        self.agents.append(spec)
+
+    def assignments(self) -> List[List[AgentSpec]]:
+        """Agents per shard, round-robin; no shard is started without agents."""
+        groups = [self.agents[i::self.num_shards] for i in range(self.num_shards)]
+        return [group for group in groups if group]
+
+    async def start(self, timeout: float = 30.0):
+        await self.env.start()
+        groups = self.assignments()
+        for shard, specs in enumerate(groups):
+            process = self.mp.Process(target=run_shard, args=(shard, self.env.socket_path, specs),
+                                      name=f"matrix-shard-{shard}", daemon=True)
+            process.start()
+            self.processes.append(process)
+        await asyncio.wait_for(self.env.wait_for_shards(len(groups)), timeout)
+        self.env.start_shards()
+        logger.info(f"[Host] {len(self.agents)} agents running in {len(groups)} shards")
+
+    async def stop_agents(self, timeout: float = 30.0):
+        if not self.processes:
+            return
+        self.agent_usage = await self.env.stop_shards(timeout)
+        for name, usage in self.agent_usage.items():
+            logger.info(f"[Host] {name} usage: {usage}")
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logger.error(f"[Host] {process.name} did not exit, terminating it")
+                process.terminate()
+        self.processes = []
+        await self.env.close()
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+
+    async def run(self):
+        await self.start()
+        try:
+            await self.update_loop()
+        finally:
+            await self.stop_agents()
+            self.running = False
 
 # --- Main Entrypoint ---
+AGENT_PROMPTS = {
+    "AlphaBot": "You are AlphaBot, leading agentic matrix coordination.",
+    "BetaBot": "You are BetaBot, specialist in adaptive code evolution.",
+    "GammaBot": "You are GammaBot, UI and UX genius mirroring living interfaces.",
+}
+
 async def main():
-    host = HostAgent()
-    agents = [
-        HybridAgent("AlphaBot", host.env, "You are AlphaBot, leading agentic matrix coordination."),
-        HybridAgent("BetaBot", host.env, "You are BetaBot, specialist in adaptive code evolution."),
-        HybridAgent("GammaBot", host.env, "You are GammaBot, UI and UX genius mirroring living interfaces.")
-    ]
-    for ag in agents:
-        host.register_agent(ag)
+    # MATRIX_STATE_DIR keeps the environment on disk across restarts
+    state_dir = os.getenv("MATRIX_STATE_DIR")
+    store = EnvironmentStore(state_dir, fsync=os.getenv("MATRIX_FSYNC", "interval")) if state_dir else None
+    # MATRIX_SHARDS > 0 runs the agents in that many worker processes
+    shards = int(os.getenv("MATRIX_SHARDS", "0"))
+    if shards > 0:
+        host = ShardedHostAgent(num_shards=shards, store=store)
+        for name, prompt in AGENT_PROMPTS.items():
+            host.register_agent(AgentSpec(name, prompt))
+    else:
+        host = HostAgent(store=store)
+        for name, prompt in AGENT_PROMPTS.items():
+            host.register_agent(HybridAgent(name, host.env, prompt))
     await host.run()
 
 if __name__ == "__main__":
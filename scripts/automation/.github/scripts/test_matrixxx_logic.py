@@ -2,6 +2,8 @@ import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 import sys
 import os
+import tempfile
+import threading
 
 # Ensure the script directory is in the path
 sys.path.insert(0, os.path.dirname(__file__))
@@ -16,17 +18,18 @@ sys.modules['langchain.chains'] = MagicMock()
 sys.modules['langchain.memory'] = MagicMock()
 
 # Now import the actual classes
-from matrixxx import HostAgent, LivingEnvironment, HybridAgent
+from matrixxx import (HostAgent, LivingEnvironment, HybridAgent, BoundedSummaryMemory, LLMExecutor, CppParser,
+                      NimBatcher, AgentSpec, ShardedHostAgent, EnvironmentStore)
 
 async def test_actual_update_loop_logic():
     # Setup
     host = HostAgent()
     env = host.env
 
-    # We want to track calls to update_state but still have it update the state
-    original_update_state = env.update_state
-    mock_update_state = AsyncMock(side_effect=original_update_state)
-    env.update_state = mock_update_state
+    # We want to track calls to update_many but still have it update the state
+    original_update_many = env.update_many
+    mock_update_many = AsyncMock(side_effect=original_update_many)
+    env.update_many = mock_update_many
 
     # Create real agents but mock their name and register them
     # HybridAgent.__init__ calls self.env.subscribe(self.on_env_update)
@@ -55,8 +58,8 @@ async def test_actual_update_loop_logic():
         # We can poll the state until it's updated or just wait a tiny bit
         for _ in range(40): # max 2s
             await real_sleep(0.05)
-            # 2 agents * (1 prompt + 1 code update) = 4 calls
-            if mock_update_state.call_count >= 4:
+            # 1 batch per cycle carrying 2 agents * (1 prompt + 1 code update)
+            if mock_update_many.call_count >= 1:
                 # Stop the loop after the first cycle
                 host.running = False
                 break
@@ -67,8 +70,9 @@ async def test_actual_update_loop_logic():
             pass
 
     # Verification of ACTUAL matrixxx.py logic
-    # Total calls for 1 cycle with 2 agents: 2 prompt updates + 2 code updates
-    assert mock_update_state.call_count >= 4
+    # Each cycle is one batch with 2 prompt updates + 2 code updates
+    assert mock_update_many.call_count >= 1
+    assert len(mock_update_many.call_args_list[0].args[0]) == 4
 
     # Check that at least cycle 0 was executed and stored in the env state correctly
     # Since multiple cycles might run, we check that keys exist and contain some valid data.
@@ -84,5 +88,548 @@ async def test_actual_update_loop_logic():
 
     print("Functional test on actual HostAgent passed!")
 
+async def test_subscription_routing():
+    env = LivingEnvironment()
+    seen = {"key": [], "prefix": [], "wildcard": [], "both": []}
+
+    def recorder(name):
+        async def callback(key, value):
+            seen[name].append(key)
+        return callback
+
+    env.subscribe(recorder("key"), keys=["status_Agent1"])
+    env.subscribe(recorder("prefix"), prefixes=["code_update_"])
+    env.subscribe(recorder("wildcard"))
+    both = recorder("both")
+    env.subscribe(both, keys=["code_update_Agent1"], prefixes=["code_"])
+
+    await env.update_state("status_Agent1", "ok")
+    await env.update_state("status_Agent2", "ok")
+    await env.update_state("code_update_Agent1", "int f();")
+    await env.update_state("unrelated", 1)
+
+    assert seen["key"] == ["status_Agent1"]
+    assert seen["prefix"] == ["code_update_Agent1"]
+    assert seen["wildcard"] == ["status_Agent1", "status_Agent2", "code_update_Agent1", "unrelated"]
+    # Matching both a key and a prefix still means one notification
+    assert seen["both"] == ["code_update_Agent1"]
+
+    env.unsubscribe(both)
+    await env.update_state("code_update_Agent1", "int g();")
+    assert seen["both"] == ["code_update_Agent1"]
+    assert env.prefix_subscribers.keys() == {"code_update_"}
+
+    # Each agent is only woken for its own keys
+    env = LivingEnvironment()
+    calls = []
+    original_on_env_update = HybridAgent.on_env_update
+
+    async def counting_on_env_update(self, key, value):
+        calls.append((self.name, key))
+        await original_on_env_update(self, key, value)
+
+    with patch.object(HybridAgent, "on_env_update", counting_on_env_update):
+        agents = [HybridAgent(f"Agent{i}", env, "Prompt") for i in range(50)]
+        await env.update_state("prompt_update_Agent7", "New prompt")
+        await env.update_state("status_Agent7", "Not routed to anyone")
+
+    assert calls == [("Agent7", "prompt_update_Agent7")]
+    assert agents[7].prompt == "New prompt"
+
+    print("Subscription routing test passed!")
+
+async def test_batched_updates():
+    env = LivingEnvironment()
+    per_key, batches = [], []
+
+    async def on_update(key, value):
+        per_key.append((key, value))
+
+    async def on_batch(changes):
+        # Every change in the batch is already visible
+        assert env.state["b"] == 2 and env.state["a"] == 3
+        batches.append(changes)
+
+    env.subscribe(on_update, prefixes=["a"])
+    on_update_wildcard = AsyncMock()
+    env.subscribe(on_update_wildcard, on_batch=on_batch)
+
+    async with env.batch() as changes:
+        changes["a"] = 1
+        changes["b"] = 2
+        changes["a"] = 3  # Coalesced with the first write
+        changes["c"] = 4
+        assert "a" not in env.state
+
+    assert per_key == [("a", 3)]
+    assert batches == [{"a": 3, "b": 2, "c": 4}]
+    on_update_wildcard.assert_not_called()
+    assert env.stats == {"updates": 3, "notifications": 2}
+
+    try:
+        async with env.batch() as changes:
+            changes["a"] = 100
+            raise RuntimeError("abort")
+    except RuntimeError:
+        pass
+    assert env.state["a"] == 3 and len(batches) == 1
+
+    # Agents get both of their updates in one notification
+    agent = HybridAgent("Agent1", env, "Old prompt")
+    agent.parse_cpp_code = AsyncMock(return_value=[])
+    with patch.object(agent, "on_env_batch", wraps=agent.on_env_batch) as spy:
+        env.batch_handlers[agent.on_env_update] = spy
+        await env.update_many([("prompt_update_Agent1", "New prompt"), ("code_update_Agent1", "int f();"),
+                               ("prompt_update_Agent2", "Not mine")])
+    spy.assert_awaited_once_with({"prompt_update_Agent1": "New prompt", "code_update_Agent1": "int f();"})
+    assert agent.prompt == "New prompt"
+    agent.parse_cpp_code.assert_awaited_once_with("int f();")
+
+    print("Batched update test passed!")
+
+async def test_versioned_deltas():
+    env = LivingEnvironment(change_log_size=8)
+    agent = HybridAgent("Agent1", env, "Base prompt", snapshot_chars=200)
+
+    await env.update_state("status_Agent2", "x" * 1000)
+    await env.update_many({"status_Agent3": "ready", "prompt_update_Agent1": "Own prompt"})
+    assert env.version == 2
+
+    prompt = agent.build_prompt(0)
+    assert "Env Changes (v2)" in prompt
+    assert "status_Agent3: ready" in prompt
+    assert "prompt_update_Agent1" not in prompt  # Own keys are excluded
+    assert "x" * 500 + "...[+500 chars]" not in prompt  # Over the 200 char cap
+    assert "1 more changed keys omitted" in prompt
+    assert len(prompt) < 400
+
+    # Nothing changed since the last iteration
+    assert "(no changes)" in agent.build_prompt(1)
+
+    await env.update_state("status_Agent3", "done")
+    await env.update_state("status_Agent2", "short")
+    delta = env.changes_since(2)
+    assert list(delta.changes) == ["status_Agent2", "status_Agent3"]
+    assert delta.changes["status_Agent3"] == "done" and not delta.truncated
+
+    view = env.changes_since(0, prefixes=["status_"], max_value_chars=3)
+    assert view.changes == {"status_Agent2": "sho...[+2 chars]", "status_Agent3": "don...[+1 chars]"}
+
+    # Once the change log wraps, older versions are served from the per-key versions
+    for i in range(20):
+        await env.update_state(f"code_update_Agent{i}", f"int v{i};")
+    assert len(env.change_log) == 8
+    assert env.changed_keys_since(3)[:2] == ["code_update_Agent19", "code_update_Agent18"]
+    assert set(env.changed_keys_since(3)) == {f"code_update_Agent{i}" for i in range(20)} | {"status_Agent2"}
+    assert env.changed_keys_since(env.version - 2) == ["code_update_Agent19", "code_update_Agent18"]
+
+    print("Versioned delta test passed!")
+
+async def test_bounded_summary_memory():
+    release = asyncio.Event()
+    prompts = []
+
+    async def slow_summarizer(prompt):
+        prompts.append(prompt)
+        await release.wait()
+        return f"summary #{len(prompts)}"
+
+    memory = BoundedSummaryMemory(max_tokens=100, summarize_after=2, summarizer=slow_summarizer)
+    for i in range(10):
+        # add_turn returns immediately even while a summary is being produced
+        memory.add_turn(f"question {i} " + "q" * 80, f"answer {i} " + "a" * 80)
+        await asyncio.sleep(0)
+    usage = memory.usage()
+    assert usage["window_tokens"] <= 100 and usage["window_turns"] == 2
+    assert usage["evicted"] == 8 and len(prompts) == 1 and memory.summarizing
+
+    release.set()
+    await memory.close()
+    assert memory.summary == "summary #1"
+    assert "answer 0" in prompts[0] and "answer 1" in prompts[0]
+    # Turns evicted while the first summary ran are folded in by the next one
+    memory.add_turn("question 10", "answer 10")
+    await memory.close()
+    assert "summary #1" in prompts[1] and "answer 7" in prompts[1]
+    assert memory.usage()["pending_turns"] == 0 and memory.summary == "summary #2"
+    assert memory.render().startswith("Summary of earlier conversation:\nsummary #2")
+
+    # Failed summaries keep their turns for the next attempt
+    async def failing_summarizer(prompt):
+        raise RuntimeError("rate limited")
+    memory = BoundedSummaryMemory(max_tokens=10, summarize_after=1, summarizer=failing_summarizer)
+    memory.add_turn("a" * 40, "b" * 40)
+    memory.add_turn("c" * 40, "d" * 40)
+    await memory.close()
+    assert memory.usage()["pending_turns"] == 1 and memory.stats["summary_failures"] == 1
+
+    # Agent prompts stop growing once the window is full
+    env = LivingEnvironment()
+    agent = HybridAgent("Agent1", env, "Base prompt", memory_tokens=300)
+    agent.llm = MagicMock()
+    sizes = []
+
+    def fake_invoke(prompt):
+        if not prompt.startswith("Update this summary"):
+            sizes.append(len(prompt))
+        return "Plan: " + "x" * 200
+
+    agent.llm.invoke.side_effect = fake_invoke
+
+    async def one_iteration():
+        if len(sizes) == 30:
+            agent.stop()
+        return True
+
+    agent.wait_for_changes = one_iteration
+    await agent.run()
+    await agent.memory.close()
+
+    # Window (300 tokens) + summary (400 tokens) + current prompt, however long the run
+    assert max(sizes) < 300 * 4 + 400 * 4 + 500, max(sizes)
+    usage = agent.usage()
+    assert usage["memory"]["window_tokens"] <= 300
+    assert usage["memory"]["summaries"] >= 1
+    assert usage["tokens"]["calls"] == 30 + usage["memory"]["summaries"]
+
+    print("Bounded summary memory test passed!")
+
+async def test_llm_calls_run_off_the_event_loop():
+    import time
+    executor = LLMExecutor(max_concurrency=2)
+    env = LivingEnvironment()
+    agents = [HybridAgent(f"Agent{i}", env, "Prompt", llm_executor=executor, llm_timeout=0.3) for i in range(4)]
+    for agent in agents:
+        agent.llm = MagicMock()
+        agent.llm.invoke.side_effect = lambda prompt: time.sleep(0.1) or "done"
+    agents[3].llm.invoke.side_effect = lambda prompt: time.sleep(1.0) or "late"
+
+    # The loop keeps ticking while the blocking calls run in worker threads
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(a.invoke_llm("hi") for a in agents[:3]), agents[3].invoke_llm("slow"),
+                                   return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    ticking.cancel()
+
+    assert results[:3] == ["done"] * 3
+    assert isinstance(results[3], asyncio.TimeoutError)
+    assert elapsed < 0.6, elapsed
+    assert ticks >= 10, ticks
+    assert executor.stats["peak_active"] == 2 and executor.stats["timeouts"] == 1
+    # The timed-out thread holds its slot until it actually returns
+    assert executor.stats["active"] == 1
+    await asyncio.sleep(1.0)
+    assert executor.stats["active"] == 0
+
+    # Native async LLMs are awaited directly
+    class AsyncLLM:
+        async def ainvoke(self, prompt):
+            return f"async {prompt}"
+    assert await executor.invoke(AsyncLLM(), "hi") == "async hi"
+
+    # Failures, before or inside the worker thread, give their slot back
+    broken = MagicMock()
+    broken.invoke.side_effect = RuntimeError("rate limited")
+    for llm, error in ((None, AttributeError), (None, AttributeError), (None, AttributeError), (broken, RuntimeError)):
+        try:
+            await asyncio.wait_for(executor.invoke(llm, "hi"), 1.0)
+        except error:
+            pass
+        else:
+            raise AssertionError(f"expected {error.__name__}")
+    assert executor.stats["active"] == 0 and executor.stats["errors"] == 4
+    assert await executor.invoke(agents[0].llm, "hi") == "done"
+
+    # An agent without an LLM fails fast and never takes a slot
+    agents[0].llm, agents[0].llm_ready = None, False
+    calls = executor.stats["calls"]
+    try:
+        await agents[0].invoke_llm("hi")
+    except RuntimeError:
+        pass
+    assert executor.stats["calls"] == calls
+    executor.shutdown()
+
+    print("Off-loop LLM execution test passed!")
+
+class FakeTranslationUnit:
+    """Blocking stand-in for a libclang TU: one warning per 'TODO' in the source."""
+
+    def __init__(self, code):
+        self.reparse(unsaved_files=[("x.cpp", code)])
+
+    def reparse(self, unsaved_files):
+        import time
+        time.sleep(0.05)
+        code = unsaved_files[0][1]
+        self.diagnostics = [MagicMock(severity=2, spelling=f"TODO #{i}") for i in range(code.count("TODO"))]
+
+async def test_cpp_parse_cache():
+    parser = CppParser(max_workers=2)
+    parser.index = MagicMock()
+    parser.index.parse.side_effect = lambda filename, args, unsaved_files, options: FakeTranslationUnit(unsaved_files[0][1])
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    # Identical sources share one parse, even when requested concurrently
+    results = await asyncio.gather(*(parser.parse("int f(); // TODO", owner="Agent1") for _ in range(5)))
+    ticking.cancel()
+    assert all(r == results[0] for r in results) and results[0][0].spelling == "TODO #0"
+    assert parser.stats["parses"] == 1 and parser.stats["misses"] == 1 and parser.stats["hits"] == 4
+    assert ticks >= 5, ticks  # The loop kept running during the parse
+
+    # Changed code for the same owner reparses its translation unit
+    assert len(await parser.parse("int g(); // TODO TODO", owner="Agent1")) == 2
+    assert parser.stats["reparses"] == 1 and parser.index.parse.call_count == 1
+    # Going back to earlier code is a cache hit, not another reparse
+    assert (await parser.parse("int f(); // TODO", owner="Agent1"))[0].spelling == "TODO #0"
+    assert parser.stats["reparses"] == 1
+
+    # Agents parsing through one parser each get their own TU (Agent1 already has one)
+    env = LivingEnvironment()
+    agents = [HybridAgent(f"Agent{i}", env, "Prompt", cpp_parser=parser) for i in range(3)]
+    await env.update_many({f"code_update_Agent{i}": f"int h{i}();" for i in range(3)})
+    assert parser.index.parse.call_count == 3
+    report = agents[0].usage()["clang"]
+    assert report["parses"] == 3 and report["reparses"] == 2 and report["mean_parse_ms"] >= 50
+    assert 0 < report["hit_rate"] < 1
+    parser.shutdown()
+
+    print("C++ parse cache test passed!")
+
+class BatchNimModule:
+    """Stand-in for a Nim module exporting process_batch: upper-cases every item."""
+
+    def __init__(self):
+        self.batch_calls = []
+
+    def process_batch(self, buffer, offsets):
+        self.batch_calls.append(len(offsets) - 1)
+        return bytes(buffer).upper(), list(offsets)
+
+class BufferNimModule:
+    """Stand-in for a Nim module with only the per-item process_buffer."""
+
+    def __init__(self):
+        self.calls = []
+
+    def process_buffer(self, data):
+        self.calls.append(data)
+        if data == "bad":
+            raise ValueError("bad input")
+        return len(data)
+
+async def test_nim_batching():
+    module = BatchNimModule()
+    batcher = NimBatcher(module, max_batch=100, max_delay=0.01)
+    env = LivingEnvironment()
+    agents = [HybridAgent(f"Agent{i}", env, "Prompt", nim_batcher=batcher) for i in range(50)]
+
+    results = await asyncio.gather(*(a.execute_nim_logic(f"data from {a.name}") for a in agents))
+    assert module.batch_calls == [50]
+    assert bytes(results[7]) == b"DATA FROM AGENT7"
+    # Results are views into the one output buffer, not copies
+    assert isinstance(results[7], memoryview) and results[7].obj is results[8].obj
+
+    # A full batch flushes without waiting for the timer
+    batcher.max_batch, batcher.max_delay = 10, 60.0
+    await asyncio.wait_for(asyncio.gather(*(batcher.submit(b"x") for _ in range(10))), 1.0)
+    report = agents[0].usage()["nim"]
+    assert report["batches"] == 2 and report["items"] == 60 and report["native_calls"] == 2
+
+    # Modules without process_batch still get one off-loop hop per batch
+    fallback = NimBatcher(BufferNimModule(), max_delay=0.01)
+    assert await asyncio.gather(fallback.submit("abc"), fallback.submit("hello")) == [3, 5]
+    assert fallback.module.calls == ["abc", "hello"] and fallback.stats["batches"] == 1
+    # One failing item fails only its own caller
+    results = await asyncio.gather(fallback.submit("ok"), fallback.submit("bad"), fallback.submit("fine"),
+                                   return_exceptions=True)
+    assert results[0] == 2 and isinstance(results[1], ValueError) and results[2] == 4
+    assert fallback.stats["batches"] == 2
+    # Crossing is measured on the native thread, not the event loop
+    threads = set()
+    fallback.module.process_buffer = lambda data: threads.add(threading.current_thread().name)
+    assert (await fallback.measure_crossing(samples=10))["per_call_us"] > 0
+    assert len(threads) == 1 and threads.pop().startswith("nim")
+
+    # A native failure reaches every caller; agents log it and carry on
+    module.process_batch = lambda buffer, offsets: (b"", [0])
+    batcher.max_delay = 0.01
+    assert await agents[0].execute_nim_logic("boom") is None
+    batcher.shutdown()
+    fallback.shutdown()
+
+    print("Nim batching test passed!")
+
+class EchoAgent:
+    """Acknowledges prompt updates and records probe values in the order its shard applied them."""
+
+    def __init__(self, name, env, initial_prompt):
+        self.name = name
+        self.env = env
+        self.probes = []
+        self.stopped = asyncio.Event()
+        env.subscribe(self.on_env_update, keys=[f"prompt_update_{name}", "probe"])
+
+    async def on_env_update(self, key, value):
+        if key == "probe":
+            self.probes.append(value)
+        else:
+            # Writing from inside a callback must not stall the replica
+            await self.env.update_state(f"status_{self.name}", f"ack {value}")
+
+    async def run(self):
+        await self.stopped.wait()
+
+    def stop(self):
+        self.stopped.set()
+
+    def usage(self):
+        return {"pid": os.getpid(), "probes": self.probes, "version": self.env.version,
+                "seed": self.env.get_state("seed"),
+                "statuses": sorted(k for k in self.env.state if k.startswith("status_"))}
+
+async def test_sharded_environment():
+    host = ShardedHostAgent(num_shards=2)
+    names = [f"Agent{i}" for i in range(4)]
+    for name in names:
+        host.register_agent(AgentSpec(name, "Prompt", factory=EchoAgent))
+    assert [[spec.name for spec in group] for group in host.assignments()] == [["Agent0", "Agent2"], ["Agent1", "Agent3"]]
+
+    await host.env.update_state("seed", "written before start")
+    await host.start(timeout=10)
+    try:
+        await host.env.update_many({f"prompt_update_{name}": "cycle 0" for name in names})
+        for i in range(100):
+            await host.env.update_state("probe", i)
+        for _ in range(200):
+            if all(host.env.get_state(f"status_{name}") == "ack cycle 0" for name in names):
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await host.stop_agents(timeout=10)
+
+    usage = host.agent_usage
+    assert set(usage) == set(names)
+    pids = {u["pid"] for u in usage.values()}
+    assert len(pids) == 2 and os.getpid() not in pids
+    for u in usage.values():
+        # Every replica applied the same batches in the same order
+        assert u["probes"] == list(range(100))
+        assert u["version"] == host.env.version
+        assert u["seed"] == "written before start"
+        assert u["statuses"] == [f"status_{name}" for name in names]
+    assert not host.processes and not os.path.exists(host.env.socket_path)
+
+    print("Sharded environment test passed!")
+
+async def test_persistent_environment():
+    with tempfile.TemporaryDirectory() as directory:
+        env = LivingEnvironment(store=EnvironmentStore(directory, snapshot_every=5))
+        for i in range(6):
+            await env.update_state(f"status_Agent{i % 3}", f"status {i}")
+        await env.update_many({"prompt_update_Agent1": "persisted prompt", "code_update_Agent1": "int f();"})
+        # Six records reached snapshot_every once; records are batched per fsync interval
+        await asyncio.sleep(0.1)
+        assert env.store.stats["snapshots"] == 1 and env.store.stats["writes"] == 1
+        await env.close()
+        assert env.store.stats["snapshots"] == 2
+
+        restarted = LivingEnvironment(store=EnvironmentStore(directory))
+        assert restarted.state == env.state and restarted.version == env.version == 7
+        assert restarted.key_versions == env.key_versions
+        assert restarted.store.stats["replayed"] == 0
+        assert restarted.changed_keys_since(5) == env.changed_keys_since(5)
+        assert set(restarted.changed_keys_since(5)) == {"prompt_update_Agent1", "code_update_Agent1", "status_Agent2"}
+        # Agents pick up the prompt they had before the restart
+        assert HybridAgent("Agent1", restarted, "initial prompt").prompt == "persisted prompt"
+
+        # Without a clean close, "always" has every record on disk; a torn tail is dropped
+        restarted.store.fsync = "always"
+        await restarted.update_state("status_Agent0", "after restart")
+        await restarted.update_state("status_Agent1", "after restart")
+        with open(restarted.store.log_path, "ab") as f:
+            f.write(b'{"v": 10, "c": {"status_Agent2": "half wri')
+        crashed = LivingEnvironment(store=EnvironmentStore(directory))
+        assert crashed.version == 9 and crashed.store.stats["replayed"] == 2 and crashed.store.stats["torn"] == 1
+        assert crashed.get_state("status_Agent1") == "after restart"
+        assert crashed.get_state("status_Agent2") == env.get_state("status_Agent2")
+        # The torn bytes were cut off, so new records append cleanly
+        await crashed.update_state("status_Agent2", "recovered")
+        await crashed.close()
+        assert LivingEnvironment(store=EnvironmentStore(directory)).get_state("status_Agent2") == "recovered"
+
+    print("Persistent environment test passed!")
+
+async def test_event_driven_wakeups():
+    import time
+    env = LivingEnvironment()
+    agent = HybridAgent("Agent1", env, "Prompt", debounce=0.02, max_idle=0.3)
+    calls = []
+
+    async def fake_llm(prompt):
+        calls.append((time.perf_counter(), prompt))
+        return "ok"
+
+    agent.invoke_llm = fake_llm
+    agent.parse_cpp_code = AsyncMock(return_value=[])
+    agent.execute_nim_logic = AsyncMock()
+    task = asyncio.create_task(agent.run())
+    await asyncio.sleep(0.05)
+    assert len(calls) == 1
+
+    # Nothing changed: the idle check makes no LLM call
+    await asyncio.sleep(0.35)
+    assert len(calls) == 1 and agent.wake_stats["idle_skips"] == 1
+
+    # A burst of updates is one iteration, started within the debounce window
+    sent = time.perf_counter()
+    for i in range(10):
+        await env.update_state("prompt_update_Agent1", f"Prompt v{i}")
+    await asyncio.sleep(0.1)
+    assert len(calls) == 2 and "Prompt v9" in calls[1][1] and "Prompt v8" not in calls[1][1]
+    assert calls[1][0] - sent < 0.1
+    assert agent.wake_stats["wakeups"] == 1 and agent.wake_stats["updates"] == 10
+
+    # Keys in the view but not subscribed are picked up by the idle check
+    await env.update_state("status_Agent2", "done")
+    await asyncio.sleep(0.35)
+    assert len(calls) == 3 and "status_Agent2: done" in calls[2][1]
+
+    # stop() wakes the agent instead of waiting out max_idle
+    stopped = time.perf_counter()
+    agent.stop()
+    await asyncio.wait_for(task, 0.2)
+    assert time.perf_counter() - stopped < 0.1 and len(calls) == 3
+    assert agent.usage()["wakeups"]["idle_checks"] == 2
+
+    print("Event-driven wake-up test passed!")
+
 if __name__ == "__main__":
     asyncio.run(test_actual_update_loop_logic())
+    asyncio.run(test_subscription_routing())
+    asyncio.run(test_batched_updates())
+    asyncio.run(test_versioned_deltas())
+    asyncio.run(test_bounded_summary_memory())
+    asyncio.run(test_llm_calls_run_off_the_event_loop())
+    asyncio.run(test_cpp_parse_cache())
+    asyncio.run(test_nim_batching())
+    asyncio.run(test_sharded_environment())
+    asyncio.run(test_persistent_environment())
+    asyncio.run(test_event_driven_wakeups())
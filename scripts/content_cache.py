@@ -0,0 +1,109 @@
+import threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+@dataclass
+class CachedContent:
+    path: str
+    sha: str
+    decoded_content: bytes
+    etag: Optional[str] = None
+    source: Any = None  # ContentFile used for conditional revalidation
+    written_at: float = 0.0
+
+class ContentCache:
+    """LRU cache of repository files keyed by (repo, path, ref).
+
+    Entries read from GitHub are revalidated with If-None-Match, so an unchanged
+    file costs a 304 that does not count against the rate limit. Entries from our
+    own writes have no ETag yet and are trusted for write_ttl seconds.
+    Methods block on the network and are meant to run on the GitHub worker pool.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, write_ttl=60.0):
+        self.max_bytes = max_bytes
+        self.write_ttl = write_ttl
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(repo, path, ref):
+        # A read or write without a ref is on the default branch; key it that way so
+        # it shares the entry with callers that name the branch explicitly
+        return (repo.full_name, path, ref or repo.default_branch)
+
+    def _store(self, key, entry):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old.decoded_content)
+            self.entries[key] = entry
+            self.total_bytes += len(entry.decoded_content)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted.decoded_content)
+                self.evictions += 1
+        return entry
+
+    def _from_file(self, path, file):
+        return CachedContent(path, file.sha, file.decoded_content, etag=file.etag, source=file)
+
+    def get(self, repo, path, ref=None):
+        """Return the file, revalidating a cached copy instead of refetching it."""
+        key = self._key(repo, path, ref)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        if entry is not None:
+            if entry.source is None and time.time() - entry.written_at < self.write_ttl:
+                with self.lock:
+                    self.hits += 1
+                return entry
+            if entry.source is not None and entry.etag:
+                if not entry.source.update():
+                    with self.lock:
+                        self.hits += 1
+                        self.not_modified += 1
+                    return entry
+                with self.lock:
+                    self.misses += 1
+                return self._store(key, self._from_file(path, entry.source))
+
+        file = repo.get_contents(path, ref=ref) if ref else repo.get_contents(path)
+        with self.lock:
+            self.misses += 1
+        return self._store(key, self._from_file(path, file))
+
+    def put(self, repo, path, ref, content, sha):
+        """Record content we just wrote so the next read does not hit the API."""
+        if isinstance(content, str):
+            content = content.encode()
+        return self._store(self._key(repo, path, ref), CachedContent(path, sha, content, written_at=time.time()))
+
+    def invalidate(self, repo, path, ref=None):
+        with self.lock:
+            entry = self.entries.pop(self._key(repo, path, ref), None)
+            if entry is not None:
+                self.total_bytes -= len(entry.decoded_content)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
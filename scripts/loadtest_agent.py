@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Load test for the QuantumAgent HTTP server.
+
+    python loadtest_agent.py --local                     # in-process server with a stand-in agent
+    python loadtest_agent.py --local --scheduler         # same, routed through the lane scheduler
+    python loadtest_agent.py --url http://127.0.0.1:8765 --requests 2000 --concurrency 64
+
+Reports throughput, latency percentiles and the status-code mix, then the server's /metrics.
+"""
+import argparse, asyncio, json, random, time
+import aiohttp
+from aiohttp import web
+
+from scheduler import ActionScheduler
+from server import AgentServer
+
+# Rough service times for the stand-in agent, in seconds
+STAND_IN_LATENCY = {
+    "check_integration": 0.001,
+    "cache_stats": 0.001,
+    "run_shell": 0.05,
+    "refactor_file": 0.5,
+    "generate_file": 0.4,
+}
+
+DEFAULT_MIX = {"check_integration": 0.5, "run_shell": 0.2, "refactor_file": 0.15, "generate_file": 0.15}
+
+# Response bodies of QuantumAgent.handle_request, keyed by action
+STAND_IN_RESPONSES = {
+    "check_integration": lambda params, duration: {"status": "ok", "integration_check": {}},
+    "cache_stats": lambda params, duration: {"status": "ok", "content_cache": {}},
+    "run_shell": lambda params, duration: {"status": "ok", "output": f"$ {params['command']}\n", "exit_code": 0,
+                                           "duration": duration, "truncated": False, "timed_out": False},
+    "refactor_file": lambda params, duration: {"status": "ok", "msg": "File refactored"},
+    "generate_file": lambda params, duration: {"status": "ok", "msg": "File generated"},
+}
+
+class StandInAgent:
+    """Sleeps for a per-action service time so the server can be tested without GitHub or an LLM.
+
+    Responses and errors have the same shape as QuantumAgent's, including a
+    REQUEST_FAILED error when a required param is missing.
+    """
+
+    def __init__(self, latency=None, jitter=0.2):
+        self.latency = dict(STAND_IN_LATENCY, **(latency or {}))
+        self.jitter = jitter
+
+    async def handle_request(self, req):
+        action = req.get("action")
+        params = req.get("params", {})
+        respond = STAND_IN_RESPONSES.get(action)
+        if respond is None:
+            return {"status": "error", "msg": "Unknown action", "error_code": "UNKNOWN_ACTION"}
+        duration = self.latency.get(action, 0.01) * random.uniform(1 - self.jitter, 1 + self.jitter)
+        await asyncio.sleep(duration)
+        try:
+            return respond(params, duration)
+        except Exception as e:
+            return {"status": "error", "msg": f"Request handling failed: {str(e)}", "error_code": "REQUEST_FAILED"}
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def run_load(url, total, concurrency, mix):
+    actions, weights = zip(*mix.items())
+    latencies, statuses, agent_errors = [], {}, {}
+    params = {"repo": "octo/demo", "instructions": "tidy", "description": "load test module", "command": "true"}
+    counter = iter(range(total))
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async def worker():
+            for i in counter:
+                action = random.choices(actions, weights)[0]
+                start = time.perf_counter()
+                async with session.post(f"{url}/agent", json={"action": action, "params": dict(params, path=f"f{i}.py")},
+                                        headers={"X-Request-ID": f"load-{i}"}) as resp:
+                    body = await resp.read()
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                    if resp.status == 200:
+                        latencies.append(time.perf_counter() - start)
+                        # The agent reports its own failures inside a 200
+                        result = json.loads(body)
+                        if result.get("status") != "ok":
+                            code = f"{action}:{result.get('error_code', 'UNKNOWN')}"
+                            agent_errors[code] = agent_errors.get(code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        async with session.get(f"{url}/metrics") as resp:
+            metrics = await resp.json()
+
+    return {
+        "requests": total,
+        "elapsed": elapsed,
+        "throughput": total / elapsed,
+        "statuses": statuses,
+        "agent_errors": agent_errors,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "server": metrics,
+    }
+
+async def main_async(args):
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    if not args.local:
+        return await run_load(args.url.rstrip("/"), args.requests, args.concurrency, mix)
+
+    agent = StandInAgent()
+    scheduler = ActionScheduler(agent, lanes=json.loads(args.lanes) if args.lanes else None) if args.scheduler else None
+    server = AgentServer(agent, max_concurrency=args.max_concurrency, max_queue=args.max_queue, scheduler=scheduler)
+    runner = web.AppRunner(server.app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        return await run_load(f"http://127.0.0.1:{port}", args.requests, args.concurrency, mix)
+    finally:
+        await runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the QuantumAgent HTTP server")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--local", action="store_true", help="Start an in-process server with a stand-in agent")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--max-concurrency", type=int, default=32, help="Server slots (--local only)")
+    parser.add_argument("--max-queue", type=int, default=256, help="Server queue bound (--local only)")
+    parser.add_argument("--scheduler", action="store_true", help="Route through ActionScheduler lanes (--local only)")
+    parser.add_argument("--lanes", help="JSON lane concurrency for --scheduler")
+    parser.add_argument("--mix", help='JSON action weights, e.g. \'{"run_shell": 1}\'')
+    parser.add_argument("--json", action="store_true", help="Print the raw result as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"🚀 {result['requests']} requests in {result['elapsed']:.2f}s ({result['throughput']:.1f} req/s)")
+    print(f"   status codes: {result['statuses']}")
+    if result["agent_errors"]:
+        print(f"   agent errors: {result['agent_errors']}")
+    print(f"   latency p50={result['p50'] * 1000:.1f}ms p95={result['p95'] * 1000:.1f}ms p99={result['p99'] * 1000:.1f}ms")
+    print(f"   server: {result['server']['requests']}")
+    for lane, stats in result["server"].get("lanes", {}).items():
+        wait, service = stats["wait_seconds"], stats["service_seconds"]
+        if service["count"]:
+            print(f"   lane {lane}: {service['count']} served, mean wait {wait['sum'] / wait['count'] * 1000:.1f}ms, "
+                  f"mean service {service['sum'] / service['count'] * 1000:.1f}ms, {stats['coalesced']} coalesced")
+
+if __name__ == "__main__":
+    main()
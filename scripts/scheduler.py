@@ -0,0 +1,180 @@
+"""
+Lane scheduler for QuantumAgent actions.
+
+Each action maps to a lane with its own worker pool, so cheap interactive
+checks never queue behind multi-minute LLM jobs. Within a lane, requests are
+served by priority and then arrival order. Identical requests that are still
+queued are coalesced into one execution.
+"""
+import asyncio, bisect, itertools, json, time
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+DEFAULT_LANES = {"interactive": 8, "shell": 4, "llm": 4}
+
+DEFAULT_ACTION_LANES = {
+    "check_integration": "interactive",
+    "cache_stats": "interactive",
+    "run_shell": "shell",
+    "refactor_file": "llm",
+    "generate_file": "llm",
+    "commit_files": "llm",
+}
+
+class InvalidPriority(ValueError):
+    """A request priority that is neither a known name nor an integer."""
+
+class LatencyHistogram:
+    """Cumulative latency histogram in the Prometheus bucket layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def to_dict(self):
+        cumulative, total = {}, 0
+        for bound, n in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += n
+            cumulative[str(bound)] = total
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+@dataclass
+class Job:
+    req: Dict[str, Any]
+    key: str
+    future: asyncio.Future
+    enqueued_at: float
+    priority: int
+    started: bool = False
+
+@dataclass
+class Lane:
+    name: str
+    concurrency: int
+    queue: asyncio.PriorityQueue = field(default_factory=asyncio.PriorityQueue)
+    workers: list = field(default_factory=list)
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    coalesced: int = 0
+    wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    service: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+class ActionScheduler:
+    def __init__(self, agent, lanes=None, action_lanes=None, default_lane="interactive"):
+        self.agent = agent
+        self.lanes = {name: Lane(name, n) for name, n in dict(DEFAULT_LANES, **(lanes or {})).items()}
+        self.action_lanes = dict(DEFAULT_ACTION_LANES, **(action_lanes or {}))
+        self.default_lane = default_lane
+        self.pending: Dict[str, Job] = {}
+        self._seq = itertools.count()
+
+    def lane_for(self, action) -> Lane:
+        return self.lanes[self.action_lanes.get(action, self.default_lane)]
+
+    @staticmethod
+    def parse_priority(value) -> int:
+        if value is None:
+            return PRIORITIES["normal"]
+        if isinstance(value, str) and value in PRIORITIES:
+            return PRIORITIES[value]
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        raise InvalidPriority(f"Invalid priority {value!r}: expected one of {', '.join(PRIORITIES)} or an integer")
+
+    def queued(self) -> int:
+        return sum(lane.queued for lane in self.lanes.values())
+
+    async def submit(self, req, priority=None):
+        """Queue req on its lane and wait for the agent's response.
+
+        priority comes from the argument or req["priority"] ("high", "normal",
+        "low" or an int, lower first). A request identical to one that is still
+        queued shares its result; a higher priority moves the shared job forward.
+        """
+        priority = self.parse_priority(priority if priority is not None else req.get("priority"))
+        lane = self.lane_for(req.get("action"))
+        if not lane.workers:
+            lane.workers = [asyncio.create_task(self._worker(lane)) for _ in range(lane.concurrency)]
+
+        key = json.dumps({k: v for k, v in req.items() if k != "priority"}, sort_keys=True, default=str)
+        job = self.pending.get(key)
+        if job is not None:
+            lane.coalesced += 1
+            if priority < job.priority:
+                # The old heap entry is skipped once the job has started
+                job.priority = priority
+                lane.queue.put_nowait((priority, next(self._seq), job))
+        else:
+            job = Job(req, key, asyncio.get_running_loop().create_future(), time.perf_counter(), priority)
+            self.pending[key] = job
+            lane.queued += 1
+            lane.queue.put_nowait((priority, next(self._seq), job))
+        # One caller giving up must not cancel the job for the others
+        return await asyncio.shield(job.future)
+
+    async def _worker(self, lane):
+        while True:
+            _, _, job = await lane.queue.get()
+            if job.started:
+                continue
+            job.started = True
+            self.pending.pop(job.key, None)
+            lane.queued -= 1
+            lane.running += 1
+            started = time.perf_counter()
+            lane.wait.observe(started - job.enqueued_at)
+            try:
+                result = await self.agent.handle_request(job.req)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                lane.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                lane.completed += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                lane.running -= 1
+                lane.service.observe(time.perf_counter() - started)
+
+    def stats(self):
+        return {
+            lane.name: {
+                "concurrency": lane.concurrency,
+                "queued": lane.queued,
+                "running": lane.running,
+                "completed": lane.completed,
+                "failed": lane.failed,
+                "coalesced": lane.coalesced,
+                "wait_seconds": lane.wait.to_dict(),
+                "service_seconds": lane.service.to_dict(),
+            }
+            for lane in self.lanes.values()
+        }
+
+    async def close(self):
+        """Stop the lane workers; jobs still queued are cancelled."""
+        for lane in self.lanes.values():
+            for worker in lane.workers:
+                worker.cancel()
+            await asyncio.gather(*lane.workers, return_exceptions=True)
+            lane.workers = []
+        for job in self.pending.values():
+            job.future.cancel()
+        self.pending.clear()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+QuantumAgent HTTP/JSON front end.
+POST /agent {"action": ..., "params": {...}} dispatches to QuantumAgent.handle_request,
+either directly or through an ActionScheduler's lanes.
+Bounded admission queue (429 when full), per-action concurrency limits,
+X-Request-ID propagation, graceful drain on shutdown and GET /metrics.
+"""
+import argparse, asyncio, contextlib, json, logging, time, uuid
+from aiohttp import web
+
+from scheduler import ActionScheduler, InvalidPriority, LatencyHistogram
+
+logger = logging.getLogger("QuantumAIIDE-Server")
+
+# LLM-backed actions hold upstream capacity for a long time; cheap checks are unlimited
+DEFAULT_ACTION_LIMITS = {
+    "refactor_file": 4,
+    "generate_file": 4,
+    "commit_files": 2,
+    "run_shell": 4,
+}
+
+_NO_LIMIT = contextlib.nullcontext()
+
+class AgentServer:
+    def __init__(self, agent, max_concurrency=32, max_queue=256, action_limits=None, drain_timeout=30.0,
+                 scheduler=None):
+        self.agent = agent
+        self.scheduler = scheduler
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        if scheduler is None:
+            self.dispatch = agent.handle_request
+            self.action_limits = dict(DEFAULT_ACTION_LIMITS if action_limits is None else action_limits)
+            self.slots = asyncio.Semaphore(max_concurrency)
+        else:
+            # Lanes bound concurrency; global slots would reintroduce head-of-line blocking
+            self.dispatch = scheduler.submit
+            self.action_limits = dict(action_limits or {})
+            self.slots = _NO_LIMIT
+        self.action_slots = {a: asyncio.Semaphore(n) for a, n in self.action_limits.items()}
+        self.queued = 0
+        self.in_flight = 0
+        self.draining = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.started_at = time.time()
+        self.counters = {"accepted": 0, "rejected_busy": 0, "rejected_draining": 0, "bad_request": 0}
+        self.latency = {}
+        self.queue_wait = LatencyHistogram()
+        self.statuses = {}
+
+        self.app = web.Application(middlewares=[self.request_id_middleware])
+        self.app.router.add_post("/agent", self.handle_agent)
+        self.app.router.add_get("/health", self.handle_health)
+        self.app.router.add_get("/metrics", self.handle_metrics)
+        self.app.on_shutdown.append(self.drain)
+        self.app.on_cleanup.append(self.close_agent)
+
+    @web.middleware
+    async def request_id_middleware(self, request, handler):
+        request["request_id"] = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        response = await handler(request)
+        response.headers["X-Request-ID"] = request["request_id"]
+        return response
+
+    def _reply(self, request, status, body, headers=None):
+        body = dict(body, request_id=request["request_id"])
+        return web.json_response(body, status=status, headers=headers)
+
+    async def handle_agent(self, request):
+        if self.draining:
+            self.counters["rejected_draining"] += 1
+            return self._reply(request, 503, {"status": "error", "msg": "Server is draining", "error_code": "DRAINING"})
+        # Requests waiting for a slot or a lane worker count against the queue bound
+        if self.queued + (self.scheduler.queued() if self.scheduler else 0) >= self.max_queue:
+            self.counters["rejected_busy"] += 1
+            return self._reply(request, 429, {"status": "error", "msg": "Request queue full", "error_code": "BUSY"},
+                               headers={"Retry-After": "1"})
+        # Reserve the queue slot before the first await so concurrent arrivals see it
+        self.queued += 1
+        self.idle.clear()
+        arrived = time.perf_counter()
+        waiting, failed = True, False
+        try:
+            try:
+                req = await request.json()
+                action = req["action"]
+                if self.scheduler:
+                    self.scheduler.parse_priority(req.get("priority"))
+            except InvalidPriority as e:
+                self.counters["bad_request"] += 1
+                return self._reply(request, 400, {"status": "error", "msg": str(e), "error_code": "BAD_REQUEST"})
+            except (ValueError, KeyError, TypeError):
+                self.counters["bad_request"] += 1
+                return self._reply(request, 400, {"status": "error", "msg": "Expected JSON with an action", "error_code": "BAD_REQUEST"})
+
+            self.counters["accepted"] += 1
+            action_slot = self.action_slots.get(action)
+            # Take the per-action slot first so a saturated action cannot hog the global slots
+            async with (action_slot or _NO_LIMIT), self.slots:
+                self.queued -= 1
+                waiting = False
+                self.in_flight += 1
+                started = time.perf_counter()
+                self.queue_wait.observe(started - arrived)
+                try:
+                    result = await self.dispatch(req)
+                except Exception as e:
+                    logger.exception(f"[{request['request_id']}] {action} failed")
+                    result, failed = {"status": "error", "msg": str(e), "error_code": "INTERNAL_ERROR"}, True
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if waiting:
+                self.queued -= 1
+            if self.queued + self.in_flight == 0:
+                self.idle.set()
+
+        elapsed = time.perf_counter() - started
+        self.latency.setdefault(action, LatencyHistogram()).observe(elapsed)
+        status = result.get("status", "unknown") if isinstance(result, dict) else "unknown"
+        self.statuses[(action, status)] = self.statuses.get((action, status), 0) + 1
+        logger.info(f"[{request['request_id']}] {action} -> {status} in {elapsed:.3f}s")
+        return self._reply(request, 500 if failed else 200, result if isinstance(result, dict) else {"status": "ok", "result": result})
+
+    async def handle_health(self, request):
+        return self._reply(request, 503 if self.draining else 200,
+                           {"status": "draining" if self.draining else "ok", "in_flight": self.in_flight, "queued": self.queued})
+
+    def metrics(self):
+        return {
+            "uptime": time.time() - self.started_at,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "draining": self.draining,
+            "requests": dict(self.counters),
+            "responses": {f"{a}:{s}": n for (a, s), n in self.statuses.items()},
+            "queue_wait_seconds": self.queue_wait.to_dict(),
+            "latency_seconds": {action: h.to_dict() for action, h in self.latency.items()},
+            "lanes": self.scheduler.stats() if self.scheduler else {},
+        }
+
+    async def handle_metrics(self, request):
+        if request.query.get("format") != "prometheus":
+            return self._reply(request, 200, self.metrics())
+        lines = [f"agent_in_flight {self.in_flight}", f"agent_queued {self.queued}"]
+        lines += [f'agent_requests_total{{outcome="{k}"}} {v}' for k, v in self.counters.items()]
+        for action, hist in self.latency.items():
+            for bound, n in hist.to_dict()["buckets"].items():
+                lines.append(f'agent_request_seconds_bucket{{action="{action}",le="{bound}"}} {n}')
+            lines.append(f'agent_request_seconds_sum{{action="{action}"}} {hist.sum}')
+            lines.append(f'agent_request_seconds_count{{action="{action}"}} {hist.count}')
+        for lane, stats in (self.scheduler.stats() if self.scheduler else {}).items():
+            lines.append(f'agent_lane_queued{{lane="{lane}"}} {stats["queued"]}')
+            for kind in ("wait", "service"):
+                hist = stats[f"{kind}_seconds"]
+                lines.append(f'agent_lane_{kind}_seconds_sum{{lane="{lane}"}} {hist["sum"]}')
+                lines.append(f'agent_lane_{kind}_seconds_count{{lane="{lane}"}} {hist["count"]}')
+        return web.Response(text="\n".join(lines) + "\n", content_type="text/plain")
+
+    async def drain(self, app=None):
+        """Stop admitting requests and wait for queued and in-flight ones to finish."""
+        self.draining = True
+        logger.info(f"Draining {self.queued + self.in_flight} requests")
+        try:
+            await asyncio.wait_for(self.idle.wait(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timed out with {self.queued + self.in_flight} requests outstanding")
+
+    async def close_agent(self, app=None):
+        if self.scheduler:
+            await self.scheduler.close()
+        close = getattr(self.agent, "close", None)
+        if close:
+            await close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve QuantumAgent over HTTP/JSON")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--lanes", help='JSON lane concurrency, e.g. \'{"llm": 2, "interactive": 16}\'')
+    parser.add_argument("--no-scheduler", action="store_true", help="Dispatch directly with per-action limits")
+    args = parser.parse_args()
+
+    from agent import QuantumAgent
+    agent = QuantumAgent()
+    scheduler = None if args.no_scheduler else ActionScheduler(agent, lanes=json.loads(args.lanes) if args.lanes else None)
+    server = AgentServer(agent, max_concurrency=args.max_concurrency, max_queue=args.max_queue,
+                         drain_timeout=args.drain_timeout, scheduler=scheduler)
+    web.run_app(server.app, host=args.host, port=args.port, shutdown_timeout=args.drain_timeout)
+
+if __name__ == "__main__":
+    main()
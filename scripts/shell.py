@@ -1,7 +1,122 @@
-import subprocess
+import asyncio, codecs, inspect, os, signal, subprocess, time
+from dataclasses import dataclass
+from typing import Optional
+
 def run_shell_command(cmd):
     try:
         result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=120)
         return result.stdout if result.returncode == 0 else result.stderr
     except Exception as e:
-        return f"Shell error: {e}"
\ No newline at end of file
+        return f"Shell error: {e}"
+
+@dataclass
+class ShellResult:
+    exit_code: Optional[int]
+    output: str
+    duration: float
+    total_bytes: int
+    truncated: bool = False
+    timed_out: bool = False
+
+class HeadTailBuffer:
+    """Keep the first head_bytes and the last tail_bytes of a stream, dropping the middle."""
+
+    def __init__(self, head_bytes=64 * 1024, tail_bytes=64 * 1024):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_bytes:
+                del self.tail[:len(self.tail) - self.tail_bytes]
+
+    @property
+    def dropped(self):
+        return self.total - len(self.head) - len(self.tail)
+
+    def getvalue(self):
+        text = self.head.decode(errors="replace")
+        if self.dropped:
+            text += f"\n... [{self.dropped} bytes truncated] ...\n"
+        return text + self.tail.decode(errors="replace")
+
+class ShellRunner:
+    """Run shell commands asynchronously, streaming combined stdout/stderr to the caller.
+
+    At most max_concurrent commands run at once. Output kept for the result is
+    capped at head_bytes + tail_bytes. Cancelling the awaiting task or hitting the
+    timeout kills the whole process group.
+    """
+
+    def __init__(self, max_concurrent=4, head_bytes=64 * 1024, tail_bytes=64 * 1024, timeout=120):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.timeout = timeout
+
+    @staticmethod
+    def _kill(proc):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def run(self, cmd, on_output=None, timeout=None):
+        """on_output (sync or async) receives each decoded chunk as it is produced."""
+        async with self.semaphore:
+            start = time.time()
+            buffer = HeadTailBuffer(self.head_bytes, self.tail_bytes)
+            proc = await asyncio.create_subprocess_shell(
+                cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, start_new_session=True
+            )
+
+            # Holds back a multi-byte character split across two reads until it is complete
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+            async def emit(text):
+                if text:
+                    ret = on_output(text)
+                    if inspect.isawaitable(ret):
+                        await ret
+
+            async def pump():
+                while True:
+                    chunk = await proc.stdout.read(64 * 1024)
+                    if not chunk:
+                        break
+                    buffer.write(chunk)
+                    if on_output:
+                        await emit(decoder.decode(chunk))
+                if on_output:
+                    await emit(decoder.decode(b"", final=True))
+                return await proc.wait()
+
+            timed_out = False
+            try:
+                exit_code = await asyncio.wait_for(pump(), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                self._kill(proc)
+                exit_code = await proc.wait()
+                timed_out = True
+            except asyncio.CancelledError:
+                self._kill(proc)
+                await proc.wait()
+                raise
+
+            return ShellResult(
+                exit_code=exit_code,
+                output=buffer.getvalue(),
+                duration=time.time() - start,
+                total_bytes=buffer.total,
+                truncated=buffer.dropped > 0,
+                timed_out=timed_out,
+            )
@@ -0,0 +1,432 @@
+import asyncio
+import base64
+import hashlib
+import os
+import sys
+import time
+from collections import Counter
+from unittest.mock import AsyncMock, patch
+
+from aiohttp import web
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+for token in ("GITHUB_TOKEN", "HUGGINGFACE_TOKEN", "AGENT_API_KEY", "SESSION_SECRET"):
+    os.environ.setdefault(token, f"test-{token.lower()}")
+
+import agent
+from agent import QuantumAgent
+
+AI_ENDPOINTS = {"ai_backend": {"auth_method": "bearer_token", "token_source": "huggingface"}}
+
+class StandInGitHub:
+    """Local stand-in for the GitHub contents and Git Data REST APIs with a fixed per-request latency."""
+
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.heads = {}
+        self.calls = Counter()
+        self.before_ref_update = None
+        self.runner = None
+        self.url = ""
+        self.heads["main"] = self._commit({}, [], "initial")
+
+    @staticmethod
+    def _sha(*parts):
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def _blob(self, data: bytes):
+        sha = hashlib.sha1(data).hexdigest()
+        self.blobs[sha] = data
+        return sha
+
+    def _tree(self, entries):
+        sha = self._sha(sorted(entries.items()))
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def _commit(self, entries, parents, message):
+        tree = self._tree(entries)
+        sha = self._sha(tree, parents, message, len(self.commits))
+        self.commits[sha] = {"tree": tree, "parents": parents, "message": message}
+        return sha
+
+    @property
+    def files(self):
+        """Path -> content on the main branch."""
+        tree = self.trees[self.commits[self.heads["main"]]["tree"]]
+        return {path: self.blobs[sha] for path, sha in tree.items()}
+
+    def write(self, path, data: bytes, message="external change"):
+        head = self.heads["main"]
+        entries = dict(self.trees[self.commits[head]["tree"]])
+        entries[path] = self._blob(data)
+        self.heads["main"] = self._commit(entries, [head], message)
+
+    def _repo_url(self, request):
+        return f"{self.url}/repos/{request.match_info['owner']}/{request.match_info['repo']}"
+
+    def _commit_json(self, base, sha):
+        commit = self.commits[sha]
+        return {
+            "sha": sha, "url": f"{base}/git/commits/{sha}", "message": commit["message"],
+            "tree": {"sha": commit["tree"], "url": f"{base}/git/trees/{commit['tree']}"},
+            "parents": [{"sha": p, "url": f"{base}/git/commits/{p}"} for p in commit["parents"]],
+        }
+
+    def _ref_json(self, base, branch):
+        sha = self.heads[branch]
+        return {"ref": f"refs/heads/{branch}", "url": f"{base}/git/refs/heads/{branch}",
+                "object": {"sha": sha, "type": "commit", "url": f"{base}/git/commits/{sha}"}}
+
+    def _content_json(self, base, path, data):
+        return {
+            "type": "file", "encoding": "base64", "name": os.path.basename(path), "path": path,
+            "content": base64.b64encode(data).decode(), "size": len(data),
+            "sha": hashlib.sha1(data).hexdigest(), "url": f"{base}/contents/{path}",
+        }
+
+    async def handle(self, name, request):
+        self.calls[name] += 1
+        await asyncio.sleep(self.latency)
+        base = self._repo_url(request)
+        m = request.match_info
+
+        if name == "get_repo":
+            return web.json_response({
+                "id": 1, "name": m["repo"], "full_name": f"{m['owner']}/{m['repo']}", "url": base,
+                "owner": {"login": m["owner"]}, "default_branch": "main",
+            })
+        if name == "get_contents":
+            ref = request.query.get("ref", "main")
+            commit = self.commits[self.heads.get(ref, ref)]
+            blob = self.trees[commit["tree"]].get(m["path"])
+            if blob is None:
+                return web.json_response({"message": "Not Found"}, status=404)
+            etag = f'W/"{blob}"'
+            if request.headers.get("If-None-Match") == etag:
+                self.calls["not_modified"] += 1
+                return web.Response(status=304, headers={"ETag": etag})
+            body = self._content_json(base, m["path"], self.blobs[blob])
+            body["url"] += f"?ref={ref}"
+            return web.json_response(body, headers={"ETag": etag})
+        if name == "put_contents":
+            body = await request.json()
+            self.write(m["path"], base64.b64decode(body["content"]), body["message"])
+            return web.json_response({
+                "content": self._content_json(base, m["path"], self.files[m["path"]]),
+                "commit": self._commit_json(base, self.heads["main"]),
+            }, status=200 if "sha" in body else 201)
+        if name == "create_blob":
+            body = await request.json()
+            sha = self._blob(body["content"].encode())
+            return web.json_response({"sha": sha, "url": f"{base}/git/blobs/{sha}"}, status=201)
+        if name == "create_tree":
+            body = await request.json()
+            entries = dict(self.trees[body["base_tree"]]) if "base_tree" in body else {}
+            entries.update({e["path"]: e["sha"] for e in body["tree"]})
+            sha = self._tree(entries)
+            return web.json_response({"sha": sha, "url": f"{base}/git/trees/{sha}", "tree": []}, status=201)
+        if name == "create_commit":
+            body = await request.json()
+            sha = self._sha(body["tree"], body["parents"], body["message"], len(self.commits))
+            self.commits[sha] = {"tree": body["tree"], "parents": body["parents"], "message": body["message"]}
+            return web.json_response(self._commit_json(base, sha), status=201)
+        if name == "get_commit":
+            return web.json_response(self._commit_json(base, m["sha"]))
+        if name == "get_ref":
+            return web.json_response(self._ref_json(base, m["ref"].split("heads/", 1)[1]))
+        if name == "update_ref":
+            if self.before_ref_update:
+                hook, self.before_ref_update = self.before_ref_update, None
+                hook()
+            body = await request.json()
+            branch = m["ref"].split("heads/", 1)[1]
+            if not body.get("force") and self.heads[branch] not in self.commits[body["sha"]]["parents"]:
+                return web.json_response({"message": "Update is not a fast forward"}, status=422)
+            self.heads[branch] = body["sha"]
+            return web.json_response(self._ref_json(base, branch))
+
+    async def __aenter__(self):
+        app = web.Application()
+        routes = [
+            ("GET", "/repos/{owner}/{repo}", "get_repo"),
+            ("GET", "/repos/{owner}/{repo}/contents/{path:.+}", "get_contents"),
+            ("PUT", "/repos/{owner}/{repo}/contents/{path:.+}", "put_contents"),
+            ("POST", "/repos/{owner}/{repo}/git/blobs", "create_blob"),
+            ("POST", "/repos/{owner}/{repo}/git/trees", "create_tree"),
+            ("POST", "/repos/{owner}/{repo}/git/commits", "create_commit"),
+            ("GET", "/repos/{owner}/{repo}/git/commits/{sha}", "get_commit"),
+            ("GET", "/repos/{owner}/{repo}/git/ref/{ref:.+}", "get_ref"),
+            ("GET", "/repos/{owner}/{repo}/git/refs/{ref:.+}", "get_ref"),
+            ("PATCH", "/repos/{owner}/{repo}/git/refs/{ref:.+}", "update_ref"),
+        ]
+        for method, path, name in routes:
+            app.router.add_route(method, path, lambda request, name=name: self.handle(name, request))
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        os.environ["GITHUB_API_URL"] = self.url
+        return self
+
+    async def __aexit__(self, *exc):
+        os.environ.pop("GITHUB_API_URL", None)
+        await self.runner.cleanup()
+
+def make_agent(**kwargs):
+    qa = QuantumAgent(github_write_interval=None, **kwargs)
+    qa.auth_config["integration_endpoints"] = AI_ENDPOINTS
+    return qa
+
+async def test_github_calls_do_not_block_event_loop():
+    async with StandInGitHub(latency=0.1) as server:
+        for i in range(5):
+            server.write(f"src/mod{i}.py", f"x = {i}\n".encode())
+        qa = make_agent()
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.create_task(ticker())
+        reqs = [
+            {"action": "refactor_file",
+             "params": {"repo": "octo/demo", "path": f"src/mod{i}.py", "instructions": "rename"}}
+            for i in range(5)
+        ]
+        with patch.object(agent, "query_ai", AsyncMock(return_value="y = 1\n")), \
+             patch.object(agent, "log_action"):
+            start = time.perf_counter()
+            results = await qa.handle_batch(reqs)
+            elapsed = time.perf_counter() - start
+        tick_task.cancel()
+
+    assert all(r["status"] == "ok" for r in results), results
+    # Serially: 5 requests x 3 round trips x 0.1s = 1.5s
+    assert elapsed < 0.6, elapsed
+    assert ticks >= elapsed / 0.01 * 0.5, ticks
+    assert server.calls["get_repo"] == 1  # Repo handle shared across the batch
+    assert server.calls["put_contents"] == 5
+    assert all(server.files[f"src/mod{i}.py"] == b"y = 1\n" for i in range(5))
+
+    print("Non-blocking GitHub batch test passed!")
+
+async def test_worker_pool_bounds_github_concurrency():
+    async with StandInGitHub(latency=0.1) as server:
+        qa = make_agent(github_workers=2)
+        reqs = [
+            {"action": "generate_file",
+             "params": {"repo": "octo/demo", "path": f"gen/file{i}.py", "description": "stub"}}
+            for i in range(4)
+        ]
+        with patch.object(agent, "query_ai", AsyncMock(return_value="pass\n")), \
+             patch.object(agent, "log_action"):
+            start = time.perf_counter()
+            results = await asyncio.gather(*(qa.handle_request(r) for r in reqs))
+            elapsed = time.perf_counter() - start
+
+    assert all(r["status"] == "ok" for r in results), results
+    # Without a shared cache every request fetches the repo: 8 calls, 2 at a time
+    assert server.calls["get_repo"] == 4
+    assert elapsed >= 0.4, elapsed
+    assert sorted(server.files) == [f"gen/file{i}.py" for i in range(4)]
+
+    print("Bounded GitHub worker pool test passed!")
+
+async def test_commit_files_creates_one_commit():
+    async with StandInGitHub(latency=0.05) as server:
+        server.write("src/old.py", b"x = 1\n")
+        qa = make_agent()
+        head_before = server.heads["main"]
+        req = {"action": "commit_files", "params": {
+            "repo": "octo/demo", "message": "Scaffold package",
+            "files": [{"path": "src/old.py", "instructions": "modernize"}]
+                     + [{"path": f"pkg/f{i}.py", "description": f"module {i}"} for i in range(4)]
+                     + [{"path": "README.md", "content": "# demo\n"}],
+        }}
+        with patch.object(agent, "query_ai", AsyncMock(return_value="generated = True\n")), \
+             patch.object(agent, "log_action"):
+            start = time.perf_counter()
+            result = await qa.handle_request(req)
+            elapsed = time.perf_counter() - start
+
+    assert result["status"] == "ok" and result["attempts"] == 1, result
+    assert server.heads["main"] == result["commit"]
+    assert server.commits[result["commit"]]["parents"] == [head_before]
+    assert server.commits[result["commit"]]["message"] == "Scaffold package"
+    assert server.files["README.md"] == b"# demo\n"
+    assert server.files["src/old.py"] == b"generated = True\n"
+    assert all(server.files[f"pkg/f{i}.py"] == b"generated = True\n" for i in range(4))
+    assert server.calls["create_blob"] == 6
+    assert server.calls["create_tree"] == server.calls["create_commit"] == server.calls["update_ref"] == 1
+    assert server.calls["put_contents"] == 0
+    # repo, contents, 6 parallel blobs, ref, commit, tree, commit, ref update
+    assert elapsed < 0.05 * 10, elapsed
+
+    print("Atomic multi-file commit test passed!")
+
+async def test_commit_files_retries_when_branch_moves():
+    async with StandInGitHub(latency=0.0) as server:
+        server.write("src/mod.py", b"x = 1\n")
+        qa = make_agent()
+        server.before_ref_update = lambda: server.write("docs/other.md", b"concurrent\n")
+        req = {"action": "commit_files", "params": {
+            "repo": "octo/demo", "files": [{"path": "src/mod.py", "instructions": "tidy"},
+                                           {"path": "src/new.py", "content": "y = 2\n"}],
+        }}
+        with patch.object(agent, "query_ai", AsyncMock(return_value="x = 2\n")), \
+             patch.object(agent, "log_action"):
+            result = await qa.handle_request(req)
+
+            assert result["status"] == "ok" and result["attempts"] == 2, result
+            assert server.files["docs/other.md"] == b"concurrent\n"
+            assert server.files["src/mod.py"] == b"x = 2\n"
+            assert server.calls["create_blob"] == 2  # Blobs are reused across attempts
+
+            # A concurrent change to a file we refactored must not be overwritten
+            server.before_ref_update = lambda: server.write("src/mod.py", b"x = 3\n")
+            result = await qa.handle_request(req)
+
+    assert result["status"] == "error" and result["error_code"] == "COMMIT_CONFLICT", result
+    assert server.files["src/mod.py"] == b"x = 3\n"
+
+    print("Commit retry-on-conflict test passed!")
+
+async def test_commit_files_detects_change_during_render():
+    async with StandInGitHub(latency=0.0) as server:
+        server.write("src/mod.py", b"x = 1\n")
+        qa = make_agent()
+
+        async def slow_ai(prompt, *args, **kwargs):
+            # Someone pushes to the file while the LLM is still rewriting it
+            server.write("src/mod.py", b"x = 3\n")
+            return "x = 2\n"
+
+        req = {"action": "commit_files", "params": {
+            "repo": "octo/demo", "files": [{"path": "src/mod.py", "instructions": "tidy"}],
+        }}
+        with patch.object(agent, "query_ai", AsyncMock(side_effect=slow_ai)), \
+             patch.object(agent, "log_action"):
+            head = server.heads["main"]
+            result = await qa.handle_request(req)
+
+    assert result["status"] == "error" and result["error_code"] == "COMMIT_CONFLICT", result
+    assert server.files["src/mod.py"] == b"x = 3\n"
+    assert server.heads["main"] != head and server.calls["update_ref"] == 0
+
+    print("Mid-render upstream change test passed!")
+
+async def test_content_cache_revalidates_and_tracks_own_writes():
+    async with StandInGitHub(latency=0.0) as server:
+        server.write("src/mod.py", b"x = 1\n")
+        server.write("src/other.py", b"y = 1\n")
+        qa = make_agent()
+        refactor = {"action": "refactor_file",
+                    "params": {"repo": "octo/demo", "path": "src/mod.py", "instructions": "tidy"}}
+        with patch.object(agent, "query_ai", AsyncMock(side_effect=["x = 2\n", "x = 3\n"])), \
+             patch.object(agent, "log_action"):
+            assert (await qa.handle_request(refactor))["status"] == "ok"
+            # Second pass reads our own write from the cache without any contents request
+            assert (await qa.handle_request(refactor))["status"] == "ok"
+        assert server.calls["get_contents"] == 1
+        assert server.files["src/mod.py"] == b"x = 3\n"
+
+        repo = await qa.get_repo("octo/demo")
+        cache = qa.content_cache
+        first = await qa.run_github(cache.get, repo, "src/other.py")
+        again = await qa.run_github(cache.get, repo, "src/other.py")
+        assert again.decoded_content == first.decoded_content == b"y = 1\n"
+        assert server.calls["not_modified"] == 1  # Revalidated with a 304
+
+        server.write("src/other.py", b"y = 2\n")
+        changed = await qa.run_github(cache.get, repo, "src/other.py")
+        assert changed.decoded_content == b"y = 2\n"
+
+        with patch.object(agent, "log_action"):
+            stats = (await qa.handle_request({"action": "cache_stats"}))["content_cache"]
+        assert stats["hits"] == 2 and stats["misses"] == 3 and stats["not_modified"] == 1
+        assert abs(stats["hit_rate"] - 0.4) < 1e-9
+
+    print("ETag content cache test passed!")
+
+async def test_content_cache_shares_default_branch_entries():
+    async with StandInGitHub(latency=0.0) as server:
+        server.write("src/mod.py", b"x = 1\n")
+        qa = make_agent()
+        refactor = {"action": "refactor_file",
+                    "params": {"repo": "octo/demo", "path": "src/mod.py", "instructions": "tidy"}}
+        commit = {"action": "commit_files",
+                  "params": {"repo": "octo/demo", "files": [{"path": "src/mod.py", "instructions": "tidy"}]}}
+        with patch.object(agent, "query_ai", AsyncMock(side_effect=["x = 2\n", "x = 3\n", "x = 4\n"])), \
+             patch.object(agent, "log_action"):
+            assert (await qa.handle_request(refactor))["status"] == "ok"
+            # The branch commit reads the refactor's own write instead of refetching
+            result = await qa.handle_request(commit)
+            assert result["status"] == "ok", result
+            # And the refactor sees the sha committed on the branch, not a stale one
+            assert (await qa.handle_request(refactor))["status"] == "ok"
+
+    assert server.files["src/mod.py"] == b"x = 4\n"
+    # One initial read plus the commit's pre-update conflict check
+    assert server.calls["get_contents"] == 2
+    assert [key[2] for key in qa.content_cache.entries] == ["main"]
+
+    print("Default branch cache key test passed!")
+
+async def test_content_cache_evicts_least_recently_used():
+    async with StandInGitHub(latency=0.0) as server:
+        for name in "abc":
+            server.write(f"{name}.txt", name.encode() * 40)
+        qa = make_agent()
+        qa.content_cache.max_bytes = 100
+        repo = await qa.get_repo("octo/demo")
+        cache = qa.content_cache
+
+        await qa.run_github(cache.get, repo, "a.txt")
+        await qa.run_github(cache.get, repo, "b.txt")
+        await qa.run_github(cache.get, repo, "a.txt")
+        await qa.run_github(cache.get, repo, "c.txt")
+
+        keys = [key[1] for key in cache.entries]
+        assert keys == ["a.txt", "c.txt"], keys
+        assert cache.total_bytes == 80 and cache.evictions == 1
+
+    print("Content cache LRU test passed!")
+
+async def test_run_shell_streams_to_caller():
+    qa = make_agent()
+    chunks = []
+
+    async def on_output(chunk):
+        chunks.append(chunk)
+
+    req = {"action": "run_shell", "params": {"command": "echo one; sleep 0.1; echo two"}}
+    with patch.object(agent, "log_action"):
+        result = await qa.handle_request(req, on_output=on_output)
+
+    assert result["status"] == "ok" and result["exit_code"] == 0, result
+    assert chunks == ["one\n", "two\n"], chunks
+    assert result["output"] == "one\ntwo\n"
+
+    print("Agent shell streaming test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_github_calls_do_not_block_event_loop())
+    asyncio.run(test_worker_pool_bounds_github_concurrency())
+    asyncio.run(test_commit_files_creates_one_commit())
+    asyncio.run(test_commit_files_retries_when_branch_moves())
+    asyncio.run(test_commit_files_detects_change_during_render())
+    asyncio.run(test_content_cache_revalidates_and_tracks_own_writes())
+    asyncio.run(test_content_cache_shares_default_branch_entries())
+    asyncio.run(test_content_cache_evicts_least_recently_used())
+    asyncio.run(test_run_shell_streams_to_caller())
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+from aiohttp import web
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from ai import AIClient, query_ai
+
+class StandInRouter:
+    """Local stand-in for the OpenAI-compatible /v1/chat/completions endpoint."""
+
+    def __init__(self, failures=0, failure_status=503, delay=0.0, tokens=("Hello", ", ", "world"), retry_after="0"):
+        self.failures = failures
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.delay = delay
+        self.tokens = tokens
+        self.requests = []
+        self.peers = set()
+        self.runner = None
+        self.url = ""
+
+    async def completions(self, request):
+        payload = await request.json()
+        self.requests.append((dict(request.headers), payload))
+        self.peers.add(request.transport.get_extra_info("peername"))
+        if self.failures:
+            self.failures -= 1
+            return web.json_response({"error": "busy"}, status=self.failure_status, headers={"Retry-After": self.retry_after})
+        await asyncio.sleep(self.delay)
+        if not payload.get("stream"):
+            text = "".join(self.tokens)
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": text}}]})
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for token in self.tokens:
+            chunk = {"choices": [{"delta": {"content": token}}]}
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(0.01)
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.completions)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1/chat/completions"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+async def test_client_reuses_one_pooled_session():
+    async with StandInRouter() as server:
+        client = AIClient(url=server.url)
+        results = []
+        for _ in range(3):
+            results.append(await query_ai("hi", "hf-token", client=client))
+        await client.close()
+
+    assert results == ["Hello, world"] * 3
+    assert len(server.peers) == 1  # Keep-alive connection reused
+    assert server.requests[0][0]["Authorization"] == "Bearer hf-token"
+
+    print("Pooled session test passed!")
+
+async def test_client_retries_throttled_and_failed_requests():
+    async with StandInRouter(failures=2, failure_status=429) as server:
+        client = AIClient(url=server.url, backoff=0.01)
+        assert await client.query("hi", "hf-token") == "Hello, world"
+        assert len(server.requests) == 3
+
+        server.failures, server.failure_status = 5, 503
+        client.max_retries = 1
+        assert await client.query("hi", "hf-token") == "busy"
+        await client.close()
+
+    print("Retry with jitter test passed!")
+
+async def test_retry_after_is_capped():
+    async with StandInRouter(failures=1, failure_status=429, retry_after="3600") as server:
+        client = AIClient(url=server.url, backoff=0.01, max_retry_after=0.05)
+        start = time.perf_counter()
+        assert await client.query("hi", "hf-token") == "Hello, world"
+        elapsed = time.perf_counter() - start
+        await client.close()
+
+    assert elapsed < 1.0, elapsed
+    assert client._delay(0, "3600") == 0.05
+
+    print("Retry-After cap test passed!")
+
+def test_session_closed_when_loop_changes():
+    client = AIClient()
+    sessions = []
+
+    async def query():
+        async with StandInRouter() as server:
+            client.url = server.url
+            assert await client.query("hi", "hf-token") == "Hello, world"
+            sessions.append(client.session)
+
+    asyncio.run(query())
+    asyncio.run(query())
+    first, second = sessions
+    assert first is not second
+    assert first.closed and not second.closed
+    asyncio.run(client.close())
+    assert second.closed
+
+    print("Session loop change test passed!")
+
+async def test_client_read_timeout():
+    async with StandInRouter(delay=1.0) as server:
+        client = AIClient(url=server.url, read_timeout=0.1, max_retries=1, backoff=0.01)
+        start = time.perf_counter()
+        try:
+            await client.query("hi", "hf-token")
+            assert False, "expected a timeout"
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+        await client.close()
+
+    assert elapsed < 0.6, elapsed
+    assert len(server.requests) == 2
+
+    print("Read timeout test passed!")
+
+async def test_streaming_and_header_plumbing():
+    async with StandInRouter(tokens=("def ", "f():", " pass")) as server:
+        client = AIClient(url=server.url)
+        seen = []
+        result = await query_ai("code", "hf-token", client=client, stream=True, on_token=seen.append,
+                                headers={"X-API-Key": "agent-key", "Authorization": "Bearer from-config"})
+        await client.close()
+
+    assert result == "def f(): pass"
+    assert seen == ["def ", "f():", " pass"]
+    headers, payload = server.requests[0]
+    assert payload["stream"] is True
+    assert headers["X-API-Key"] == "agent-key"
+    assert headers["Authorization"] == "Bearer from-config"
+
+    config_client = AIClient.from_endpoint_config({"timeout": 30000, "retry_attempts": 2})
+    assert config_client.timeout.sock_read == 30 and config_client.max_retries == 2
+
+    print("Streaming test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_client_reuses_one_pooled_session())
+    asyncio.run(test_client_retries_throttled_and_failed_requests())
+    asyncio.run(test_retry_after_is_capped())
+    test_session_closed_when_loop_changes()
+    asyncio.run(test_client_read_timeout())
+    asyncio.run(test_streaming_and_header_plumbing())
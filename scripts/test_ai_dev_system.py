@@ -0,0 +1,477 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from ai_dev_system import (
+    AIOrchestrator, AsyncInputReader, CodeGenerator, CommandScheduler, DevEnvironment, ExecutionResult,
+    SourceChunker
+)
+
+class StandInOllama:
+    """Minimal local Ollama /api/generate stand-in with a simulated cold load."""
+
+    def __init__(self, load_delay: float = 0.2, reply: str = "ok"):
+        self.load_delay = load_delay
+        self.reply = reply
+        self.loaded = set()
+        self.payloads = []
+        self.runner = None
+        self.url = ""
+
+    async def generate(self, request):
+        payload = await request.json()
+        self.payloads.append(payload)
+        model = payload["model"]
+        if model not in self.loaded:
+            await asyncio.sleep(self.load_delay)
+            self.loaded.add(model)
+        if "prompt" not in payload:
+            return web.json_response({"model": model, "done": True, "done_reason": "load"})
+        return web.json_response({"model": model, "response": self.reply, "done": True})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post("/api/generate", self.generate)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+def point_models_at(orchestrator, url):
+    for model in orchestrator.models.values():
+        model.url = url
+
+async def test_warm_up_all_runs_concurrently():
+    async with StandInOllama(load_delay=0.2) as server:
+        ai = AIOrchestrator()
+        point_models_at(ai, server.url)
+
+        start = time.perf_counter()
+        statuses = await ai.warm_up_all()
+        elapsed = time.perf_counter() - start
+
+    # Three cold loads of 0.2s each would take 0.6s serially
+    assert elapsed < 0.45, elapsed
+    for status in statuses.values():
+        assert status.state == "ready"
+        assert status.time_to_ready >= 0.2
+    assert server.loaded == {m.name for m in ai.models.values()}
+    assert all("prompt" not in p and p["keep_alive"] for p in server.payloads)
+
+    print("Concurrent warm-up test passed!")
+
+async def test_query_model_sends_keep_alive_and_skips_cold_load():
+    async with StandInOllama(load_delay=0.3, reply="warm") as server:
+        ai = AIOrchestrator()
+        point_models_at(ai, server.url)
+        ai.models['phi'].keep_alive = "1h"
+        await ai.warm_up_model('phi')
+
+        start = time.perf_counter()
+        response = await ai.query_model('phi', "hello")
+        elapsed = time.perf_counter() - start
+
+    assert response == "warm"
+    assert elapsed < 0.3, elapsed
+    assert server.payloads[-1]["keep_alive"] == "1h"
+
+    print("keep_alive query test passed!")
+
+async def test_background_warmup_tracks_failures():
+    env = DevEnvironment()
+    point_models_at(env.ai, "http://127.0.0.1:9")
+
+    task = env.start_warmup()
+    assert env.start_warmup() is task
+    statuses = await task
+
+    for status in statuses.values():
+        assert status.state == "failed"
+        assert status.error
+
+    print("Warm-up failure tracking test passed!")
+
+class SleepingExecutor:
+    """Stand-in for UnstoppableExecutor that sleeps instead of running commands."""
+
+    def __init__(self, durations, failing=()):
+        self.durations = durations
+        self.failing = set(failing)
+        self.executor = ThreadPoolExecutor(max_workers=10)
+
+    def execute(self, command, cwd=None, timeout=300):
+        time.sleep(self.durations.get(command, 0.0))
+        return ExecutionResult(command not in self.failing, command, duration=self.durations.get(command, 0.0))
+
+async def test_scheduler_infers_dependencies():
+    scheduler = CommandScheduler(SleepingExecutor({}))
+    steps = scheduler.build_graph([
+        "pip install -r backend/requirements.txt",
+        "cd frontend && npm install",
+        "npm --prefix frontend run build",
+        "pip install pytest",
+        "cargo build --manifest-path engine/Cargo.toml",
+        "make -C frontend",
+        "mkdir -p dist",
+        "cd engine && cargo test",
+    ])
+
+    assert [(s.ecosystem, s.cwd) for s in steps[:3]] == [("python", "backend"), ("node", "frontend"), ("node", "frontend")]
+    assert steps[1].depends_on == []
+    assert steps[2].depends_on == [1]
+    assert steps[3].depends_on == [0]  # pip shares one environment across modules
+    assert steps[4].depends_on == []
+    assert steps[5].depends_on == [1, 2, 3]  # root-level installs may feed any build
+    assert steps[6].depends_on == [0, 1, 2, 3, 4, 5]
+    assert steps[7].depends_on == [4, 6]
+
+    print("Dependency inference test passed!")
+
+async def test_scheduler_runs_independent_commands_concurrently():
+    durations = {"pip install flask": 0.2, "cd web && npm install": 0.2, "cd web && npm test": 0.1, "cargo build": 0.2}
+    fixed = []
+
+    async def on_failure(step):
+        fixed.append(step.command)
+        return ExecutionResult(True, "fixed")
+
+    scheduler = CommandScheduler(SleepingExecutor(durations, failing={"cargo build"}), max_workers=4)
+    start = time.perf_counter()
+    steps = await scheduler.run(list(durations), on_failure=on_failure)
+    elapsed = time.perf_counter() - start
+
+    # Serial execution would take 0.7s; the longest chain is npm install -> npm test
+    assert elapsed < 0.45, elapsed
+    assert abs(CommandScheduler.critical_path(steps) - 0.3) < 1e-9
+    assert steps[2].started_at >= steps[1].finished_at
+    assert fixed == ["cargo build"] and steps[3].result.output == "fixed"
+
+    scheduler.max_workers = 1
+    start = time.perf_counter()
+    await scheduler.run(list(durations))
+    assert time.perf_counter() - start >= 0.7
+
+    print("Concurrent setup scheduling test passed!")
+
+class EchoOrchestrator(AIOrchestrator):
+    """Returns each refactor section back with a marker, after a fixed delay."""
+
+    def __init__(self, delay=0.1, broken=False):
+        super().__init__()
+        self.delay = delay
+        self.broken = broken
+        self.prompts = []
+
+    async def query_model(self, model_name, prompt, context=""):
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        section = prompt.split("Section code:\n", 1)[1].rsplit("\n\nProvide only", 1)[0]
+        if self.broken:
+            return "def broken(:\n"
+        return f"```python\n# refactored\n{section}```"
+
+async def test_chunker_splits_python_by_top_level_definitions():
+    source = (
+        '"""Module doc."""\nimport os\n\n'
+        "@decorator\ndef first():\n    return 1\n\n"
+        "# leading comment\nclass Second:\n    x = 2\n\n"
+        "def third():\n    return 3\n"
+    )
+    chunks = SourceChunker(max_chars=40).split(source, "mod.py")
+
+    assert ''.join(chunks) == source
+    assert chunks[1].startswith("@decorator")
+    assert chunks[2].startswith("# leading comment")
+    assert chunks[-1].startswith("def third")
+
+    text = "".join(f"line {i}\n" + ("\n" if i % 5 == 4 else "") for i in range(40))
+    chunks = SourceChunker(max_chars=100).split(text, "notes.txt")
+    assert ''.join(chunks) == text
+    assert all(len(c) <= 100 for c in chunks)
+    assert all(c.endswith("\n\n") for c in chunks[:-1])
+
+    body = "".join(f"    x_{i} = {i}\n" for i in range(30))
+    source = "import os\n\ndef huge():\n" + body + "\ndef small():\n    return 1\n" + "s = '" + "y" * 150 + "'\n"
+    chunks = SourceChunker(max_chars=100).split(source, "mod.py")
+    assert ''.join(chunks) == source
+    assert all(len(c) <= 100 for c in chunks), [len(c) for c in chunks]
+    assert chunks[0] == "import os\n\n"
+
+    print("Source chunking test passed!")
+
+async def test_chunked_refactor_runs_in_parallel_and_validates():
+    functions = "".join(f"def func_{i}():\n    return {i}\n\n" for i in range(6))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.py")
+        with open(path, "w") as f:
+            f.write(functions)
+
+        ai = EchoOrchestrator(delay=0.1)
+        ai.models['deepseek'].context_window = 20  # Forces one function per chunk
+        generator = CodeGenerator(ai, max_parallel=3)
+
+        start = time.perf_counter()
+        assert await generator.refactor_file(path, "add type hints")
+        elapsed = time.perf_counter() - start
+
+        with open(path) as f:
+            result = f.read()
+        assert len(ai.prompts) == 6
+        assert elapsed < 0.35, elapsed  # 6 chunks, 3 at a time
+        assert result.count("# refactored") == 6
+        assert "func_5" in result and "```" not in result
+        assert "Top-level definitions in the file: func_0" in ai.prompts[0]
+
+        broken = CodeGenerator(EchoOrchestrator(delay=0, broken=True))
+        assert not await broken.refactor_file(path, "break it", chunked=True)
+        with open(path) as f:
+            assert f.read() == result
+
+    print("Chunked refactor test passed!")
+
+class FailFastOrchestrator(AIOrchestrator):
+    """Fails the first section immediately; the others hang until cancelled."""
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = 0
+
+    async def query_model(self, model_name, prompt, context=""):
+        if "section 1 of" in prompt:
+            return "Error: API returned 500"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return prompt
+
+async def test_chunked_refactor_cancels_siblings_on_failure():
+    functions = "".join(f"def func_{i}():\n    return {i}\n\n" for i in range(4))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "big.py")
+        with open(path, "w") as f:
+            f.write(functions)
+
+        ai = FailFastOrchestrator()
+        ai.models['deepseek'].context_window = 20
+        generator = CodeGenerator(ai, max_parallel=4)
+
+        start = time.perf_counter()
+        assert not await generator.refactor_file(path, "add type hints", chunked=True)
+        assert time.perf_counter() - start < 1
+        assert ai.cancelled == 3
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        assert not pending, pending
+        with open(path) as f:
+            assert f.read() == functions
+
+    print("Chunked refactor cancellation test passed!")
+
+class ManifestOrchestrator(AIOrchestrator):
+    """Generates "content of <path>" after a fixed delay, recording the context it was given."""
+
+    def __init__(self, delay=0.1, failing=()):
+        super().__init__()
+        self.delay = delay
+        self.failing = set(failing)
+        self.contexts = {}
+
+    async def query_model(self, model_name, prompt, context=""):
+        path = prompt.split("file for: ", 1)[1].split("\n", 1)[0]
+        self.contexts[path] = context
+        await asyncio.sleep(self.delay)
+        if path in self.failing:
+            return "Error: API returned 500"
+        return f"content of {path}\n"
+
+async def test_batch_generation_honours_dependencies_and_concurrency():
+    with tempfile.TemporaryDirectory() as tmp:
+        entries = [
+            {"path": os.path.join(tmp, "pkg/models.py"), "description": "models"},
+            {"path": os.path.join(tmp, "pkg/utils.py"), "description": "utils"},
+            {"path": os.path.join(tmp, "pkg/config.py"), "description": "config"},
+            {"path": os.path.join(tmp, "pkg/api.py"), "description": "api",
+             "depends_on": [os.path.join(tmp, "pkg/models.py"), os.path.join(tmp, "pkg/utils.py")]},
+            {"path": os.path.join(tmp, "pkg/broken.py"), "description": "broken"},
+            {"path": os.path.join(tmp, "pkg/uses_broken.py"), "description": "x",
+             "depends_on": [os.path.join(tmp, "pkg/broken.py")]},
+        ]
+        manifest_path = os.path.join(tmp, "manifest.json")
+        with open(manifest_path, "w") as f:
+            json.dump({"files": entries}, f)
+
+        ai = ManifestOrchestrator(delay=0.1, failing={entries[4]["path"]})
+        generator = CodeGenerator(ai, max_parallel=4)
+
+        start = time.perf_counter()
+        result = await generator.generate_batch(generator.load_manifest(manifest_path))
+        elapsed = time.perf_counter() - start
+
+        # Two dependency levels of 0.1s each instead of five serial generations
+        assert elapsed < 0.35, elapsed
+        assert sorted(result.failed) == sorted([entries[4]["path"], entries[5]["path"]])
+        assert len(result.generated) == 4
+        assert result.generation_time >= 0.5 and result.wall_time < result.generation_time
+
+        with open(entries[3]["path"]) as f:
+            assert f.read() == f"content of {entries[3]['path']}\n"
+        api_context = ai.contexts[entries[3]["path"]]
+        assert f"content of {entries[0]['path']}" in api_context
+        assert f"content of {entries[1]['path']}" in api_context
+        assert entries[5]["path"] not in ai.contexts
+        assert not os.path.exists(entries[4]["path"])
+        assert [n for n in os.listdir(os.path.join(tmp, "pkg")) if n.endswith(".tmp")] == []
+
+        cyclic = [{"path": "a", "depends_on": ["b"]}, {"path": "b", "depends_on": ["a"]}]
+        try:
+            await generator.generate_batch(cyclic)
+            assert False, "cycle not detected"
+        except ValueError:
+            pass
+
+        # Each level depends on both nodes of the next: 2**30 paths, but only 62 entries to visit
+        ladder = [{"path": f"{side}{i}", "depends_on": [f"l{i + 1}", f"r{i + 1}"] if i < 30 else []}
+                  for i in range(31) for side in "lr"]
+        ladder += [{"path": "x", "depends_on": ["y"]}, {"path": "y", "depends_on": ["l0", "x"]}]
+        start = time.perf_counter()
+        try:
+            await generator.generate_batch(ladder)
+            assert False, "cycle not detected"
+        except ValueError as e:
+            assert "x -> y -> x" in str(e), e
+        assert time.perf_counter() - start < 0.5
+
+        with open(manifest_path, "w") as f:
+            json.dump([{"path": "a.py"}, {"path": "b.py"}, {"path": "a.py", "description": "again"}], f)
+        try:
+            generator.load_manifest(manifest_path)
+            assert False, "duplicate path not rejected"
+        except ValueError as e:
+            assert "a.py appears more than once" in str(e), e
+
+    print("Batch generation test passed!")
+
+async def test_input_reader_does_not_block_event_loop():
+    read_fd, write_fd = os.pipe()
+    reader = AsyncInputReader(os.fdopen(read_fd, "r"))
+    writer = os.fdopen(write_fd, "w")
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    pending = asyncio.create_task(reader.readline())
+    await asyncio.sleep(0.15)
+    assert not pending.done()
+    assert ticks >= 5, ticks  # The loop kept running while input was pending
+
+    writer.write("analyze\n")
+    writer.flush()
+    assert await asyncio.wait_for(pending, 1.0) == "analyze"
+    writer.close()
+    assert await asyncio.wait_for(reader.readline(), 1.0) is None
+    tick_task.cancel()
+
+    print("Async input reader test passed!")
+
+async def test_background_jobs_run_while_prompt_accepts_commands():
+    read_fd, write_fd = os.pipe()
+    reader = AsyncInputReader(os.fdopen(read_fd, "r"))
+    writer = os.fdopen(write_fd, "w")
+
+    env = DevEnvironment()
+    point_models_at(env.ai, "http://127.0.0.1:9")
+    handled = []
+
+    async def slow_setup():
+        await asyncio.sleep(0.3)
+        handled.append("setup")
+        return ExecutionResult(True, "done", duration=0.3)
+
+    env.project_manager.auto_setup_project = slow_setup
+    session = asyncio.create_task(env.start_interactive_session(reader))
+
+    writer.write("setup &\njobs\n")
+    writer.flush()
+    await asyncio.sleep(0.1)
+    assert 1 in env.jobs and not env.jobs[1].task.done()
+
+    start = time.perf_counter()
+    writer.write("wait 1\nquit\n")
+    writer.flush()
+    await asyncio.wait_for(session, 2.0)
+    assert handled == ["setup"]
+    assert env.jobs[1].task.done() and env.jobs[1].finished_at >= env.jobs[1].started_at
+    assert time.perf_counter() - start < 0.35
+    writer.close()
+
+    print("Background job test passed!")
+
+async def test_cancelled_session_cleans_up_jobs():
+    read_fd, write_fd = os.pipe()
+    reader = AsyncInputReader(os.fdopen(read_fd, "r"))
+    writer = os.fdopen(write_fd, "w")
+
+    env = DevEnvironment()
+    point_models_at(env.ai, "http://127.0.0.1:9")
+
+    async def endless_setup():
+        await asyncio.sleep(60)
+
+    env.project_manager.auto_setup_project = endless_setup
+    session = asyncio.create_task(env.start_interactive_session(reader))
+    writer.write("setup &\n")
+    writer.flush()
+    await asyncio.sleep(0.1)
+    assert not env.jobs[1].task.done()
+
+    # asyncio.run delivers Ctrl-C by cancelling the main task
+    session.cancel()
+    try:
+        await asyncio.wait_for(session, 2.0)
+    except asyncio.CancelledError:
+        pass
+    else:
+        raise AssertionError("session swallowed the cancellation")
+    assert not env.running
+    assert env.jobs[1].task.cancelled()
+    assert env.warmup_task.done()
+    writer.close()
+
+    print("Cancelled session cleanup test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_warm_up_all_runs_concurrently())
+    asyncio.run(test_query_model_sends_keep_alive_and_skips_cold_load())
+    asyncio.run(test_background_warmup_tracks_failures())
+    asyncio.run(test_scheduler_infers_dependencies())
+    asyncio.run(test_scheduler_runs_independent_commands_concurrently())
+    asyncio.run(test_chunker_splits_python_by_top_level_definitions())
+    asyncio.run(test_chunked_refactor_runs_in_parallel_and_validates())
+    asyncio.run(test_chunked_refactor_cancels_siblings_on_failure())
+    asyncio.run(test_batch_generation_honours_dependencies_and_concurrency())
+    asyncio.run(test_input_reader_does_not_block_event_loop())
+    asyncio.run(test_background_jobs_run_while_prompt_accepts_commands())
+    asyncio.run(test_cancelled_session_cleans_up_jobs())
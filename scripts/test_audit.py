@@ -0,0 +1,141 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from audit import AuditWriter
+
+async def test_writes_are_batched_off_the_request_path():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = AuditWriter(os.path.join(tmp, "audit.log"), flush_interval=0.05, fsync="never")
+        params = {"path": "a.py"}
+
+        start = time.perf_counter()
+        for i in range(1000):
+            writer.write({"ts": 1000.0 + i, "action": "refactor_file", "params": params})
+        enqueue_time = time.perf_counter() - start
+        params["path"] = "mutated.py"  # Entries are serialized when logged
+
+        writer.flush()
+        with open(writer.path) as f:
+            lines = f.readlines()
+        batches = writer._read_index()
+        writer.close()
+
+    assert len(lines) == 1000
+    assert '"a.py"' in lines[0] and "mutated" not in "".join(lines)
+    assert sum(b["count"] for b in batches) == 1000
+    assert len(batches) < 100, len(batches)
+    assert enqueue_time < 0.5, enqueue_time
+
+    print("Batched audit write test passed!")
+
+async def test_fsync_policy():
+    with tempfile.TemporaryDirectory() as tmp:
+        for policy, expected in (("always", 6), ("never", 0), ("interval", 2)):
+            writer = AuditWriter(os.path.join(tmp, f"{policy}.log"), flush_interval=0.01, fsync=policy,
+                                 fsync_interval=3600)
+            with patch("audit.os.fsync") as fsync:
+                for i in range(3):
+                    writer.write({"ts": float(i), "action": "run_shell", "params": {}})
+                    writer.flush()
+                writer.close()
+            # Each fsync covers the log and its index
+            assert fsync.call_count == expected, (policy, fsync.call_count)
+
+    try:
+        AuditWriter("x.log", fsync="sometimes")
+        assert False, "invalid policy accepted"
+    except ValueError:
+        pass
+
+    print("fsync policy test passed!")
+
+async def test_rotation_compression_and_time_range_queries():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "audit.log")
+        writer = AuditWriter(path, flush_interval=0.01, fsync="never", max_bytes=2000, backup_count=3)
+        for i in range(200):
+            writer.write({"ts": 100.0 + i, "action": "check_integration", "params": {"i": i}})
+            if i % 20 == 19:
+                writer.flush()
+        writer.close()
+
+        backups = sorted(n for n in os.listdir(tmp) if n.endswith(".gz"))
+        assert len(backups) == 3, backups
+
+        reader = AuditWriter(path)
+        window = reader.query(start=180.0, end=290.0)
+        everything = reader.query()
+
+    assert [e["params"]["i"] for e in window] == list(range(80, 191))
+    # Older batches were dropped along with their expired backups
+    assert everything[-1]["params"]["i"] == 199
+    assert [e["ts"] for e in everything] == sorted(e["ts"] for e in everything)
+    assert len(everything) < 200
+
+    print("Rotation and query test passed!")
+
+async def test_no_entries_lost_on_close():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = AuditWriter(os.path.join(tmp, "audit.log"), flush_interval=10.0, fsync="never")
+        for i in range(50):
+            writer.write({"ts": float(i), "action": "generate_file", "params": {}})
+        writer.close()
+        with open(writer.path) as f:
+            assert len(f.readlines()) == 50
+
+    print("Clean shutdown test passed!")
+
+async def test_write_errors_do_not_stop_the_writer():
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = AuditWriter(os.path.join(tmp, "audit.log"), flush_interval=0.01, batch_size=1, fsync="never")
+        real_write_batch = writer._write_batch
+
+        def failing_first(*errors):
+            # Raise each error once, then write normally
+            pending = list(errors)
+
+            def write_batch(entries):
+                if pending:
+                    raise pending.pop(0)
+                return real_write_batch(entries)
+            return write_batch
+
+        with patch.object(writer, "_write_batch", side_effect=failing_first(OSError(28, "No space left on device"))):
+            writer.write({"ts": 1.0, "action": "lost", "params": {}})
+            writer.flush()
+            writer.write({"ts": 2.0, "action": "kept", "params": {}})
+            writer.flush()
+        assert writer.stats["failed_batches"] == 1 and writer.stats["dropped_entries"] == 1
+        assert "No space left" in writer.last_error
+        assert [e["action"] for e in writer.query()] == ["kept"]
+
+        # Even a writer thread that dies outright is restarted by flush() instead of hanging it
+        with patch.object(writer, "_write_batch", side_effect=failing_first(SystemExit())):
+            for ts in (3.0, 4.0, 5.0):
+                writer.write({"ts": ts, "action": "after", "params": {}})
+            writer.flush()
+        assert writer.stats["restarts"] == 1
+        assert [e["ts"] for e in writer.query(start=3.0)] == [4.0, 5.0]
+
+        # Index time ranges cover out-of-order timestamps within a batch
+        writer._write_batch([(ts, f'{{"ts": {ts}, "action": "unordered"}}\n') for ts in (20.0, 10.0, 30.0)])
+        assert [e["ts"] for e in writer.query(start=9.0, end=15.0)] == [10.0]
+        record = writer._read_index()[-1]
+        assert (record["start"], record["end"]) == (10.0, 30.0), record
+        writer.close()
+
+    print("Audit writer error recovery test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_writes_are_batched_off_the_request_path())
+    asyncio.run(test_fsync_policy())
+    asyncio.run(test_rotation_compression_and_time_range_queries())
+    asyncio.run(test_no_entries_lost_on_close())
+    asyncio.run(test_write_errors_do_not_stop_the_writer())
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+for token in ("GITHUB_TOKEN", "HUGGINGFACE_TOKEN", "AGENT_API_KEY", "SESSION_SECRET"):
+    os.environ.setdefault(token, f"test-{token.lower()}")
+
+import agent
+from auth_config import AuthConfigStore
+
+def write_config(path, mapping, mtime=None):
+    with open(path, "w") as f:
+        json.dump({"integration_endpoints": {}, "frontend_backend_mapping": mapping}, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+async def test_reload_only_when_file_changes():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "auth.json")
+        write_config(path, {"webide": {"frontend": "a", "backend": "b"}}, mtime=1000)
+        store = AuthConfigStore(path, check_interval=0)
+
+        with patch("auth_config.json.load", wraps=json.load) as load:
+            for _ in range(100):
+                config = store.get()
+            assert load.call_count == 1
+            assert store.get() is config
+
+            write_config(path, {"terminal": {"frontend": "c", "backend": "d"}}, mtime=2000)
+            assert list(store.get()["frontend_backend_mapping"]) == ["terminal"]
+            assert load.call_count == 2 and store.version == 2
+
+        # With a check interval the file is not even stat()ed on every call
+        throttled = AuthConfigStore(path, check_interval=60)
+        for _ in range(100):
+            throttled.get()
+        assert throttled.stats["stat_calls"] == 1
+
+        with patch.dict(os.environ, {"AUTH_CONFIG_PATH": path}):
+            assert AuthConfigStore().path == path
+
+        missing = AuthConfigStore(os.path.join(tmp, "missing.json"))
+        assert missing.get()["frontend_backend_mapping"] == {} and not missing.loaded
+
+    print("Config reload test passed!")
+
+async def test_integration_paths_checked_only_when_changed():
+    with tempfile.TemporaryDirectory() as tmp:
+        frontend, backend = os.path.join(tmp, "web"), os.path.join(tmp, "Activity.kt")
+        os.mkdir(frontend)
+        path = os.path.join(tmp, "auth.json")
+        write_config(path, {"webide": {"frontend": frontend, "backend": backend, "auth_bridge": "bridge"}}, mtime=1000)
+        store = AuthConfigStore(path, check_interval=0)
+
+        with patch("auth_config.os.path.exists", wraps=os.path.exists) as exists:
+            for _ in range(50):
+                [entry] = store.integration_state()
+            assert exists.call_count == 2
+            assert entry.frontend_exists and not entry.assimilated
+
+            open(backend, "w").close()
+            assert not store.integration_state()[0].backend_exists
+            assert store.integration_state(refresh=True)[0].assimilated
+            assert exists.call_count == 4
+
+            # Only the new path is checked after the mapping changes
+            other = os.path.join(tmp, "Other.kt")
+            write_config(path, {"webide": {"frontend": frontend, "backend": other}}, mtime=2000)
+            [entry] = store.integration_state()
+            assert exists.call_count == 5
+            assert entry.frontend_exists and not entry.backend_exists
+
+    print("Integration state cache test passed!")
+
+async def test_agent_uses_cached_config_and_auth():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "auth.json")
+        write_config(path, {"webide": {"frontend": tmp, "backend": path, "integration_status": "active"}})
+        with patch.dict(os.environ, {"AUTH_CONFIG_PATH": path}), patch.object(agent, "log_action"):
+            qa = agent.QuantumAgent(github_write_interval=None)
+            with patch.object(agent.logger, "info") as info:
+                for _ in range(20):
+                    result = await qa.handle_request({"action": "check_integration"})
+            assert info.call_count == 1  # validation logged once, not per request
+            assert result["integration_check"]["webide"] == {
+                "frontend_exists": True, "backend_exists": True, "auth_bridge": None,
+                "integration_status": "active", "assimilated": True,
+            }
+
+            qa.session_secret = None
+            assert qa.validate_authentication() == (False, ["session"])
+            await qa.close()
+
+    print("Agent config cache test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_reload_only_when_file_changes())
+    asyncio.run(test_integration_paths_checked_only_when_changed())
+    asyncio.run(test_agent_uses_cached_config_and_auth())
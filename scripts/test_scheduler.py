@@ -0,0 +1,155 @@
+import asyncio
+import os
+import sys
+
+import aiohttp
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from scheduler import ActionScheduler, InvalidPriority
+from server import AgentServer
+from test_server import GatedAgent, RunningServer, wait_until
+
+class RecordingAgent:
+    """Runs LLM actions until released and records the order requests start in."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.started = []
+
+    async def handle_request(self, req):
+        self.started.append((req["action"], req.get("params", {}).get("n")))
+        if req["action"] in ("refactor_file", "generate_file"):
+            await self.gate.wait()
+        if req["action"] == "explode":
+            raise RuntimeError("boom")
+        return {"status": "success", "n": req.get("params", {}).get("n")}
+
+async def test_interactive_lane_not_blocked_by_llm_jobs():
+    agent = RecordingAgent()
+    scheduler = ActionScheduler(agent, lanes={"llm": 2})
+    llm = [asyncio.create_task(scheduler.submit({"action": "refactor_file", "params": {"n": i}})) for i in range(10)]
+    await wait_until(lambda: scheduler.lanes["llm"].running == 2)
+
+    result = await asyncio.wait_for(scheduler.submit({"action": "check_integration", "params": {"n": "c"}}), 1.0)
+    assert result == {"status": "success", "n": "c"}
+    assert scheduler.lanes["llm"].queued == 8
+
+    agent.gate.set()
+    await asyncio.gather(*llm)
+    stats = scheduler.stats()
+    assert stats["llm"]["completed"] == 10 and stats["interactive"]["completed"] == 1
+    assert stats["llm"]["wait_seconds"]["count"] == 10
+    assert stats["llm"]["service_seconds"]["sum"] > 0
+    await scheduler.close()
+
+    print("Lane isolation test passed!")
+
+async def test_priority_order_within_lane():
+    agent = RecordingAgent()
+    scheduler = ActionScheduler(agent, lanes={"llm": 1})
+    blocker = asyncio.create_task(scheduler.submit({"action": "generate_file", "params": {"n": "blocker"}}))
+    await wait_until(lambda: scheduler.lanes["llm"].running == 1)
+
+    tasks = [
+        asyncio.create_task(scheduler.submit({"action": "refactor_file", "params": {"n": 1}, "priority": "low"})),
+        asyncio.create_task(scheduler.submit({"action": "refactor_file", "params": {"n": 2}})),
+        asyncio.create_task(scheduler.submit({"action": "refactor_file", "params": {"n": 3}, "priority": "high"})),
+        asyncio.create_task(scheduler.submit({"action": "refactor_file", "params": {"n": 4}}, priority=0)),
+    ]
+    await wait_until(lambda: scheduler.lanes["llm"].queued == 4)
+    agent.gate.set()
+    await asyncio.gather(blocker, *tasks)
+
+    assert [n for _, n in agent.started] == ["blocker", 3, 4, 2, 1]
+    await scheduler.close()
+
+    print("Priority order test passed!")
+
+async def test_duplicate_requests_are_coalesced():
+    agent = RecordingAgent()
+    scheduler = ActionScheduler(agent, lanes={"llm": 1})
+    blocker = asyncio.create_task(scheduler.submit({"action": "generate_file", "params": {"n": "blocker"}}))
+    await wait_until(lambda: scheduler.lanes["llm"].running == 1)
+
+    req = {"action": "refactor_file", "params": {"n": 7, "path": "a.py"}}
+    dupes = [asyncio.create_task(scheduler.submit(dict(req))) for _ in range(5)]
+    other = asyncio.create_task(scheduler.submit({"action": "refactor_file", "params": {"n": 8}}))
+    # A duplicate with higher priority pulls the shared job ahead of n=8
+    dupes.append(asyncio.create_task(scheduler.submit(dict(req, priority="high"))))
+    await wait_until(lambda: scheduler.lanes["llm"].coalesced == 5)
+
+    # Cancelling one waiter leaves the shared job running for the rest
+    dupes[0].cancel()
+    agent.gate.set()
+    results = await asyncio.gather(*dupes[1:], other, blocker)
+
+    assert results[:5] == [{"status": "success", "n": 7}] * 5
+    assert [n for _, n in agent.started] == ["blocker", 7, 8]
+    assert scheduler.stats()["llm"]["completed"] == 3
+
+    # Failures reach every caller
+    failures = await asyncio.gather(*(scheduler.submit({"action": "explode"}) for _ in range(2)), return_exceptions=True)
+    assert all(isinstance(f, RuntimeError) for f in failures)
+    await scheduler.close()
+
+    print("Coalescing test passed!")
+
+async def test_server_routes_through_lanes():
+    agent = GatedAgent()
+    scheduler = ActionScheduler(agent, lanes={"llm": 1})
+    server = AgentServer(agent, max_queue=2, scheduler=scheduler)
+    async with RunningServer(server) as running, aiohttp.ClientSession() as session:
+        async def post(action, n):
+            async with session.post(f"{running.url}/agent", json={"action": action, "params": {"n": n}}) as resp:
+                return resp.status
+
+        held = [asyncio.create_task(post("refactor_file", 0))]
+        await wait_until(lambda: scheduler.lanes["llm"].running == 1)
+        held += [asyncio.create_task(post("refactor_file", i)) for i in (1, 2)]
+        await wait_until(lambda: scheduler.queued() == 2)
+        # The lane backlog counts against the admission bound
+        assert await post("refactor_file", 99) == 429
+
+        async with session.get(f"{running.url}/metrics") as resp:
+            lanes = (await resp.json())["lanes"]
+        assert lanes["llm"]["running"] == 1 and lanes["llm"]["queued"] == 2
+
+        agent.gate.set()
+        assert await asyncio.gather(*held) == [200] * 3
+    assert not scheduler.lanes["llm"].workers
+
+    print("Server scheduler integration test passed!")
+
+async def test_invalid_priority_is_a_bad_request():
+    assert ActionScheduler.parse_priority("high") == 0 and ActionScheduler.parse_priority(5) == 5
+    for value in ("urgent", "1", 1.5, True, [0]):
+        try:
+            ActionScheduler.parse_priority(value)
+        except InvalidPriority:
+            pass
+        else:
+            raise AssertionError(f"{value!r} accepted")
+
+    agent = GatedAgent()
+    scheduler = ActionScheduler(agent)
+    server = AgentServer(agent, scheduler=scheduler)
+    async with RunningServer(server) as running, aiohttp.ClientSession() as session:
+        for priority in ("urgent", "abc"):
+            req = {"action": "check_integration", "params": {"block": False}, "priority": priority}
+            async with session.post(f"{running.url}/agent", json=req) as resp:
+                assert resp.status == 400
+                body = await resp.json()
+            assert body["error_code"] == "BAD_REQUEST" and repr(priority) in body["msg"]
+        assert server.counters["bad_request"] == 2 and server.queued == 0
+        assert scheduler.queued() == 0
+
+    print("Invalid priority test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_interactive_lane_not_blocked_by_llm_jobs())
+    asyncio.run(test_priority_order_within_lane())
+    asyncio.run(test_duplicate_requests_are_coalesced())
+    asyncio.run(test_server_routes_through_lanes())
+    asyncio.run(test_invalid_priority_is_a_bad_request())
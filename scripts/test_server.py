@@ -0,0 +1,197 @@
+import asyncio
+import os
+import sys
+
+import aiohttp
+from aiohttp import web
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from server import AgentServer
+
+class GatedAgent:
+    """Agent whose requests block until released, recording peak concurrency per action."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.active = {}
+        self.peak = {}
+        self.closed = False
+
+    async def handle_request(self, req):
+        action = req["action"]
+        self.active[action] = self.active.get(action, 0) + 1
+        self.peak[action] = max(self.peak.get(action, 0), self.active[action])
+        try:
+            if req.get("params", {}).get("block", True):
+                await self.gate.wait()
+            if action == "explode":
+                raise RuntimeError("boom")
+            return {"status": "success", "action": action}
+        finally:
+            self.active[action] -= 1
+
+    async def close(self):
+        self.closed = True
+
+class RunningServer:
+    def __init__(self, server):
+        self.server = server
+        self.runner = None
+        self.url = ""
+
+    async def __aenter__(self):
+        self.runner = web.AppRunner(self.server.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+async def wait_until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+async def test_dispatch_request_ids_and_metrics():
+    agent = GatedAgent()
+    async with RunningServer(AgentServer(agent)) as running, aiohttp.ClientSession() as session:
+        req = {"action": "check_integration", "params": {"block": False}}
+        async with session.post(f"{running.url}/agent", json=req, headers={"X-Request-ID": "abc-123"}) as resp:
+            assert resp.status == 200
+            assert resp.headers["X-Request-ID"] == "abc-123"
+            body = await resp.json()
+        assert body == {"status": "success", "action": "check_integration", "request_id": "abc-123"}
+
+        async with session.post(f"{running.url}/agent", json=req) as resp:
+            assert len(resp.headers["X-Request-ID"]) == 32
+
+        async with session.post(f"{running.url}/agent", data="not json") as resp:
+            assert resp.status == 400
+
+        async with session.post(f"{running.url}/agent", json={"action": "explode", "params": {"block": False}}) as resp:
+            assert resp.status == 500
+            assert (await resp.json())["error_code"] == "INTERNAL_ERROR"
+
+        async with session.get(f"{running.url}/metrics") as resp:
+            metrics = await resp.json()
+        async with session.get(f"{running.url}/metrics?format=prometheus") as resp:
+            text = await resp.text()
+
+    hist = metrics["latency_seconds"]["check_integration"]
+    assert hist["count"] == 2 and hist["buckets"]["+Inf"] == 2
+    assert metrics["requests"]["accepted"] == 3 and metrics["requests"]["bad_request"] == 1
+    assert metrics["responses"]["explode:error"] == 1
+    assert 'agent_request_seconds_count{action="check_integration"} 2' in text
+    assert agent.closed
+
+    print("Dispatch and metrics test passed!")
+
+async def test_queue_full_returns_429():
+    agent = GatedAgent()
+    server = AgentServer(agent, max_concurrency=2, max_queue=3, action_limits={})
+    async with RunningServer(server) as running, aiohttp.ClientSession() as session:
+        async def post():
+            async with session.post(f"{running.url}/agent", json={"action": "generate_file"}) as resp:
+                return resp.status, resp.headers.get("Retry-After")
+
+        held = [asyncio.create_task(post()) for _ in range(5)]
+        await wait_until(lambda: server.in_flight == 2 and server.queued == 3)
+        assert await post() == (429, "1")
+
+        agent.gate.set()
+        assert [s for s, _ in await asyncio.gather(*held)] == [200] * 5
+        assert server.counters["rejected_busy"] == 1
+
+    print("Backpressure test passed!")
+
+class SlowBodyRequest(dict):
+    """Stand-in request whose JSON body arrives only once released."""
+
+    def __init__(self, body_ready, body):
+        super().__init__(request_id="slow")
+        self.body_ready = body_ready
+        self.body = body
+
+    async def json(self):
+        await self.body_ready.wait()
+        if self.body is None:
+            raise ValueError("not json")
+        return self.body
+
+async def test_queue_slot_reserved_before_body_is_read():
+    agent = GatedAgent()
+    server = AgentServer(agent, max_concurrency=1, max_queue=2, action_limits={})
+    body_ready = asyncio.Event()
+    body = {"action": "check_integration", "params": {"block": False}}
+
+    # Bodies still in transit count against the queue bound
+    held = [asyncio.create_task(server.handle_agent(SlowBodyRequest(body_ready, body))) for _ in range(2)]
+    await wait_until(lambda: server.queued == 2)
+    rejected = await server.handle_agent(SlowBodyRequest(body_ready, body))
+    assert rejected.status == 429
+
+    body_ready.set()
+    assert [r.status for r in await asyncio.gather(*held)] == [200, 200]
+
+    bad = await server.handle_agent(SlowBodyRequest(body_ready, None))
+    assert bad.status == 400
+    assert server.queued == 0 and server.idle.is_set()
+    assert server.counters == {"accepted": 2, "rejected_busy": 1, "rejected_draining": 0, "bad_request": 1}
+
+    print("Queue reservation test passed!")
+
+async def test_per_action_limits():
+    agent = GatedAgent()
+    server = AgentServer(agent, max_concurrency=10, action_limits={"refactor_file": 2})
+    async with RunningServer(server) as running, aiohttp.ClientSession() as session:
+        async def post(action):
+            async with session.post(f"{running.url}/agent", json={"action": action}) as resp:
+                return resp.status
+
+        tasks = [asyncio.create_task(post("refactor_file")) for _ in range(6)]
+        tasks += [asyncio.create_task(post("run_shell")) for _ in range(4)]
+        await wait_until(lambda: agent.active.get("refactor_file") == 2 and agent.active.get("run_shell") == 4)
+        # Refactors waiting on their own limit do not hold global slots
+        assert server.in_flight == 6 and server.queued == 4
+
+        agent.gate.set()
+        assert await asyncio.gather(*tasks) == [200] * 10
+    assert agent.peak == {"refactor_file": 2, "run_shell": 4}
+
+    print("Per-action limit test passed!")
+
+async def test_graceful_drain():
+    agent = GatedAgent()
+    server = AgentServer(agent, max_concurrency=1, drain_timeout=5.0)
+    async with RunningServer(server) as running, aiohttp.ClientSession() as session:
+        async def post(action):
+            async with session.post(f"{running.url}/agent", json={"action": action}) as resp:
+                return resp.status
+
+        in_flight = asyncio.create_task(post("refactor_file"))
+        queued = asyncio.create_task(post("generate_file"))
+        await wait_until(lambda: server.in_flight == 1 and server.queued == 1)
+
+        drain = asyncio.create_task(server.drain())
+        await asyncio.sleep(0.05)
+        assert not drain.done()
+        assert await post("check_integration") == 503
+
+        agent.gate.set()
+        await drain
+        assert await in_flight == 200 and await queued == 200
+
+    print("Graceful drain test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_dispatch_request_ids_and_metrics())
+    asyncio.run(test_queue_full_returns_429())
+    asyncio.run(test_queue_slot_reserved_before_body_is_read())
+    asyncio.run(test_per_action_limits())
+    asyncio.run(test_graceful_drain())
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import time
+
+# Ensure the script directory is in the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from shell import HeadTailBuffer, ShellRunner
+
+async def test_output_streams_incrementally():
+    runner = ShellRunner()
+    received = []
+    start = time.perf_counter()
+
+    def on_output(chunk):
+        received.append((time.perf_counter() - start, chunk))
+
+    result = await runner.run("echo first; sleep 0.3; echo second >&2; exit 3", on_output=on_output)
+
+    assert received[0][1] == "first\n" and received[0][0] < 0.25, received
+    assert result.exit_code == 3
+    assert result.output == "first\nsecond\n"
+    assert result.duration >= 0.3 and not result.truncated
+
+    # A UTF-8 character split across two reads reaches on_output whole
+    chunks = []
+    result = await runner.run("printf 'caf\\303'; sleep 0.2; printf '\\251\\n'", on_output=chunks.append)
+    assert "".join(chunks) == "café\n" and len(chunks) == 2, chunks
+    assert result.output == "café\n"
+
+    print("Streaming shell output test passed!")
+
+async def test_output_capture_is_bounded():
+    runner = ShellRunner(head_bytes=1000, tail_bytes=1000)
+    result = await runner.run("echo START; yes x | head -c 5000000; echo END")
+
+    assert result.exit_code == 0
+    assert result.truncated and result.total_bytes > 5000000
+    assert result.output.startswith("START\n") and result.output.endswith("END\n")
+    assert len(result.output) < 2100
+
+    buffer = HeadTailBuffer(head_bytes=4, tail_bytes=4)
+    for piece in (b"abc", b"defgh", b"ijk"):
+        buffer.write(piece)
+    assert buffer.getvalue() == "abcd\n... [3 bytes truncated] ...\nhijk"
+
+    print("Bounded capture test passed!")
+
+async def test_cancellation_and_timeout_kill_the_process():
+    runner = ShellRunner()
+    marker = f"/tmp/shell_runner_test_{os.getpid()}"
+    task = asyncio.create_task(runner.run(f"sleep 0.5 && touch {marker}"))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    try:
+        await task
+        assert False, "expected cancellation"
+    except asyncio.CancelledError:
+        pass
+
+    start = time.perf_counter()
+    result = await runner.run(f"echo partial; sleep 0.5 && touch {marker}", timeout=0.2)
+    assert time.perf_counter() - start < 0.45
+    assert result.timed_out and result.output == "partial\n"
+
+    await asyncio.sleep(0.6)
+    assert not os.path.exists(marker)
+
+    print("Cancellation and timeout test passed!")
+
+async def test_concurrency_is_bounded():
+    runner = ShellRunner(max_concurrent=2)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(runner.run("sleep 0.2") for _ in range(4)))
+    elapsed = time.perf_counter() - start
+
+    assert all(r.exit_code == 0 for r in results)
+    assert 0.4 <= elapsed < 0.7, elapsed
+
+    print("Bounded shell concurrency test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_output_streams_incrementally())
+    asyncio.run(test_output_capture_is_bounded())
+    asyncio.run(test_cancellation_and_timeout_kill_the_process())
+    asyncio.run(test_concurrency_is_bounded())
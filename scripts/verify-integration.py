@@ -5,22 +5,21 @@ Ensures all frontend components are properly assimilated with backend partners
 """
 
 import os
-import json
 import sys
-from pathlib import Path
 
-def check_integration_mapping():
+from auth_config import AuthConfigStore
+
+def check_integration_mapping(store=None):
     """Verify all frontend files have corresponding backend integrations"""
     
-    # Load integration configuration
-    config_path = Path(__file__).resolve().parent / "app/src/main/assets/models/auth-integration-config.json"
-    if not config_path.exists():
-        print(f"❌ Integration config not found: {config_path}")
+    # Load integration configuration (AUTH_CONFIG_PATH overrides the default location)
+    store = store or AuthConfigStore()
+    config = store.get()
+    if not store.loaded:
+        print(f"❌ Integration config not found: {store.path}" if store.error is None
+              else f"❌ Integration config unreadable: {store.error}")
         return False
     
-    with open(config_path, 'r') as f:
-        config = json.load(f)
-    
     mapping = config.get("frontend_backend_mapping", {})
     if not mapping:
         print("❌ No frontend-backend mapping found in config")
@@ -32,15 +31,14 @@ def check_integration_mapping():
     all_assimilated = True
     results = {}
     
-    for component, integration in mapping.items():
-        frontend_path = integration.get("frontend", "")
-        backend_path = integration.get("backend", "")
-        auth_bridge = integration.get("auth_bridge", "")
-        status = integration.get("integration_status", "unknown")
+    for entry in store.integration_state():
+        component = entry.component
+        frontend_path = entry.frontend or ""
+        backend_path = entry.backend or ""
+        auth_bridge = entry.auth_bridge or ""
         
-        # Check if paths exist
-        frontend_exists = os.path.exists(frontend_path) if frontend_path else False
-        backend_exists = os.path.exists(backend_path) if backend_path else False
+        frontend_exists = entry.frontend_exists
+        backend_exists = entry.backend_exists
         
         # Determine integration status
         if frontend_exists and backend_exists: